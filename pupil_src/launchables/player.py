@@ -344,7 +344,7 @@ def player(
             g_pool,
             timing="external",
             source_path=video_path,
-            buffered_decoding=True,
+            prefetch_decoding=True,
             fill_gaps=True,
         )
 
@@ -761,6 +761,14 @@ def player(
             p.alive = False
         g_pool.plugins.clean()
 
+        from tasklib.background.pool import shutdown_shared_pool
+
+        shutdown_shared_pool()
+
+        from file_methods import Serialized_Dict
+
+        logger.debug(f"Serialized_Dict cache stats: {Serialized_Dict.cache_stats()}")
+
         g_pool.gui.terminate()
         glfw.destroy_window(main_window)
 
@@ -366,6 +366,67 @@ class MPEG_Audio_Writer(MPEG_Writer):
         ).iterate_audio_packets()
 
 
+def concatenate_videos(
+    segment_paths: T.Sequence[str],
+    output_file_path: str,
+    start_time_synced: float,
+    audio_dir: T.Optional[str] = None,
+):
+    """
+    Concatenates the video streams of segments without re-encoding them.
+
+    The segments need to be written by AV_Writers with the same codec settings and
+    the same start_time_synced, such that their pts continue each other. Audio of
+    audio_dir is added like MPEG_Audio_Writer does. Timestamps are not written,
+    see write_timestamps().
+    """
+    output = av.open(output_file_path, "w")
+    with av.open(segment_paths[0]) as first_segment:
+        video_stream = output.add_stream(template=first_segment.streams.video[0])
+
+    audio_packets = None
+    if audio_dir is not None:
+        try:
+            audio_parts = audio_utils.load_audio(audio_dir)
+        except audio_utils.NoAudioLoadedError:
+            logger.debug("Could not mux audio. File not found.")
+        else:
+            audio_stream = MPEG_Audio_Writer._add_stream(
+                container=output, template=audio_parts[0].stream
+            )
+            audio_packets = _AudioPacketIterator(
+                start_time=start_time_synced,
+                audio_export_stream=audio_stream,
+                audio_parts=audio_parts,
+                fill_gaps=True,
+            ).iterate_audio_packets()
+
+    last_video_ts = float("-inf")
+    for segment_path in segment_paths:
+        with av.open(segment_path) as segment:
+            for packet in segment.demux(segment.streams.video[0]):
+                if packet.pts is None:
+                    # empty packet that flushes the demuxer
+                    continue
+                video_ts = packet.pts * packet.time_base
+                if video_ts <= last_video_ts:
+                    # ensure strong monotonic pts across segments
+                    packet.pts = packet.dts = int(last_video_ts / packet.time_base) + 1
+                    video_ts = packet.pts * packet.time_base
+                last_video_ts = video_ts
+                packet.stream = video_stream
+                output.mux(packet)
+
+                if audio_packets is None:
+                    continue
+                # mux all audio packets up to the current frame timestamp
+                for audio_packet in audio_packets:
+                    output.mux(audio_packet)
+                    if audio_packet.pts * audio_stream.time_base > video_ts:
+                        break
+    output.close()
+
+
 class _AudioPacketIterator:
     def __init__(self, start_time, audio_parts, audio_export_stream, fill_gaps=True):
         self.start_time = start_time
@@ -9,6 +9,7 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import collections
 import logging
 import multiprocessing as mp
 import signal
@@ -16,7 +17,9 @@ from ctypes import c_bool
 
 import zmq
 
+import tasklib.background.pool
 import zmq_tools
+from tasklib.background.ring_buffer import SharedRingBuffer
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +31,9 @@ class EarlyCancellationError(Exception):
 class Task_Proxy:
     """Future like object that runs a given generator in the background and returns is able to return the results incrementally"""
 
-    def __init__(self, name, generator, args=(), kwargs={}, context=...):
+    def __init__(
+        self, name, generator, args=(), kwargs={}, context=..., shared_buffer_size=None
+    ):
         super().__init__()
         if context is ...:
             context = mp.get_context()
@@ -36,6 +41,10 @@ class Task_Proxy:
         self._should_terminate_flag = context.Value(c_bool, 0)
         self._completed = False
         self._canceled = False
+        # Transports yielded NumPy arrays without pickling them, see SharedRingBuffer
+        self._ring_buffer = None
+        if shared_buffer_size:
+            self._ring_buffer = SharedRingBuffer(shared_buffer_size, context)
 
         pipe_recv, pipe_send = context.Pipe(False)
         wrapper_args = self._prepare_wrapper_args(
@@ -73,6 +82,10 @@ class Task_Proxy:
             for datum in generator(*args, **kwargs):
                 if _should_terminate_flag.value:
                     raise EarlyCancellationError("Task was cancelled")
+                if self._ring_buffer is not None:
+                    datum = self._ring_buffer.pack(
+                        datum, should_stop=lambda: _should_terminate_flag.value
+                    )
                 pipe.send(datum)
             pipe.send(StopIteration())
         except BrokenPipeError:
@@ -119,6 +132,8 @@ class Task_Proxy:
                     return
                 elif isinstance(datum, Exception):
                     raise datum
+                elif self._ring_buffer is not None:
+                    yield self._ring_buffer.unpack(datum)
                 else:
                     yield datum
 
@@ -141,6 +156,53 @@ class Task_Proxy:
         return self._canceled
 
 
+class Pooled_Task_Proxy:
+    """Task_Proxy that runs the generator in a persistent worker process
+
+    Has the same interface as Task_Proxy, but does not start a new process. The
+    generator runs in a worker of `worker_pool`, by default the pool that is shared
+    by all plugins (see tasklib.background.pool). Generator and arguments need to be
+    picklable. Logging of the workers is set up by the pool.
+    """
+
+    def __init__(self, name, generator, args=(), kwargs={}, worker_pool=None):
+        if worker_pool is None:
+            worker_pool = tasklib.background.pool.shared_pool()
+        self._results = collections.deque()
+        self._exception = None
+        self._task = worker_pool.create(name, generator, args=args, kwargs=kwargs)
+        self._task.add_observer("on_yield", self._results.append)
+        self._task.add_observer("on_exception", self._on_exception)
+        self._task.start()
+
+    def _on_exception(self, exception):
+        self._exception = exception
+
+    def fetch(self):
+        """Fetches progress and available results from background"""
+        if self._task.running:
+            self._task.update()
+        while self._results:
+            yield self._results.popleft()
+        if self._exception is not None:
+            exception, self._exception = self._exception, None
+            raise exception
+
+    def cancel(self, timeout=1):
+        # does not block, the worker gets `timeout` seconds to stop in the background
+        if self._task.running:
+            self._task.kill(grace_period=timeout)
+        self._results.clear()
+
+    @property
+    def completed(self):
+        return self._task.completed and not self._results
+
+    @property
+    def canceled(self):
+        return self._task.canceled_or_killed and not self._results
+
+
 class IPC_Logging_Task_Proxy(Task_Proxy):
     push_url = None
 
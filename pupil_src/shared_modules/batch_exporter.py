@@ -9,17 +9,19 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
-import numpy as np
-from pyglui import ui
+import collections
+import json
+import logging
+import multiprocessing as mp
 import os
 import sys
 import time
 
-from ctypes import c_bool, c_int
-from multiprocessing import cpu_count
-import background_helper as bh
+import numpy as np
+import psutil
+from pyglui import ui
 
-import logging
+import background_helper as bh
 
 logger = logging.getLogger(__name__)
 
@@ -28,10 +30,28 @@ if __name__ == "__main__":
     pupil_base_dir = os.path.abspath(__file__).rsplit("pupil_src", 1)[0]
     sys.path.append(os.path.join(pupil_base_dir, "pupil_src", "shared_modules"))
 
+import file_methods as fm
 from plugin import Plugin, System_Plugin_Base
+from pupil_recording.recording_utils import (
+    InvalidRecordingException,
+    RecordingType,
+    get_recording_type,
+)
+from tasklib.background.patches import KeyboardInterruptHandlerPatch
+from tasklib.background.pool import DEFAULT_PRELOAD_MODULES, WorkerPool
+
+# Rough upper bound of the memory that a single world video export needs
+MEMORY_PER_WORKER = 1024**3
+MIN_DATA_CONFIDENCE_DEFAULT = 0.6
+PREVIEW_FRAMES = 120
 
-from exporter import export as export_function
-from player_methods import is_pupil_rec_dir
+
+def is_pupil_rec_dir(rec_dir):
+    """Whether rec_dir is a recording that can be exported without upgrading it"""
+    try:
+        return get_recording_type(rec_dir) == RecordingType.NEW_STYLE
+    except InvalidRecordingException:
+        return False
 
 
 def get_recording_dirs(data_dir):
@@ -49,6 +69,281 @@ def get_recording_dirs(data_dir):
                 yield joined
 
 
+def default_worker_count(memory_per_worker=MEMORY_PER_WORKER):
+    """Number of parallel exports that fit into the CPUs and the available memory"""
+    # Leave one core for the foreground process
+    max_by_cpu = mp.cpu_count() - 1
+    max_by_memory = psutil.virtual_memory().available // memory_per_worker
+    return int(max(min(max_by_cpu, max_by_memory), 1))
+
+
+def load_pre_computed_eye_data(rec_dir):
+    """Recorded pupil and gaze data in the format of the World_Video_Exporter"""
+    pupil = fm.load_pldata_file(rec_dir, "pupil")
+    gaze = fm.load_pldata_file(rec_dir, "gaze")
+    return {
+        "pupil": {
+            "data": [datum.serialized for datum in pupil.data],
+            "data_ts": pupil.timestamps,
+            "topics": list(pupil.topics),
+        },
+        "gaze": {
+            "data": [datum.serialized for datum in gaze.data],
+            "data_ts": gaze.timestamps,
+        },
+        "fixations": {"data": [], "start_ts": [], "stop_ts": []},
+    }
+
+
+def export_recording(
+    rec_dir,
+    user_dir,
+    min_data_confidence,
+    start_frame,
+    end_frame,
+    plugin_initializers,
+    out_file_path,
+):
+    """
+    Exports the world video of a recording with its recorded eye data, yields
+    status and number of exported frames. Executed in background.
+    """
+    from video_export.plugins.world_video_exporter import _export_world_video
+
+    pre_computed_eye_data = load_pre_computed_eye_data(rec_dir)
+    os.makedirs(os.path.dirname(out_file_path), exist_ok=True)
+    yield from _export_world_video(
+        rec_dir,
+        user_dir,
+        min_data_confidence,
+        start_frame,
+        end_frame,
+        plugin_initializers,
+        out_file_path,
+        pre_computed_eye_data,
+    )
+
+
+Batch_Export_Job = collections.namedtuple(
+    "Batch_Export_Job", ["rec_dir", "out_file_path", "end_frame"]
+)
+
+
+class Batch_Export_Checkpoints:
+    """
+    Results of a batch export, stored after every finished recording.
+
+    Recordings that were exported successfully with the same settings are skipped
+    when an interrupted batch export is started again. Failed recordings are
+    exported again.
+    """
+
+    version = 1
+    file_name = "batch_export_checkpoints.json"
+
+    def __init__(self, directory):
+        self.file_path = os.path.join(directory, self.file_name)
+        self._recordings = self._load()
+
+    def _load(self):
+        try:
+            with open(self.file_path, encoding="utf-8") as fh:
+                checkpoints = json.load(fh)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logger.warning("Batch export checkpoints could not be read, restarting.")
+            return {}
+        if checkpoints.get("version") != self.version:
+            return {}
+        return checkpoints["recordings"]
+
+    def _save(self):
+        # Write to a temporary file first such that an interrupted write does not
+        # destroy the checkpoints of earlier recordings.
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            checkpoints = {"version": self.version, "recordings": self._recordings}
+            json.dump(checkpoints, fh, indent=4)
+        os.replace(tmp_path, self.file_path)
+
+    def is_completed(self, job):
+        checkpoint = self._recordings.get(job.rec_dir)
+        return (
+            checkpoint is not None
+            and checkpoint["status"] == "completed"
+            and checkpoint["out_file_path"] == job.out_file_path
+            and checkpoint["end_frame"] == job.end_frame
+            and os.path.isfile(job.out_file_path)
+        )
+
+    def mark_completed(self, job, num_frames, duration):
+        self._recordings[job.rec_dir] = {
+            "status": "completed",
+            "out_file_path": job.out_file_path,
+            "end_frame": job.end_frame,
+            "frames": num_frames,
+            "duration": duration,
+        }
+        self._save()
+
+    def mark_failed(self, job, error):
+        self._recordings[job.rec_dir] = {
+            "status": "failed",
+            "out_file_path": job.out_file_path,
+            "end_frame": job.end_frame,
+            "error": f"{type(error).__name__}: {error}",
+        }
+        self._save()
+
+    def clear(self):
+        self._recordings = {}
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+
+class Batch_Export_Report:
+    """Counts and throughput of a batch export"""
+
+    def __init__(self):
+        self.num_completed = 0
+        self.num_failed = 0
+        self.num_skipped = 0
+        self.num_frames = 0
+        self.duration = 0.0
+        self.was_interrupted = False
+
+    @property
+    def recordings_per_hour(self):
+        return self.num_completed / self.duration * 3600 if self.duration else 0.0
+
+    @property
+    def frames_per_second(self):
+        return self.num_frames / self.duration if self.duration else 0.0
+
+    def __str__(self):
+        lines = [
+            f"Exported {self.num_completed} recordings, {self.num_failed} failed, "
+            f"{self.num_skipped} skipped (exported before).",
+            f"Duration: {self.duration / 60:.1f} min, "
+            f"{self.recordings_per_hour:.1f} recordings/hour, "
+            f"{self.frames_per_second:.1f} frames/s",
+        ]
+        if self.was_interrupted:
+            lines.append("Batch export was interrupted. Run it again to resume.")
+        return "\n".join(lines)
+
+
+class Headless_Batch_Exporter:
+    """
+    Exports the world videos of many recordings without Player's UI.
+
+    Recordings are exported in a bounded pool of background workers, see
+    default_worker_count(). Every finished recording is checkpointed, such that an
+    interrupted batch export resumes with the recordings that are not done yet.
+    """
+
+    # Seconds between two updates of the running exports
+    poll_interval = 0.25
+
+    def __init__(
+        self,
+        jobs,
+        checkpoints,
+        user_dir,
+        plugin_initializers,
+        min_data_confidence=MIN_DATA_CONFIDENCE_DEFAULT,
+        num_workers=None,
+        export_function=export_recording,
+    ):
+        self.jobs = list(jobs)
+        self.checkpoints = checkpoints
+        self.user_dir = user_dir
+        self.plugin_initializers = plugin_initializers
+        self.min_data_confidence = min_data_confidence
+        self.num_workers = num_workers or default_worker_count()
+        self.export_function = export_function
+
+    def run(self):
+        report = Batch_Export_Report()
+        pending_jobs = []
+        for job in self.jobs:
+            if self.checkpoints.is_completed(job):
+                logger.info(f"Skipping {job.rec_dir}, it was exported before.")
+                report.num_skipped += 1
+            else:
+                pending_jobs.append(job)
+        if not pending_jobs:
+            return report
+
+        num_workers = min(self.num_workers, len(pending_jobs))
+        logger.info(
+            f"Exporting {len(pending_jobs)} recordings with {num_workers} workers"
+        )
+        worker_pool = WorkerPool(
+            num_workers=num_workers,
+            preload_modules=DEFAULT_PRELOAD_MODULES,
+            patches=[KeyboardInterruptHandlerPatch()],
+        )
+        start_time = time.perf_counter()
+        try:
+            tasks = [self._start_task(worker_pool, job, report) for job in pending_jobs]
+            while not all(task.ended for task in tasks):
+                for task in tasks:
+                    if task.running:
+                        task.update()
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            report.was_interrupted = True
+        finally:
+            # kills exports that are still running
+            worker_pool.shutdown()
+            report.duration = time.perf_counter() - start_time
+        return report
+
+    def _start_task(self, worker_pool, job, report):
+        args = (
+            job.rec_dir,
+            self.user_dir,
+            self.min_data_confidence,
+            None,
+            job.end_frame,
+            self.plugin_initializers,
+            job.out_file_path,
+        )
+        task = worker_pool.create(
+            f"Batch export {job.rec_dir}", self.export_function, args=args
+        )
+        progress = {"num_frames": 0, "start_time": None}
+
+        def on_yield(status_and_progress):
+            if progress["start_time"] is None:
+                progress["start_time"] = time.perf_counter()
+            _, num_frames = status_and_progress
+            progress["num_frames"] = num_frames
+
+        def on_completed(_):
+            duration = time.perf_counter() - (progress["start_time"] or 0.0)
+            report.num_completed += 1
+            report.num_frames += progress["num_frames"]
+            self.checkpoints.mark_completed(job, progress["num_frames"], duration)
+            logger.info(
+                f"Exported {job.rec_dir}: {progress['num_frames']} frames in "
+                f"{duration:.0f}s"
+            )
+
+        def on_exception(error):
+            report.num_failed += 1
+            self.checkpoints.mark_failed(job, error)
+            logger.error(f"Export of {job.rec_dir} failed: {error}")
+
+        task.add_observer("on_yield", on_yield)
+        task.add_observer("on_completed", on_completed)
+        task.add_observer("on_exception", on_exception)
+        task.start()
+        return task
+
+
 class Batch_Export(System_Plugin_Base):
     """Sub plugin that manages a single batch export"""
 
@@ -167,11 +462,10 @@ class Batch_Export(System_Plugin_Base):
             None,
             self.plugins,
             self.out_file_path,
-            {},
         )
         self.process = bh.IPC_Logging_Task_Proxy(
             "Pupil Batch Export {}".format(self.out_file_path),
-            export_function,
+            export_recording,
             args=args,
         )
         self.notify_all(
@@ -215,10 +509,10 @@ class Batch_Exporter(Plugin):
         self.source_dir = os.path.expanduser(source_dir)
 
         self.search_task = None
-        self.worker_count = cpu_count() - 1
+        self.worker_count = default_worker_count()
         logger.info(
             "Using a maximum of {} CPUs to process visualizations in parallel...".format(
-                cpu_count() - 1
+                self.worker_count
             )
         )
 
@@ -408,34 +702,15 @@ def main():
 
     import argparse
     from textwrap import dedent
-    from file_methods import Persistent_Dict
-
-    def show_progess(jobs):
-        no_jobs = len(jobs)
-        width = 80
-        full = width / no_jobs
-        string = ""
-        for j in jobs:
-            try:
-                p = int(
-                    width
-                    * j.current_frame.value
-                    / float(j.frames_to_export.value * no_jobs)
-                )
-            except Exception:
-                p = 0
-            string += "[" + p * "|" + (full - p) * "-" + "]"
-        sys.stdout.write("\r" + string)
-        sys.stdout.flush()
 
     """Batch process recordings to produce visualizations
-    Using simple_circle as the default visualizations
+    Using the visualizations of the last Player session
     Steps:
         - User Supplies: Directory that contains many recording(s) dirs or just one recordings dir
-        - We walk the user supplied directory to get all data folders
-        - Data is the list we feed to our multiprocessed
-        - Error check -- do we have required files in each dir?: world.avi, gaze_positions.npy, timestamps.npy
-        - Result: world_viz.avi within each original data folder
+        - We walk the user supplied directory to get all recording folders
+        - Recordings are exported in a bounded pool of background workers
+        - Finished recordings are checkpointed, a second run resumes an interrupted one
+        - Result: world_viz.mp4 within each original data folder or in the export dir
     """
 
     parser = argparse.ArgumentParser(
@@ -444,10 +719,10 @@ def main():
             """\
             ***************************************************
             Batch process recordings to produce visualizations
-            The default visualization will use simple_circle
+            The visualizations of the last Player session are used
 
             Usage Example:
-                python batch_exporter.py -d /path/to/folder-with-many-recordings -s ~/Pupil_Player/settings/user_settings -e ~/my_export_dir
+                python batch_exporter.py -d /path/to/folder-with-many-recordings -s ~/pupil_player_settings/user_settings_player -e ~/my_export_dir
             Arguments:
                 -d : Specify a recording directory.
                      This could have one or many recordings contained within it.
@@ -455,6 +730,8 @@ def main():
                 -s : Specify path to Pupil Player user_settings file to use last used vizualization settings.
                 -e : Specify export directory if you dont want the export saved within each recording dir.
                 -p : Export a 120 frame preview only.
+                -w : Number of parallel exports. Defaults to what fits into CPUs and memory.
+                --restart : Export all recordings again instead of resuming an interrupted batch export.
             ***************************************************\
         """
         ),
@@ -462,8 +739,9 @@ def main():
     parser.add_argument("-d", "--rec-dir", required=True)
     parser.add_argument("-s", "--settings-file", required=True)
     parser.add_argument("-e", "--export-to-dir", default=False)
-    parser.add_argument("-c", "--basic-color", default="red")
     parser.add_argument("-p", "--preview", action="store_true")
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--restart", action="store_true")
 
     if len(sys.argv) == 1:
         print(parser.description)
@@ -472,19 +750,25 @@ def main():
     args = parser.parse_args()
     # get the top level data folder from terminal argument
 
-    data_dir = args.rec_dir
+    data_dir = os.path.expanduser(args.rec_dir)
 
     if args.settings_file and os.path.isfile(args.settings_file):
-        session_settings = Persistent_Dict(os.path.splitext(args.settings_file)[0])
+        settings_path = os.path.abspath(os.path.expanduser(args.settings_file))
+        session_settings = fm.Persistent_Dict(settings_path)
         # these are loaded based on user settings
         plugin_initializers = session_settings.get("loaded_plugins", [])
+        min_data_confidence = session_settings.get(
+            "min_data_confidence", MIN_DATA_CONFIDENCE_DEFAULT
+        )
         session_settings.close()
+        # runtime plugins are loaded from the user dir of the settings
+        user_dir = os.path.dirname(settings_path)
     else:
         logger.error("Setting file not found or valid")
         return
 
     if args.export_to_dir:
-        export_dir = args.export_to_dir
+        export_dir = os.path.expanduser(args.export_to_dir)
         if os.path.isdir(export_dir):
             logger.info("Exporting all vids to {}".format(export_dir))
         else:
@@ -495,96 +779,50 @@ def main():
         logger.info("Exporting into the recording dirs.")
 
     if args.preview:
-        preview = True
-        logger.info("Exporting first 120frames only")
+        end_frame = PREVIEW_FRAMES
+        logger.info("Exporting first {} frames only".format(PREVIEW_FRAMES))
     else:
-        preview = False
-
-    class Temp(object):
-        pass
-
-    recording_dirs = get_recording_dirs(data_dir)
-    # start multiprocessing engine
-    n_cpu = mp.cpu_count()
-    logger.info(
-        "Using a maximum of {} CPUs to process visualizations in parallel...".format(
-            n_cpu
-        )
-    )
+        end_frame = None
 
     jobs = []
     outfiles = set()
-    for d in recording_dirs:
-        j = Temp()
+    for d in get_recording_dirs(data_dir):
+        d = os.path.abspath(d)
         logger.info("Adding new export: {}".format(d))
-        j.should_terminate = mp.Value(c_bool, 0)
-        j.frames_to_export = mp.Value(c_int, 0)
-        j.current_frame = mp.Value(c_int, 0)
-        j.data_dir = d
-        j.user_dir = None
-        j.start_frame = None
-        if preview:
-            j.end_frame = 30
-        else:
-            j.end_frame = None
-        j.plugin_initializers = plugin_initializers[:]
-
         if export_dir:
             # make a unique name created from rec_session and dir name
             rec_session, rec_dir = d.rsplit(os.path.sep, 2)[1:]
             out_name = rec_session + "_" + rec_dir + ".mp4"
-            j.out_file_path = os.path.join(os.path.expanduser(export_dir), out_name)
-            if j.out_file_path in outfiles:
+            out_file_path = os.path.abspath(os.path.join(export_dir, out_name))
+            if out_file_path in outfiles:
                 logger.error(
                     "This export setting would try to save {} at least twice pleace rename dirs to prevent this.".format(
-                        j.out_file_path
+                        out_file_path
                     )
                 )
                 return
-            outfiles.add(j.out_file_path)
-            logger.info("Exporting to: {}".format(j.out_file_path))
-
+            outfiles.add(out_file_path)
+            logger.info("Exporting to: {}".format(out_file_path))
         else:
-            j.out_file_path = None
-
-        j.args = (
-            j.should_terminate,
-            j.frames_to_export,
-            j.current_frame,
-            j.data_dir,
-            j.user_dir,
-            j.start_frame,
-            j.end_frame,
-            j.plugin_initializers,
-            j.out_file_path,
-            None,
-        )
-        jobs.append(j)
-
-    todo = jobs[:]
-    workers = [
-        Export_Process(target=export, args=todo.pop(0).args)
-        for i in range(min(len(todo), n_cpu))
-    ]
-    for w in workers:
-        w.start()
-
-    working = True
-    while working:  # cannot use pool as it does not allow shared memory
-        working = False
-        for i in range(len(workers)):
-            if workers[i].is_alive():
-                working = True
-            else:
-                if todo:
-                    workers[i] = Export_Process(target=export, args=todo.pop(0).args)
-                    workers[i].start()
-                    working = True
-        show_progess(jobs)
-        time.sleep(0.25)
-    print("\n")
+            out_file_path = os.path.join(d, "world_viz.mp4")
+        jobs.append(Batch_Export_Job(d, out_file_path, end_frame))
+
+    checkpoints = Batch_Export_Checkpoints(export_dir or data_dir)
+    if args.restart:
+        checkpoints.clear()
+
+    exporter = Headless_Batch_Exporter(
+        jobs,
+        checkpoints,
+        user_dir=user_dir,
+        plugin_initializers=plugin_initializers,
+        min_data_confidence=min_data_confidence,
+        num_workers=args.workers,
+    )
+    report = exporter.run()
+    print(report)
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.WARNING)
+    logging.basicConfig(level=logging.INFO)
     main()
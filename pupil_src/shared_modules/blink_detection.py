@@ -187,6 +187,60 @@ class Blink_Detection(Plugin):
         }
 
 
+def blink_filter_response(timestamps, activity, history_length):
+    """
+    Returns the response of the blink filter to the confidence `activity` and the
+    size of the filter in samples.
+    """
+    total_time = timestamps[-1] - timestamps[0]
+    filter_size = 2 * round(len(activity) * history_length / total_time / 2.0)
+    blink_filter = np.ones(filter_size) / filter_size
+
+    # This is different from the online filter. Convolution will flip
+    # the filter and result in a reverse filter response. Therefore
+    # we set the first half of the filter to -1 instead of the second
+    # half such that we get the expected result.
+    blink_filter[: filter_size // 2] *= -1
+
+    # The theoretical response maximum is +-0.5
+    # Response of +-0.45 seems sufficient for a confidence of 1.
+    return fftconvolve(activity, blink_filter, "same") / 0.45, filter_size
+
+
+def classify_filter_response(
+    filter_response, onset_confidence_threshold, offset_confidence_threshold
+):
+    """Classifies filter responses into onsets (1), offsets (-1) and neither (0)"""
+    filter_response = np.asarray(filter_response)
+    response_classification = np.zeros(filter_response.shape)
+    response_classification[filter_response > onset_confidence_threshold] = 1.0
+    response_classification[filter_response < -offset_confidence_threshold] = -1.0
+    return response_classification
+
+
+def blink_ranges(response_classification):
+    """
+    Returns start and end indices (inclusive) of blinks in a classified filter
+    response.
+
+    A blink starts at the first onset and ends with the last sample of the
+    subsequent run of offsets. Afterwards, the next onset starts a new blink.
+    Thus, every run of offsets that is preceded by an onset since the end of the
+    previous run of offsets finishes exactly one blink.
+    """
+    classification = np.asarray(response_classification)
+    offsets = np.concatenate(([False], classification < 0, [False]))
+    edges = np.flatnonzero(np.diff(offsets.astype(np.int8)))
+    run_starts, run_ends = edges[::2], edges[1::2]
+    search_starts = np.concatenate(([0], run_ends))[:-1]
+
+    # sentinel onset behind the last sample, such that every search succeeds
+    onset_idc = np.append(np.flatnonzero(classification > 0), len(classification))
+    first_onset = onset_idc[np.searchsorted(onset_idc, search_starts)]
+    has_onset = first_onset < run_starts
+    return first_onset[has_onset], run_ends[has_onset] - 1
+
+
 class Offline_Blink_Detection(Observable, Blink_Detection):
     def __init__(
         self,
@@ -210,6 +264,10 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
         self.timestamps = []
         g_pool.blinks = pm.Affiliator()
         self.cache = {"response_points": (), "class_points": (), "thresholds": ()}
+        self._response_points_source = None
+        # filter responses for the current pupil data by history length
+        self._filter_response_cache = {}
+        self._filter_response_source = None
 
         self.pupil_positions_listener = data_changed.Listener(
             "pupil_positions", g_pool.rec_dir, plugin=self
@@ -258,6 +316,7 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
 
     def _on_pupil_positions_changed(self):
         logger.info("Pupil postions changed. Recalculating.")
+        self._filter_response_cache.clear()
         self.recalculate()
 
     def export(self, export_window, export_dir):
@@ -324,7 +383,7 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
     def recalculate(self):
         import time
 
-        t0 = time.time()
+        t0 = time.perf_counter()
         all_pp = self._pupil_data()
         if not all_pp:
             self.filter_response = []
@@ -334,116 +393,78 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
             return
 
         self.timestamps = all_pp.timestamps
-        total_time = self.timestamps[-1] - self.timestamps[0]
-
-        conf_iter = (pp["confidence"] for pp in all_pp)
-        activity = np.fromiter(conf_iter, dtype=float, count=len(all_pp))
-        total_time = all_pp[-1]["timestamp"] - all_pp[0]["timestamp"]
-        filter_size = 2 * round(len(all_pp) * self.history_length / total_time / 2.0)
-        blink_filter = np.ones(filter_size) / filter_size
-
-        # This is different from the online filter. Convolution will flip
-        # the filter and result in a reverse filter response. Therefore
-        # we set the first half of the filter to -1 instead of the second
-        # half such that we get the expected result.
-        blink_filter[: filter_size // 2] *= -1
-
-        # The theoretical response maximum is +-0.5
-        # Response of +-0.45 seems sufficient for a confidence of 1.
-        self.filter_response = fftconvolve(activity, blink_filter, "same") / 0.45
-
-        onsets = self.filter_response > self.onset_confidence_threshold
-        offsets = self.filter_response < -self.offset_confidence_threshold
-
-        self.response_classification = np.zeros(self.filter_response.shape)
-        self.response_classification[onsets] = 1.0
-        self.response_classification[offsets] = -1.0
+        self.filter_response, filter_size = self._cached_filter_response(all_pp)
+        self.response_classification = classify_filter_response(
+            self.filter_response,
+            self.onset_confidence_threshold,
+            self.offset_confidence_threshold,
+        )
 
         self.consolidate_classifications()
 
-        tm1 = time.time()
+        tm1 = time.perf_counter()
         logger.debug(
-            "Recalculating took\n\t{:.4f}sec for {} pp\n\t{} pp/sec\n\tsize: {}".format(
-                tm1 - t0, len(all_pp), len(all_pp) / (tm1 - t0), filter_size
+            "Recalculating took\n\t{:.4f}sec for {} pp\n\tsize: {}".format(
+                tm1 - t0, len(all_pp), filter_size
             )
         )
 
+    def _cached_filter_response(self, all_pp):
+        # Changing the thresholds only requires to reclassify the filter response
+        if self._filter_response_source is not all_pp:
+            self._filter_response_cache.clear()
+            self._filter_response_source = all_pp
+        try:
+            return self._filter_response_cache[self.history_length]
+        except KeyError:
+            pass
+        activity = all_pp.extract("confidence")
+        result = blink_filter_response(self.timestamps, activity, self.history_length)
+        self._filter_response_cache[self.history_length] = result
+        return result
+
     def consolidate_classifications(self):
-        blink = None
-        state = "no blink"  # others: 'blink started' | 'blink ending'
         blink_data = deque()
-        blink_start_ts = deque()
-        blink_stop_ts = deque()
-        counter = 1
-
         # NOTE: Cache result for performance reasons
         pupil_data = self._pupil_data()
 
-        def start_blink(idx):
-            nonlocal blink
-            nonlocal state
-            nonlocal counter
+        timestamps = np.asarray(self.timestamps, dtype=np.float64)
+        start_idc, end_idc = blink_ranges(self.response_classification)
+        blink_start_ts = timestamps[start_idc]
+        blink_stop_ts = timestamps[end_idc]
+
+        # correlate world indices
+        frame_start_idc = np.searchsorted(self.g_pool.timestamps, blink_start_ts)
+        frame_end_idc = np.searchsorted(self.g_pool.timestamps, blink_stop_ts)
+        # fix `list index out of range` error
+        frame_end_idc = np.minimum(frame_end_idc, len(self.g_pool.timestamps) - 1)
+
+        for counter, (start_idx, idx) in enumerate(zip(start_idc, end_idc), start=1):
+            ts_start, ts_end = float(timestamps[start_idx]), float(timestamps[idx])
+            filter_response = self.filter_response[start_idx:idx]
+            idx_start = int(frame_start_idc[counter - 1])
+            idx_end = int(frame_end_idc[counter - 1])
             blink = {
                 "topic": "blink",
-                "__start_response_index__": idx,
-                "start_timestamp": self.timestamps[idx],
+                "start_timestamp": ts_start,
                 "id": counter,
+                "end_timestamp": ts_end,
+                "timestamp": (ts_end + ts_start) / 2,
+                "duration": ts_end - ts_start,
+                "base_data": pupil_data[start_idx:idx].tolist(),
+                "filter_response": filter_response.tolist(),
+                # blink confidence is the mean of the absolute filter response
+                # during the blink event, clamped at 1.
+                "confidence": min(float(np.abs(filter_response).mean()), 1.0),
+                "start_frame_index": idx_start,
+                "end_frame_index": idx_end,
+                "index": (idx_start + idx_end) // 2,
             }
-            state = "blink started"
-            counter += 1
-
-        def blink_finished(idx):
-            nonlocal blink
-
-            # get tmp pupil idx
-            start_idx = blink["__start_response_index__"]
-            del blink["__start_response_index__"]
-
-            blink["end_timestamp"] = self.timestamps[idx]
-            blink["timestamp"] = (blink["end_timestamp"] + blink["start_timestamp"]) / 2
-            blink["duration"] = blink["end_timestamp"] - blink["start_timestamp"]
-            blink["base_data"] = pupil_data[start_idx:idx].tolist()
-            blink["filter_response"] = self.filter_response[start_idx:idx].tolist()
-            # blink confidence is the mean of the absolute filter response
-            # during the blink event, clamped at 1.
-            blink["confidence"] = min(
-                float(np.abs(blink["filter_response"]).mean()), 1.0
-            )
-
-            # correlate world indices
-            ts_start, ts_end = blink["start_timestamp"], blink["end_timestamp"]
-
-            idx_start, idx_end = np.searchsorted(
-                self.g_pool.timestamps, [ts_start, ts_end]
-            )
-            # fix `list index out of range` error
-            idx_end = min(idx_end, len(self.g_pool.timestamps) - 1)
-            blink["start_frame_index"] = int(idx_start)
-            blink["end_frame_index"] = int(idx_end)
-            blink["index"] = int((idx_start + idx_end) // 2)
-
             blink_data.append(fm.Serialized_Dict(python_dict=blink))
-            blink_start_ts.append(ts_start)
-            blink_stop_ts.append(ts_end)
-
-        for idx, classification in enumerate(self.response_classification):
-            if state == "no blink" and classification > 0:
-                start_blink(idx)
-            elif state == "blink started" and classification == -1:
-                state = "blink ending"
-            elif state == "blink ending" and classification >= 0:
-                blink_finished(idx - 1)  # blink ended previously
-                if classification > 0:
-                    start_blink(0)
-                else:
-                    blink = None
-                    state = "no blink"
-
-        if state == "blink ending":
-            # only finish blink if it was already ending
-            blink_finished(idx)  # idx is the last possible idx
-
-        self.g_pool.blinks = pm.Affiliator(blink_data, blink_start_ts, blink_stop_ts)
+
+        self.g_pool.blinks = pm.Affiliator(
+            blink_data, blink_start_ts.tolist(), blink_stop_ts.tolist()
+        )
         self.notify_all({"subject": "blinks_changed", "delay": 0.2})
 
     def cache_activation(self):
@@ -455,9 +476,12 @@ class Offline_Blink_Detection(Observable, Blink_Detection):
             (t1, -self.offset_confidence_threshold),
         )
 
-        self.cache["response_points"] = tuple(
-            zip(self.timestamps, self.filter_response)
-        )
+        # The response only changes with the pupil data or the history length
+        if self._response_points_source is not self.filter_response:
+            self._response_points_source = self.filter_response
+            self.cache["response_points"] = tuple(
+                zip(self.timestamps, self.filter_response)
+            )
         if len(self.cache["response_points"]) == 0:
             self.cache["class_points"] = ()
             return
@@ -156,6 +156,14 @@ class Listener(Observable):
         """
         pass
 
+    @property
+    def current_token(self):
+        """
+        Token of the most recently announced data, None if it is unknown.
+        Useful as key for results derived from the listened data.
+        """
+        return self._current_token
+
     def _request_token(self):
         self._plugin().notify_all(
             {"subject": "data_changed.{}.request_token".format(self._topic)}
@@ -13,6 +13,7 @@ import collections
 import collections.abc
 import copy
 import logging
+import mmap
 import os
 import pickle
 import traceback as tb
@@ -135,7 +136,18 @@ class Incremental_Legacy_Pupil_Data_Loader(object):
             yield self.unpacker.unpack()
 
 
-def load_pldata_file(directory, topic):
+def load_pldata_file(directory, topic, lazy=False):
+    """Load all data of a `.pldata` file.
+
+    If `lazy` is set, the columnar sidecar (see `PLData_Columns`) is used to
+    return a `Lazy_Serialized_Dict_Sequence` instead of one `Serialized_Dict` per
+    datum. Falls back to the default loading if the sidecar is not available.
+    """
+    if lazy:
+        columns = load_pldata_columns(directory, topic)
+        if columns is not None:
+            return columns.to_pldata()
+
     ts_file = os.path.join(directory, topic + "_timestamps.npy")
     msgpack_file = os.path.join(directory, topic + ".pldata")
     try:
@@ -154,14 +166,302 @@ def load_pldata_file(directory, topic):
     return PLData(data, data_ts, topics)
 
 
+def load_pldata_window(directory, topic, ts_window):
+    """Load only the data of `<topic>.pldata` within `ts_window`
+
+    Returns all data with `ts_window[0] <= timestamp < ts_window[1]`, equivalent
+    to `Bisector.by_ts_window`, in file order. Only the matching records are read
+    and decoded using the offsets in `<topic>_offsets.npy`. Recordings without
+    offsets file fall back to the columnar sidecar, or to a full load.
+    """
+    ts_file = os.path.join(directory, topic + "_timestamps.npy")
+    msgpack_file = os.path.join(directory, topic + ".pldata")
+    try:
+        data_ts = np.load(ts_file, mmap_mode="r")
+        file_size = os.path.getsize(msgpack_file)
+    except FileNotFoundError:
+        return PLData([], [], [])
+
+    offsets = _load_pldata_offsets(directory, topic, len(data_ts), file_size)
+    if offsets is None:
+        full = load_pldata_file(directory, topic)
+        data_ts = np.asarray(full.timestamps)
+        mask = (ts_window[0] <= data_ts) & (data_ts < ts_window[1])
+        indices = np.flatnonzero(mask)
+        return PLData(
+            [full.data[idx] for idx in indices],
+            data_ts[indices],
+            [full.topics[idx] for idx in indices],
+        )
+
+    if len(data_ts) and np.all(np.diff(data_ts) >= 0):
+        start, stop = np.searchsorted(data_ts, ts_window)
+        indices = np.arange(start, stop)
+    else:
+        mask = (ts_window[0] <= data_ts) & (data_ts < ts_window[1])
+        indices = np.flatnonzero(mask)
+
+    data = collections.deque()
+    topics = collections.deque()
+    if len(indices):
+        with open(msgpack_file, "rb") as fh:
+            buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        with buffer:
+            # Decode consecutive records in one go
+            run_starts = np.flatnonzero(np.diff(indices, prepend=-2) != 1)
+            run_stops = np.append(run_starts[1:], len(indices))
+            for run_start, run_stop in zip(run_starts, run_stops):
+                first_idx = indices[run_start]
+                last_idx = indices[run_stop - 1]
+                start_offset = offsets[first_idx]
+                if last_idx + 1 < len(offsets):
+                    stop_offset = offsets[last_idx + 1]
+                else:
+                    stop_offset = file_size
+                unpacker = msgpack.Unpacker(raw=False, use_list=False)
+                unpacker.feed(buffer[start_offset:stop_offset])
+                for record_topic, payload in unpacker:
+                    data.append(Serialized_Dict(msgpack_bytes=payload))
+                    topics.append(record_topic)
+
+    return PLData(data, np.array(data_ts[indices]), topics)
+
+
+def _load_pldata_offsets(directory, topic, num_records, file_size):
+    offsets_file = os.path.join(directory, topic + "_offsets.npy")
+    try:
+        offsets = np.load(offsets_file, mmap_mode="r")
+    except (FileNotFoundError, ValueError):
+        offsets = None
+    else:
+        if len(offsets) != num_records or (len(offsets) and offsets[-1] >= file_size):
+            logger.debug(f"Ignoring invalid offsets file {offsets_file}")
+            offsets = None
+
+    if offsets is None:
+        columns = load_pldata_columns(directory, topic)
+        if columns is not None:
+            offsets = columns.offsets
+    return offsets
+
+
+class Lazy_Serialized_Dict_Sequence(collections.abc.Sequence):
+    """Read-only sequence of `Serialized_Dict`s backed by a memory-mapped `.pldata`
+
+    Data is only read from disk when an item is accessed. Slicing and fancy
+    indexing return new lazy sequences that share the underlying file.
+    """
+
+    def __init__(self, pldata_path, offsets, indices=None, columns=None):
+        self._pldata_path = str(pldata_path)
+        self._offsets = offsets
+        self._indices = (
+            np.arange(len(offsets)) if indices is None else np.asarray(indices)
+        )
+        self.columns = columns or {}
+        self._mmap = None
+
+    def _buffer(self):
+        if self._mmap is None:
+            with open(self._pldata_path, "rb") as fh:
+                self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def _record_bytes(self, file_idx):
+        buffer = self._buffer()
+        start = self._offsets[file_idx]
+        if file_idx + 1 < len(self._offsets):
+            stop = self._offsets[file_idx + 1]
+        else:
+            stop = len(buffer)
+        return buffer[start:stop]
+
+    def _datum(self, file_idx):
+        _, payload = msgpack.unpackb(
+            self._record_bytes(file_idx), raw=False, use_list=False
+        )
+        return Serialized_Dict(msgpack_bytes=payload)
+
+    def _view(self, indices):
+        view = type(self)(
+            self._pldata_path, self._offsets, indices=indices, columns=self.columns
+        )
+        view._mmap = self._mmap
+        return view
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self._datum(self._indices[key])
+        return self._view(self._indices[key])
+
+    def __iter__(self):
+        for file_idx in self._indices:
+            yield self._datum(file_idx)
+
+    def __getstate__(self):
+        return self._pldata_path, self._offsets, self._indices, self.columns
+
+    def __setstate__(self, state):
+        self._pldata_path, self._offsets, self._indices, self.columns = state
+        self._mmap = None
+
+    def copy(self):
+        return self._view(self._indices.copy())
+
+    def column(self, name):
+        """Values of a sidecar column in the order of this sequence"""
+        return self.columns[name][self._indices]
+
+
+class PLData_Columns(object):
+    """Columnar sidecar of a `.pldata` file
+
+    Stores fixed-width numeric fields as memory-mapped `.npy` columns in
+    `<topic>_columns/`, together with the byte offset of every record in the
+    source `.pldata` file. The sidecar is considered valid as long as the size
+    and modification time of the source file match the recorded values.
+    """
+
+    version = 1
+    # column name -> (dtype, shape, fill value for missing fields)
+    column_specs = {
+        "timestamp": (np.float64, (), np.nan),
+        "confidence": (np.float64, (), np.nan),
+        "norm_pos": (np.float64, (2,), np.nan),
+        "diameter": (np.float64, (), np.nan),
+        "id": (np.int64, (), -1),
+    }
+
+    def __init__(self, directory, topic):
+        self.directory = directory
+        self.topic = topic
+        self.pldata_path = os.path.join(directory, topic + ".pldata")
+        self.sidecar_dir = os.path.join(directory, topic + "_columns")
+
+        meta = load_object(os.path.join(self.sidecar_dir, "meta"), allow_legacy=False)
+        source_meta = self._source_meta(self.pldata_path)
+        if any(meta.get(key) != value for key, value in source_meta.items()):
+            raise ValueError(f"Columnar sidecar of {self.pldata_path} is outdated")
+        self.topic_names = meta["topics"]
+        self.timestamps = np.load(
+            os.path.join(directory, topic + "_timestamps.npy"), mmap_mode="r"
+        )
+        self.offsets = self._load_array("offsets")
+        self.topic_idc = self._load_array("topic_idc")
+        self.columns = {name: self._load_array(name) for name in self.column_specs}
+        if len(self.offsets) != len(self.timestamps):
+            raise ValueError(f"Columnar sidecar of {self.pldata_path} is invalid")
+
+    def _load_array(self, name):
+        return np.load(os.path.join(self.sidecar_dir, name + ".npy"), mmap_mode="r")
+
+    @classmethod
+    def _source_meta(cls, pldata_path):
+        stat = os.stat(pldata_path)
+        return {
+            "version": cls.version,
+            "source_size": stat.st_size,
+            "source_mtime": stat.st_mtime_ns,
+        }
+
+    @classmethod
+    def build(cls, directory, topic):
+        """Scan `<topic>.pldata` once and write the columnar sidecar"""
+        pldata_path = os.path.join(directory, topic + ".pldata")
+        sidecar_dir = os.path.join(directory, topic + "_columns")
+        os.makedirs(sidecar_dir, exist_ok=True)
+
+        offsets = collections.deque()
+        topic_idc = collections.deque()
+        topic_names = {}
+        values = {name: collections.deque() for name in cls.column_specs}
+        with open(pldata_path, "rb") as fh:
+            unpacker = msgpack.Unpacker(fh, raw=False, use_list=False)
+            offset = 0
+            for record_topic, payload in unpacker:
+                offsets.append(offset)
+                offset = unpacker.tell()
+                topic_idc.append(topic_names.setdefault(record_topic, len(topic_names)))
+                datum = msgpack.unpackb(payload, raw=False, use_list=False)
+                for name, (_, _, fill_value) in cls.column_specs.items():
+                    values[name].append(datum.get(name, fill_value))
+
+        def save(name, array):
+            np.save(os.path.join(sidecar_dir, name + ".npy"), array)
+
+        save("offsets", np.fromiter(offsets, dtype=np.int64, count=len(offsets)))
+        save("topic_idc", np.fromiter(topic_idc, dtype=np.int32, count=len(offsets)))
+        for name, (dtype, shape, _) in cls.column_specs.items():
+            column = np.empty((len(offsets),) + shape, dtype=dtype)
+            for idx, value in enumerate(values[name]):
+                try:
+                    column[idx] = value
+                except (TypeError, ValueError):
+                    column[idx] = cls.column_specs[name][2]
+            save(name, column)
+
+        # The meta file is written last such that interrupted builds are invalid
+        meta = cls._source_meta(pldata_path)
+        meta["topics"] = sorted(topic_names, key=topic_names.get)
+        save_object(meta, os.path.join(sidecar_dir, "meta"))
+        return cls(directory, topic)
+
+    @property
+    def topics(self):
+        return np.asarray(self.topic_names, dtype=object)[self.topic_idc]
+
+    @property
+    def data(self):
+        return Lazy_Serialized_Dict_Sequence(
+            self.pldata_path, self.offsets, columns=self.columns
+        )
+
+    def column(self, name):
+        return self.columns[name]
+
+    def to_pldata(self):
+        return PLData(self.data, self.timestamps, self.topics)
+
+
+def load_pldata_columns(directory, topic, build=True):
+    """Load the columnar sidecar of `<topic>.pldata`, building it if necessary
+
+    Returns None if the source does not exist or the sidecar can not be built.
+    """
+    if not os.path.exists(os.path.join(directory, topic + ".pldata")):
+        return None
+    try:
+        return PLData_Columns(directory, topic)
+    except (OSError, ValueError, KeyError):
+        if not build:
+            return None
+    try:
+        logger.debug(f"Building columnar sidecar for {topic}.pldata")
+        return PLData_Columns.build(directory, topic)
+    except (OSError, ValueError):
+        logger.warning(f"Could not build columnar sidecar for {topic}.pldata")
+        logger.debug(tb.format_exc())
+        return None
+
+
 class PLData_Writer(object):
-    """docstring for PLData_Writer"""
+    """Writes `<name>.pldata` together with `<name>_timestamps.npy`
+
+    Additionally, the byte offset of every msgpack record is stored in
+    `<name>_offsets.npy`, allowing `load_pldata_window` to seek directly to the
+    records of a given time range.
+    """
 
     def __init__(self, directory, name):
         super().__init__()
         self.directory = directory
         self.name = name
         self.ts_queue = collections.deque()
+        self.offset_queue = collections.deque()
+        self.current_offset = 0
         file_name = name + ".pldata"
         self.file_handle = open(os.path.join(directory, file_name), "wb")
 
@@ -171,8 +471,10 @@ class PLData_Writer(object):
 
     def append_serialized(self, timestamp, topic, datum_serialized):
         self.ts_queue.append(timestamp)
+        self.offset_queue.append(self.current_offset)
         pair = msgpack.packb((topic, datum_serialized), use_bin_type=True)
         self.file_handle.write(pair)
+        self.current_offset += len(pair)
 
     def extend(self, data):
         for datum in data:
@@ -187,6 +489,11 @@ class PLData_Writer(object):
         np.save(ts_path, self.ts_queue)
         self.ts_queue = None
 
+        offsets_file = self.name + "_offsets.npy"
+        offsets_path = os.path.join(self.directory, offsets_file)
+        np.save(offsets_path, np.array(self.offset_queue, dtype=np.int64))
+        self.offset_queue = None
+
     def __enter__(self):
         return self
 
@@ -207,17 +514,80 @@ def next_export_sub_dir(root_export_dir):
     return os.path.join(root_export_dir, next_sub_dir)
 
 
-class _Empty(object):
-    def purge_cache(self):
-        pass
+class Serialized_Dict_Cache(object):
+    """Size-bounded LRU cache of deserialized `Serialized_Dict`s
+
+    The cache size is measured by the length of the serialized payloads. Once
+    `max_bytes` is exceeded, the least recently used entries are evicted, i.e.
+    their deserialized data is purged.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = collections.OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "current_bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def touch(self, item):
+        try:
+            self._entries.move_to_end(id(item))
+        except KeyError:
+            return  # deserialized without going through this cache
+        self.hits += 1
+
+    def add(self, item):
+        self.misses += 1
+        self._entries[id(item)] = item
+        self.current_bytes += len(item.serialized)
+        self._evict()
+
+    def resize(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def clear(self):
+        for item in self._entries.values():
+            item.purge_cache()
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def _evict(self):
+        # Always keep the most recently added entry
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            _, item = self._entries.popitem(last=False)
+            self.current_bytes -= len(item.serialized)
+            item.purge_cache()
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
 
 
 class Serialized_Dict(object):
     __slots__ = ["_ser_data", "_data"]
-    cache_len = 100
-    _cache_ref = [_Empty()] * cache_len
+    _cache = Serialized_Dict_Cache(max_bytes=1024 * 1024)
     MSGPACK_EXT_CODE = 13
 
+    @classmethod
+    def cache_stats(cls):
+        return cls._cache.stats
+
     def __init__(self, python_dict=None, msgpack_bytes=None):
         if type(python_dict) is dict:
             self._ser_data = msgpack.packb(
@@ -232,7 +602,7 @@ class Serialized_Dict(object):
         self._data = None
 
     def _deser(self):
-        if not self._data:
+        if self._data is None:
             self._data = msgpack.unpackb(
                 self._ser_data,
                 raw=False,
@@ -240,8 +610,9 @@ class Serialized_Dict(object):
                 object_hook=self.unpacking_object_hook,
                 ext_hook=self.unpacking_ext_hook,
             )
-            self._cache_ref.pop(0).purge_cache()
-            self._cache_ref.append(self)
+            self._cache.add(self)
+        else:
+            self._cache.touch(self)
 
     def __getstate__(self):
         return self._ser_data
@@ -366,6 +737,107 @@ class Serialized_Dict(object):
         )
 
 
+def extract_fields(data, fields, dtype=np.float64, default=np.nan):
+    """Extract numeric fields of a sequence of data into NumPy arrays
+
+    `data` can be any iterable of `Serialized_Dict`s or mappings, e.g. a
+    `pm.Bisector`. Nested fields are addressed by dotted paths, e.g.
+    `"circle_3d.normal"`. Missing fields are filled with `default`.
+
+    Fields that are available as columns of a lazily loaded sequence (see
+    `PLData_Columns`) are read from the memory-mapped sidecar. Other fields are
+    extracted by decoding each payload once for all fields, without going
+    through the `Serialized_Dict` cache.
+
+    `dtype` and `default` can also be dicts of field name to value, e.g. to extract
+    strings with `dtype=object` and `default=None` along with numeric fields.
+    Fields that are not in the dicts are extracted as float64 with NaN default.
+
+    Returns a dict of field name to array of shape `(len(data), *field_shape)`.
+    """
+    result = {}
+    columns = getattr(data, "columns", {})
+    for field in fields:
+        if field in columns:
+            field_dtype = _field_option(dtype, field, np.float64)
+            result[field] = np.asarray(data.column(field), dtype=field_dtype)
+
+    remaining = {
+        field: tuple(field.split(".")) for field in fields if field not in result
+    }
+    if remaining:
+        values = {field: [] for field in remaining}
+        lookups = [(path, values[field].append) for field, path in remaining.items()]
+        for datum in data:
+            datum = _plain_mapping(datum)
+            # this loop runs for every field of every datum, keep it tight
+            for path, append in lookups:
+                value = datum
+                try:
+                    for key in path:
+                        value = value[key]
+                except (KeyError, TypeError, IndexError):
+                    value = None
+                append(value)
+        for field, field_values in values.items():
+            result[field] = _values_to_array(
+                field_values,
+                _field_option(dtype, field, np.float64),
+                _field_option(default, field, np.nan),
+            )
+    return result
+
+
+def extract_field(data, field, dtype=np.float64, default=np.nan):
+    """Extract a single numeric field, see `extract_fields`"""
+    return extract_fields(data, (field,), dtype=dtype, default=default)[field]
+
+
+def _field_option(option, field, fallback):
+    if isinstance(option, dict):
+        return option.get(field, fallback)
+    return option
+
+
+def _plain_mapping(datum):
+    if not isinstance(datum, Serialized_Dict):
+        return datum
+    if datum._data is not None:
+        return datum._data
+    return msgpack.unpackb(
+        datum._ser_data,
+        raw=False,
+        use_list=False,
+        ext_hook=Serialized_Dict.unpacking_ext_hook,
+    )
+
+
+def _values_to_array(values, dtype, default):
+    if np.dtype(dtype).hasobject:
+        # element-wise, such that sequences are kept as single objects
+        array = np.empty(len(values), dtype=object)
+        for idx, value in enumerate(values):
+            array[idx] = default if value is None else value
+        return array
+
+    if not any(value is None for value in values):
+        try:
+            return np.array(values, dtype=dtype)
+        except (TypeError, ValueError):
+            pass  # irregular values, fill element-wise
+
+    shape = next((np.shape(v) for v in values if v is not None), ())
+    array = np.full((len(values),) + shape, default, dtype=dtype)
+    for idx, value in enumerate(values):
+        if value is None:
+            continue
+        try:
+            array[idx] = value
+        except (TypeError, ValueError):
+            pass
+    return array
+
+
 def _recursive_deep_copy(item):
 
     if isinstance(item, collections.abc.Mapping):
@@ -28,8 +28,11 @@ Terms
 
 import csv
 import enum
+import hashlib
 import logging
+import multiprocessing as mp
 import os
+import time
 import typing as T
 from bisect import bisect_left, bisect_right
 from collections import deque
@@ -53,6 +56,9 @@ from plugin import Plugin
 
 logger = logging.getLogger(__name__)
 
+# Seconds between intermediate yields of detect_fixations_in_chunk()
+CHUNK_YIELD_INTERVAL = 0.1
+
 
 class FixationDetectionMethod(enum.Enum):
     GAZE_2D = "2d gaze"
@@ -73,27 +79,42 @@ def fixation_from_data(
     method: FixationDetectionMethod,
     base_data: T.Iterable,
     timestamps=None,
+    base_data_fields=None,
 ):
-    norm_pos = np.mean([gp["norm_pos"] for gp in base_data], axis=0).tolist()
+    """`base_data_fields` are the arrays of `_prepare_gaze_data()` for the base data,
+    which are used instead of decoding the base data again.
+    """
+    if base_data_fields is None:
+        norm_pos = [gp["norm_pos"] for gp in base_data]
+        confidence = [gp["confidence"] for gp in base_data]
+        first_ts, last_ts = base_data[0]["timestamp"], base_data[-1]["timestamp"]
+    else:
+        norm_pos = base_data_fields["norm_pos"]
+        confidence = base_data_fields["confidence"]
+        first_ts = float(base_data_fields["timestamp"][0])
+        last_ts = float(base_data_fields["timestamp"][-1])
     dispersion = np.rad2deg(dispersion)  # in degrees
 
     fix = {
         "topic": "fixations",
-        "norm_pos": norm_pos,
+        "norm_pos": np.mean(norm_pos, axis=0).tolist(),
         "dispersion": dispersion,
         "method": method.value,
         "base_data": list(base_data),
-        "timestamp": base_data[0]["timestamp"],
-        "duration": (base_data[-1]["timestamp"] - base_data[0]["timestamp"]) * 1000,
-        "confidence": float(np.mean([gp["confidence"] for gp in base_data])),
+        "timestamp": first_ts,
+        "duration": (last_ts - first_ts) * 1000,
+        "confidence": float(np.mean(confidence)),
     }
     if method == FixationDetectionMethod.GAZE_3D:
-        fix["gaze_point_3d"] = np.mean(
-            [gp["gaze_point_3d"] for gp in base_data if "gaze_point_3d" in gp], axis=0
-        ).tolist()
+        if base_data_fields is None:
+            gaze_points_3d = [
+                gp["gaze_point_3d"] for gp in base_data if "gaze_point_3d" in gp
+            ]
+        else:
+            gaze_points_3d = base_data_fields["gaze_point_3d"]
+        fix["gaze_point_3d"] = np.mean(gaze_points_3d, axis=0).tolist()
     if timestamps is not None:
-        start, end = base_data[0]["timestamp"], base_data[-1]["timestamp"]
-        start, end = np.searchsorted(timestamps, [start, end])
+        start, end = np.searchsorted(timestamps, [first_ts, last_ts])
         end = min(end, len(timestamps) - 1)  # fix `list index out of range` error
         fix["start_frame_index"] = int(start)
         fix["end_frame_index"] = int(end)
@@ -109,6 +130,9 @@ class Fixation_Result_Factory(object):
 
     def from_data(self, *args, **kwargs):
         datum = fixation_from_data(*args, **kwargs)
+        return self.from_fixation(datum)
+
+    def from_fixation(self, datum):
         self._set_fixation_id(datum)
         fixation_start = datum["timestamp"]
         fixation_stop = fixation_start + (datum["duration"] / 1000)
@@ -133,22 +157,31 @@ def vector_dispersion(vectors):
     return dispersion
 
 
-def gaze_dispersion(capture, gaze_subset, method: FixationDetectionMethod) -> float:
+def gaze_vectors(capture, gaze_data, method: FixationDetectionMethod) -> np.ndarray:
     if method is FixationDetectionMethod.GAZE_3D:
-        vectors = np.array([gp["gaze_point_3d"] for gp in gaze_subset])
+        vectors = fm.extract_field(gaze_data, "gaze_point_3d")
     elif method is FixationDetectionMethod.GAZE_2D:
-        locations = np.array([gp["norm_pos"] for gp in gaze_subset])
-
-        # denormalize
-        width, height = capture.frame_size
-        locations[:, 0] *= width
-        locations[:, 1] = (1.0 - locations[:, 1]) * height
-
-        # undistort onto 3d plane
-        vectors = capture.intrinsics.unprojectPoints(locations)
+        locations = fm.extract_field(gaze_data, "norm_pos")
+        vectors = norm_pos_to_vectors(capture, locations)
     else:
         raise ValueError(f"Unknown method '{method}'")
+    return vectors
 
+
+def norm_pos_to_vectors(capture, locations) -> np.ndarray:
+    locations = np.array(locations, dtype=np.float64)
+
+    # denormalize
+    width, height = capture.frame_size
+    locations[:, 0] *= width
+    locations[:, 1] = (1.0 - locations[:, 1]) * height
+
+    # undistort onto 3d plane
+    return capture.intrinsics.unprojectPoints(locations)
+
+
+def gaze_dispersion(capture, gaze_subset, method: FixationDetectionMethod) -> float:
+    vectors = gaze_vectors(capture, gaze_subset, method)
     dist = vector_dispersion(vectors)
     return dist
 
@@ -157,100 +190,310 @@ def can_use_3d_gaze_mapping(gaze_data) -> bool:
     return all("gaze_point_3d" in gp for gp in gaze_data)
 
 
-def detect_fixations(
-    capture, gaze_data, max_dispersion, min_duration, max_duration, min_data_confidence
-):
-    yield "Detecting fixations...", ()
-    gaze_data = (
-        fm.Serialized_Dict(msgpack_bytes=serialized) for serialized in gaze_data
-    )
-    gaze_data = [
-        datum for datum in gaze_data if datum["confidence"] > min_data_confidence
-    ]
-    if not gaze_data:
-        logger.warning("No data available to find fixations")
-        return "Fixation detection failed", ()
+class Incremental_Dispersion(object):
+    """Decides whether windows of a sequence of gaze vectors are within a dispersion
+
+    For the current window start, the maximum angle R between the first vector and
+    all following vectors of the window is updated in O(1) when vectors enter the
+    window and recalculated in O(k) when the start moves. R is a lower bound of the
+    dispersion of the window and, by the triangle inequality, 2R is an upper bound.
+    The dispersion is only calculated exactly in O(k^2), with the same routine as
+    `vector_dispersion`, if these bounds are inconclusive.
+    """
+
+    # Margin in radians for decisions based on bounds, which are calculated
+    # differently than the exact dispersion.
+    tolerance = 1e-6
+
+    def __init__(self, vectors):
+        self._vectors = np.asarray(vectors, dtype=np.float64)
+        norms = np.linalg.norm(self._vectors, axis=1, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self._unit_vectors = self._vectors / norms
+        # _max_angles[i] is the max. angle between the window start and the
+        # vectors start..i, valid up to _stop
+        self._max_angles = np.empty(len(self._vectors))
+        self._start = None
+        self._stop = 0
+
+    def is_within(self, start, stop, max_dispersion) -> bool:
+        """Whether the dispersion of vectors[start:stop] is <= max_dispersion"""
+        radius = self._radius(start, stop)
+        if radius > max_dispersion + self.tolerance:
+            return False
+        if 2.0 * radius <= max_dispersion - self.tolerance:
+            return True
+        # a tighter upper bound around the mean direction of the window
+        window = self._unit_vectors[start:stop]
+        center = window.sum(axis=0)
+        center /= np.linalg.norm(center)
+        if 2.0 * _angles(center, window).max() <= max_dispersion - self.tolerance:
+            return True
+        return self.dispersion(start, stop) <= max_dispersion
+
+    def dispersion(self, start, stop):
+        return vector_dispersion(self._vectors[start:stop])
+
+    def _radius(self, start, stop):
+        if start != self._start:
+            self._start = start
+            self._stop = start
+        if stop > self._stop:
+            angles = _angles(
+                self._unit_vectors[start], self._unit_vectors[self._stop : stop]
+            )
+            if self._stop > start:
+                angles[0] = max(angles[0], self._max_angles[self._stop - 1])
+            np.maximum.accumulate(angles, out=self._max_angles[self._stop : stop])
+            self._stop = stop
+        return self._max_angles[stop - 1]
+
+
+def _angles(direction, unit_vectors):
+    return np.arccos(np.clip(unit_vectors @ direction, -1.0, 1.0))
 
-    method = (
-        FixationDetectionMethod.GAZE_3D
-        if can_use_3d_gaze_mapping(gaze_data)
-        else FixationDetectionMethod.GAZE_2D
-    )
-    logger.info(f"Starting fixation detection using {method.value} data...")
-    fixation_result = Fixation_Result_Factory()
 
-    working_queue = deque()
-    remaining_gaze = deque(gaze_data)
+def fixation_ranges(vectors, timestamps, max_dispersion, min_duration, max_duration):
+    """Find fixations in a sequence of gaze vectors
 
-    while remaining_gaze:
-        # check if working_queue contains enough data
+    Yields `(start, stop, dispersion)` for every fixation, where `start:stop` is
+    the index range of its base data. The classification follows the working
+    queue algorithm of the original implementation: grow the window to the
+    minimal duration, slide it until it is within `max_dispersion`, extend it up
+    to `max_duration` and binary search for the end of the fixation.
+    """
+    window = Incremental_Dispersion(vectors)
+    num_samples = len(timestamps)
+    start = stop = 0
+
+    while stop < num_samples:
+        # check if window contains enough data
         if (
-            len(working_queue) < 2
-            or (working_queue[-1]["timestamp"] - working_queue[0]["timestamp"])
-            < min_duration
+            stop - start < 2
+            or (timestamps[stop - 1] - timestamps[start]) < min_duration
         ):
-            datum = remaining_gaze.popleft()
-            working_queue.append(datum)
+            stop += 1
             continue
 
         # min duration reached, check for fixation
-        dispersion = gaze_dispersion(capture, working_queue, method)
-        if dispersion > max_dispersion:
+        if not window.is_within(start, stop, max_dispersion):
             # not a fixation, move forward
-            working_queue.popleft()
+            start += 1
             continue
 
-        left_idx = len(working_queue)
-
         # minimal fixation found. collect maximal data
-        # to perform binary search for fixation end
-        while remaining_gaze:
-            datum = remaining_gaze[0]
-            if datum["timestamp"] > working_queue[0]["timestamp"] + max_duration:
+        min_length = stop - start
+        while stop < num_samples:
+            if timestamps[stop] > timestamps[start] + max_duration:
                 break  # maximum data found
-            working_queue.append(remaining_gaze.popleft())
+            stop += 1
 
         # check for fixation with maximum duration
-        dispersion = gaze_dispersion(capture, working_queue, method)
-        if dispersion <= max_dispersion:
-            fixation = fixation_result.from_data(
-                dispersion, method, working_queue, capture.timestamps
-            )
-            yield "Detecting fixations...", fixation
-            working_queue.clear()  # discard old Q
+        if window.is_within(start, stop, max_dispersion):
+            yield start, stop, window.dispersion(start, stop)
+            start = stop
             continue
 
-        slicable = list(working_queue)  # deque does not support slicing
-        right_idx = len(working_queue)
-
-        # binary search
+        # binary search for fixation end. This yields the longest prefix within
+        # `max_dispersion` minus its last sample, but at least the minimal fixation.
+        left_idx = min_length
+        right_idx = stop - start
         while left_idx < right_idx - 1:
             middle_idx = (left_idx + right_idx) // 2
-            dispersion = gaze_dispersion(
-                capture,
-                slicable[: middle_idx + 1],
-                method,
-            )
-            if dispersion <= max_dispersion:
+            if window.is_within(start, start + middle_idx + 1, max_dispersion):
                 left_idx = middle_idx
             else:
                 right_idx = middle_idx
 
-        # left_idx-1 is last valid base datum
-        final_base_data = slicable[:left_idx]
-        to_be_placed_back = slicable[left_idx:]
-        dispersion_result = gaze_dispersion(capture, final_base_data, method)
+        stop = start + left_idx
+        yield start, stop, window.dispersion(start, stop)
+        start = stop
+
+
+def _prepare_gaze_data(capture, gaze_data, min_data_confidence):
+    """Decode and filter serialized gaze, and calculate the gaze vectors
+
+    Returns the valid gaze data, their indices in `gaze_data`, their fields as
+    arrays, gaze vectors, and the detection method.
+    """
+    gaze_data = [
+        fm.Serialized_Dict(msgpack_bytes=serialized) for serialized in gaze_data
+    ]
+    # decode all data only once
+    fields = fm.extract_fields(
+        gaze_data, ("timestamp", "confidence", "norm_pos", "gaze_point_3d")
+    )
+    is_valid = fields["confidence"] > min_data_confidence
+    valid_idc = np.flatnonzero(is_valid)
+    gaze_data = [gaze_data[idx] for idx in valid_idc]
+    fields = {name: values[is_valid] for name, values in fields.items()}
+
+    if not np.isnan(fields["gaze_point_3d"]).any():
+        method = FixationDetectionMethod.GAZE_3D
+        vectors = fields["gaze_point_3d"]
+    else:
+        method = FixationDetectionMethod.GAZE_2D
+        vectors = norm_pos_to_vectors(capture, fields["norm_pos"])
+    return gaze_data, valid_idc, fields, vectors, method
+
+
+def _slice_fields(fields, start, stop):
+    return {name: values[start:stop] for name, values in fields.items()}
 
+
+def detect_fixations(
+    capture, gaze_data, max_dispersion, min_duration, max_duration, min_data_confidence
+):
+    yield "Detecting fixations...", ()
+    gaze_data, _, fields, vectors, method = _prepare_gaze_data(
+        capture, gaze_data, min_data_confidence
+    )
+    if not gaze_data:
+        logger.warning("No data available to find fixations")
+        return "Fixation detection failed", ()
+
+    logger.info(f"Starting fixation detection using {method.value} data...")
+    fixation_result = Fixation_Result_Factory()
+
+    for start, stop, dispersion in fixation_ranges(
+        vectors, fields["timestamp"], max_dispersion, min_duration, max_duration
+    ):
         fixation = fixation_result.from_data(
-            dispersion_result, method, final_base_data, capture.timestamps
+            dispersion,
+            method,
+            gaze_data[start:stop],
+            capture.timestamps,
+            base_data_fields=_slice_fields(fields, start, stop),
         )
         yield "Detecting fixations...", fixation
-        working_queue.clear()  # clear queue
-        remaining_gaze.extendleft(reversed(to_be_placed_back))
 
     yield "Fixation detection complete", ()
 
 
+def fixation_chunks(timestamps, num_chunks, lookahead):
+    """Split sorted gaze timestamps into chunks for parallel fixation detection
+
+    Returns `(start, stop)` index ranges. Each chunk extends `lookahead` seconds
+    into the next chunk such that both detection runs can be synchronized, see
+    `merge_fixation_chunks`.
+    """
+    starts = np.linspace(0, len(timestamps), num_chunks, endpoint=False).astype(int)
+    starts = np.unique(starts)
+    stops = [
+        np.searchsorted(timestamps, timestamps[next_start] + lookahead, side="right")
+        for next_start in starts[1:]
+    ]
+    stops.append(len(timestamps))
+    return list(zip(starts.tolist(), stops))
+
+
+def detect_fixations_in_chunk(
+    capture,
+    gaze_data,
+    chunk_start,
+    max_dispersion,
+    min_duration,
+    max_duration,
+    min_data_confidence,
+):
+    """Background task of the parallel fixation detection
+
+    Classifies one chunk of gaze data, independently of the preceding chunks.
+    Yields a single result that is combined with the other chunks using
+    `merge_fixation_chunks`. Empty results are yielded in between, such that the
+    task can be canceled while it is running.
+    """
+    yield "Detecting fixations...", ()
+    gaze_data, valid_idc, fields, vectors, method = _prepare_gaze_data(
+        capture, gaze_data, min_data_confidence
+    )
+    yield "Detecting fixations...", ()
+    timestamps = fields["timestamp"]
+    fixations = []
+    next_yield_time = time.perf_counter() + CHUNK_YIELD_INTERVAL
+    for start, stop, dispersion in fixation_ranges(
+        vectors, timestamps, max_dispersion, min_duration, max_duration
+    ):
+        if time.perf_counter() > next_yield_time:
+            yield "Detecting fixations...", ()
+            next_yield_time = time.perf_counter() + CHUNK_YIELD_INTERVAL
+        fixation = fixation_from_data(
+            dispersion,
+            method,
+            gaze_data[start:stop],
+            capture.timestamps,
+            base_data_fields=_slice_fields(fields, start, stop),
+        )
+        first_idx = chunk_start + valid_idc[start]
+        last_idx = chunk_start + valid_idc[stop - 1]
+        fixations.append((first_idx, last_idx, fixation))
+
+    chunk_result = {
+        "method": method.value,
+        "valid_idc": chunk_start + valid_idc,
+        "end_ts": timestamps[-1] if len(timestamps) else -np.inf,
+        "fixations": fixations,
+    }
+    yield "Fixation detection complete", chunk_result
+
+
+def merge_fixation_chunks(timestamps, chunk_starts, chunk_results, max_duration):
+    """Combine results of `detect_fixations_in_chunk` in order
+
+    The state of the detection only depends on the start of its working window.
+    A chunk run and the run of the following chunk are therefore identical as
+    soon as both have visited the same window start. Up to this point the
+    fixations of the earlier run are used, afterwards the ones of the later run.
+    The result is identical to `detect_fixations` on sorted gaze data.
+
+    Returns fixation dicts without id, or None if chunks could not be
+    synchronized or used different detection methods.
+    """
+    if len({result["method"] for result in chunk_results}) > 1:
+        return None
+
+    merged = []
+    previous = chunk_results[0]
+    sync_idx = chunk_starts[0]
+    for next_start, result in zip(chunk_starts[1:], chunk_results[1:]):
+        candidates = np.intersect1d(
+            _possible_window_starts(previous), _possible_window_starts(result)
+        )
+        candidates = candidates[candidates >= next_start]
+        # the earlier run must not be affected by the end of its chunk
+        end_ts = min(previous["end_ts"], result["end_ts"])
+        candidates = candidates[timestamps[candidates] + max_duration < end_ts]
+        if not len(candidates):
+            return None
+        next_sync_idx = candidates[0]
+        merged.extend(
+            fixation
+            for first_idx, _, fixation in previous["fixations"]
+            if sync_idx <= first_idx < next_sync_idx
+        )
+        previous = result
+        sync_idx = next_sync_idx
+
+    merged.extend(
+        fixation
+        for first_idx, _, fixation in previous["fixations"]
+        if sync_idx <= first_idx
+    )
+    return merged
+
+
+def _possible_window_starts(chunk_result):
+    # All valid gaze indices that are not covered by a fixation after its start
+    valid_idc = chunk_result["valid_idc"]
+    covered = np.zeros(len(valid_idc) + 1, dtype=int)
+    for first_idx, last_idx, _ in chunk_result["fixations"]:
+        first_pos, last_pos = np.searchsorted(valid_idc, (first_idx, last_idx))
+        covered[first_pos + 1] += 1
+        covered[last_pos + 1] -= 1
+    is_covered = np.cumsum(covered[:-1]) > 0
+    return valid_idc[~is_covered]
+
+
 class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
     """Dispersion-duration-based fixation detector.
 
@@ -269,6 +512,9 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
     fixations will have their method field set to "gaze".
     """
 
+    _offline_data_file_name = "offline_fixations"
+    _offline_data_version = 1
+
     def __init__(
         self,
         g_pool,
@@ -276,16 +522,21 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
         min_duration=80,
         max_duration=220,
         show_fixations=True,
+        parallel_detection=True,
     ):
         super().__init__(g_pool)
         self.max_dispersion = max_dispersion
         self.min_duration = min_duration
         self.max_duration = max_duration
         self.show_fixations = show_fixations
+        self.parallel_detection = parallel_detection
         self.current_fixation_details = None
         self.fixation_data = deque()
         self.prev_index = -1
         self.bg_task = None
+        self.chunk_tasks = []
+        self.chunk_results = []
+        self._detection_key = None
         self.status = ""
         self._gaze_changed_listener = data_changed.Listener(
             "gaze_positions", g_pool.rec_dir, plugin=self
@@ -393,6 +644,11 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
             )
         )
         self.menu.append(ui.Switch("show_fixations", self, label="Show fixations"))
+        self.menu.append(
+            ui.Switch(
+                "parallel_detection", self, label="Use all CPU cores for detection"
+            )
+        )
         self.current_fixation_details = ui.Info_Text("")
         self.menu.append(self.current_fixation_details)
 
@@ -427,9 +683,16 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
         self.prev_fix_button = None
 
     def cleanup(self):
+        self._cancel_tasks()
+
+    def _cancel_tasks(self):
         if self.bg_task:
             self.bg_task.cancel()
             self.bg_task = None
+        for task in self.chunk_tasks:
+            task.cancel()
+        self.chunk_tasks = []
+        self.chunk_results = []
 
     def get_init_dict(self):
         return {
@@ -437,6 +700,7 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
             "min_duration": self.min_duration,
             "max_duration": self.max_duration,
             "show_fixations": self.show_fixations,
+            "parallel_detection": self.parallel_detection,
         }
 
     def on_notify(self, notification):
@@ -454,9 +718,13 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
         """
         if self.g_pool.app == "exporter":
             return
+        if self._load_offline_data():
+            return
+        self._start_detection(parallel=self.parallel_detection)
 
-        if self.bg_task:
-            self.bg_task.cancel()
+    def _start_detection(self, parallel: bool):
+        self._cancel_tasks()
+        self._detection_key = self._offline_data_key()
 
         gaze_data = [gp.serialized for gp in self.g_pool.gaze_positions]
 
@@ -464,9 +732,7 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
         cap.frame_size = self.g_pool.capture.frame_size
         cap.intrinsics = self.g_pool.capture.intrinsics
         cap.timestamps = self.g_pool.capture.timestamps
-        generator_args = (
-            cap,
-            gaze_data,
+        detection_args = (
             np.deg2rad(self.max_dispersion),
             self.min_duration / 1000,
             self.max_duration / 1000,
@@ -476,11 +742,172 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
         self.fixation_data = deque()
         self.fixation_start_ts = deque()
         self.fixation_stop_ts = deque()
-        self.bg_task = bh.IPC_Logging_Task_Proxy(
-            "Fixation detection", detect_fixations, args=generator_args
+
+        chunks = self._detection_chunks() if parallel else []
+        if len(chunks) > 1:
+            self.chunk_results = [None] * len(chunks)
+            for chunk_idx, (start, stop) in enumerate(chunks):
+                task = bh.Pooled_Task_Proxy(
+                    f"Fixation detection {chunk_idx + 1}/{len(chunks)}",
+                    detect_fixations_in_chunk,
+                    args=(cap, gaze_data[start:stop], start, *detection_args),
+                )
+                task.chunk_start = start
+                self.chunk_tasks.append(task)
+        else:
+            self.bg_task = bh.Pooled_Task_Proxy(
+                "Fixation detection",
+                detect_fixations,
+                args=(cap, gaze_data, *detection_args),
+            )
+
+    def _detection_chunks(self):
+        timestamps = self.g_pool.gaze_positions.timestamps
+        if len(timestamps) < 2:
+            return []
+        # Only split long recordings, process startup dominates short chunks
+        min_chunk_duration = 60.0
+        total_duration = timestamps[-1] - timestamps[0]
+        num_chunks = min(mp.cpu_count(), int(total_duration // min_chunk_duration))
+        lookahead = max(10 * self.max_duration / 1000, 2.0)
+        return fixation_chunks(timestamps, max(num_chunks, 1), lookahead)
+
+    def _fetch_chunk_results(self):
+        for chunk_idx, task in enumerate(self.chunk_tasks):
+            for progress, chunk_result in task.fetch():
+                if chunk_result:
+                    self.chunk_results[chunk_idx] = chunk_result
+
+        num_chunks = len(self.chunk_tasks)
+        num_done = sum(task.completed or task.canceled for task in self.chunk_tasks)
+        self.status = f"Detecting fixations... ({num_done}/{num_chunks} chunks)"
+        self.menu_icon.indicator_stop = num_done / num_chunks
+        if num_done < num_chunks:
+            return
+
+        chunk_starts = [task.chunk_start for task in self.chunk_tasks]
+        merged = None
+        if all(self.chunk_results):
+            merged = merge_fixation_chunks(
+                self.g_pool.gaze_positions.timestamps,
+                chunk_starts,
+                self.chunk_results,
+                self.max_duration / 1000,
+            )
+        self.chunk_tasks = []
+        self.chunk_results = []
+        if merged is None:
+            logger.debug("Could not merge fixation chunks. Detecting sequentially.")
+            self._start_detection(parallel=False)
+            return
+
+        # Reassign ids in order of the merged fixations
+        fixation_result = Fixation_Result_Factory()
+        for fixation in merged:
+            serialized, start_ts, stop_ts = fixation_result.from_fixation(fixation)
+            self.fixation_data.append(fm.Serialized_Dict(msgpack_bytes=serialized))
+            self.fixation_start_ts.append(start_ts)
+            self.fixation_stop_ts.append(stop_ts)
+        self.status = "{} fixations detected".format(len(self.fixation_data))
+        self.correlate_and_publish()
+        self._save_offline_data()
+        self.menu_icon.indicator_stop = 0.0
+
+    def _offline_data_key(self):
+        """
+        Identifies a detection result by the gaze data and all parameters that
+        influence it. Returns None if the gaze data can not be identified.
+        """
+        gaze_token = self._gaze_changed_listener.current_token
+        if gaze_token is None:
+            return None
+        capture = self.g_pool.capture
+        world_timestamps = capture.timestamps
+        key_data = (
+            self._offline_data_version,
+            gaze_token,
+            self.max_dispersion,
+            self.min_duration,
+            self.max_duration,
+            self.g_pool.min_data_confidence,
+            tuple(capture.frame_size),
+            capture.intrinsics.cam_type,
+            capture.intrinsics.K.tolist(),
+            capture.intrinsics.D.tolist(),
+            len(world_timestamps),
+            float(world_timestamps[0]) if len(world_timestamps) else None,
+            float(world_timestamps[-1]) if len(world_timestamps) else None,
         )
+        return hashlib.sha1(repr(key_data).encode()).hexdigest()
+
+    @property
+    def _offline_data_dir(self):
+        return os.path.join(self.g_pool.rec_dir, "offline_data")
+
+    def _load_offline_data(self):
+        key = self._offline_data_key()
+        if key is None:
+            return False
+        directory = self._offline_data_dir
+        file_name = self._offline_data_file_name
+        try:
+            meta = fm.load_object(os.path.join(directory, file_name + ".meta"))
+            stop_ts = np.load(
+                os.path.join(directory, file_name + "_stop_timestamps.npy")
+            )
+        except FileNotFoundError:
+            return False
+        if meta.get("version") != self._offline_data_version or meta.get("key") != key:
+            return False
+        pldata = fm.load_pldata_file(directory, file_name)
+        if len(pldata.data) != len(stop_ts):
+            return False
+
+        self._cancel_tasks()
+        self.fixation_data = deque(pldata.data)
+        self.fixation_start_ts = deque(pldata.timestamps)
+        self.fixation_stop_ts = deque(stop_ts.tolist())
+        self.status = "{} fixations loaded from cache".format(len(self.fixation_data))
+        self.correlate_and_publish()
+        logger.debug("Loaded cached fixations from {}".format(directory))
+        return True
+
+    def _save_offline_data(self):
+        key = self._detection_key
+        if key is None:
+            return
+        try:
+            self._write_offline_data(key)
+        except OSError as err:
+            # The fixations stay available until Player is closed
+            logger.warning(f"Could not save detected fixations: {err}")
+
+    def _write_offline_data(self, key):
+        directory = self._offline_data_dir
+        file_name = self._offline_data_file_name
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, file_name + ".meta")
+        # Invalidate the previous results first, such that a crash while writing
+        # never leaves a meta file next to data of another detection
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        with fm.PLData_Writer(directory, file_name) as writer:
+            for start_ts, fixation in zip(self.fixation_start_ts, self.fixation_data):
+                writer.append_serialized(start_ts, "fixations", fixation.serialized)
+        np.save(
+            os.path.join(directory, file_name + "_stop_timestamps.npy"),
+            np.asarray(self.fixation_stop_ts, dtype=np.float64),
+        )
+        # Written last and replaced atomically, such that partially written results
+        # are never loaded
+        meta = {"version": self._offline_data_version, "key": key}
+        fm.save_object(meta, meta_path + ".tmp")
+        os.replace(meta_path + ".tmp", meta_path)
 
     def recent_events(self, events):
+        if self.chunk_tasks:
+            self._fetch_chunk_results()
+
         if self.bg_task:
             for progress, fixation_result in self.bg_task.fetch():
                 self.status = progress
@@ -501,6 +928,7 @@ class Offline_Fixation_Detector(Observable, Fixation_Detector_Base):
             if self.bg_task.completed:
                 self.status = "{} fixations detected".format(len(self.fixation_data))
                 self.correlate_and_publish()
+                self._save_offline_data()
                 self.bg_task = None
                 self.menu_icon.indicator_stop = 0.0
 
@@ -194,58 +194,48 @@ class Gazer2D(GazerBase):
     def predict(
         self, matched_pupil_data: T.Iterator[T.List["Pupil"]]
     ) -> T.Iterator["Gaze"]:
-        for pupil_match in matched_pupil_data:
-            num_matched = len(pupil_match)
-            gaze_positions = ...  # Placeholder for gaze_positions
-
-            if num_matched == 2:
-                if self.binocular_model.is_fitted:
-                    right = self._extract_pupil_features([pupil_match[0]])
-                    left = self._extract_pupil_features([pupil_match[1]])
-                    X = np.hstack([left, right])
-                    assert X.shape[1] == _BINOCULAR_FEATURE_COUNT
-                    gaze_positions = self.binocular_model.predict(X).tolist()
-                    topic = "gaze.2d.01."
-                else:
-                    logger.debug(
-                        "Prediction failed because binocular model is not fitted"
-                    )
-            elif num_matched == 1:
-                X = self._extract_pupil_features([pupil_match[0]])
-                assert X.shape[1] == _MONOCULAR_FEATURE_COUNT
-                if pupil_match[0]["id"] == 0:
-                    if self.right_model.is_fitted:
-                        gaze_positions = self.right_model.predict(X).tolist()
-                        topic = "gaze.2d.0."
-                    else:
-                        logger.debug(
-                            "Prediction failed because right model is not fitted"
-                        )
-                elif pupil_match[0]["id"] == 1:
-                    if self.left_model.is_fitted:
-                        gaze_positions = self.left_model.predict(X).tolist()
-                        topic = "gaze.2d.1."
-                    else:
-                        logger.debug(
-                            "Prediction failed because left model is not fitted"
-                        )
-            else:
-                raise ValueError(
-                    f"Unexpected number of matched pupil_data: {num_matched}"
-                )
+        for batch in self._pupil_match_batches(matched_pupil_data):
+            yield from self._predict_matches(batch)
 
-            if gaze_positions is ...:
+    def _predict_matches(self, pupil_matches) -> T.Iterator["Gaze"]:
+        gaze_positions = [None] * len(pupil_matches)
+        topics = [None] * len(pupil_matches)
+
+        indices_by_model_key = self._indices_by_model_key(pupil_matches)
+        for model_key, indices in indices_by_model_key.items():
+            model, topic = self._prediction_model(model_key, "gaze.2d.")
+            if model is None:
                 continue  # Prediction failed and the reason was logged
 
-            for gaze_pos in gaze_positions:
-                gaze_datum = {
-                    "topic": topic,
-                    "norm_pos": gaze_pos,
-                    "confidence": np.mean([p["confidence"] for p in pupil_match]),
-                    "timestamp": np.mean([p["timestamp"] for p in pupil_match]),
-                    "base_data": pupil_match,
-                }
-                yield gaze_datum
+            if model_key == "binocular":
+                right = self._extract_pupil_features(
+                    [pupil_matches[idx][0] for idx in indices]
+                )
+                left = self._extract_pupil_features(
+                    [pupil_matches[idx][1] for idx in indices]
+                )
+                X = np.hstack([left, right])
+                assert X.shape[1] == _BINOCULAR_FEATURE_COUNT
+            else:
+                X = self._extract_pupil_features(
+                    [pupil_matches[idx][0] for idx in indices]
+                )
+                assert X.shape[1] == _MONOCULAR_FEATURE_COUNT
+            for idx, gaze_pos in zip(indices, model.predict(X).tolist()):
+                gaze_positions[idx] = gaze_pos
+                topics[idx] = topic
+
+        for pupil_match, gaze_pos, topic in zip(pupil_matches, gaze_positions, topics):
+            if gaze_pos is None:
+                continue
+            gaze_datum = {
+                "topic": topic,
+                "norm_pos": gaze_pos,
+                "confidence": np.mean([p["confidence"] for p in pupil_match]),
+                "timestamp": np.mean([p["timestamp"] for p in pupil_match]),
+                "base_data": pupil_match,
+            }
+            yield gaze_datum
 
     def filter_pupil_data(
         self, pupil_data: T.Iterable, confidence_threshold: T.Optional[float] = None
@@ -34,7 +34,7 @@ from .utils import (
     get_eye_cam_pose_in_world,
 )
 
-from .utils import _clamp_norm_point
+from .utils import _clamp_norm_point, _clamp_norm_points
 
 
 logger = logging.getLogger(__name__)
@@ -62,6 +62,10 @@ class Model3D(Model):
     def _predict_single(self, x):
         pass
 
+    @abc.abstractmethod
+    def _predict_batch(self, X, **kwargs):
+        pass
+
     def __init__(self, *, intrinsics: T.Optional[T.Any], initial_depth=500):
         self.intrinsics = intrinsics
         self.initial_depth = initial_depth
@@ -81,11 +85,20 @@ class Model3D(Model):
         self._is_fitted = True
 
     def predict(self, X):
-        assert X.ndim == 2
-        predictions = (self._predict_single(x) for x in X)
+        predictions = self.predict_batch(X)
         predictions = filter(bool, predictions)
         return predictions
 
+    def predict_batch(self, X, **kwargs) -> T.List[T.Optional[dict]]:
+        """
+        Maps all rows of X at once. Returns one gaze dict per row, or None for rows
+        that could not be mapped. Results equal those of _predict_single.
+        """
+        assert X.ndim == 2
+        if len(X) == 0:
+            return []
+        return self._predict_batch(X, **kwargs)
+
     def set_params(self, **params):
         self._params = params
         self._is_fitted = True
@@ -176,6 +189,45 @@ class Model3D_Monocular(Model3D):
 
         return g
 
+    def _predict_batch(self, X, gaze_distances=None):
+        """
+        :param gaze_distances: optional gaze distance per row, e.g. the binocular
+            gaze distance at the time of each sample. Defaults to gaze_distance.
+        """
+        assert X.shape[1] == _MONOCULAR_FEATURE_COUNT, X
+        if gaze_distances is None:
+            gaze_distances = self.gaze_distance
+        else:
+            gaze_distances = np.asarray(gaze_distances).reshape(-1, 1)
+        pupil_normals = X[:, _MONOCULAR_PUPIL_NORMAL]
+        sphere_centers = X[:, _MONOCULAR_SPHERE_CENTER]
+        gaze_points = pupil_normals * gaze_distances + sphere_centers
+
+        eye_centers = _transform_points(self.eye_camera_to_world_matrix, sphere_centers)
+        gazes_3d = _transform_points(self.eye_camera_to_world_matrix, gaze_points)
+        normals_3d = pupil_normals @ self.rotation_matrix.T
+
+        predictions = [
+            {
+                "eye_center_3d": eye_center,
+                "gaze_normal_3d": normal_3d,
+                "gaze_point_3d": gaze_3d,
+            }
+            for eye_center, normal_3d, gaze_3d in zip(
+                eye_centers.tolist(), normals_3d.tolist(), gazes_3d.tolist()
+            )
+        ]
+
+        if self.intrinsics is not None:
+            image_points = self.intrinsics.projectPoints(
+                gaze_points, self.rotation_vector, self.translation_vector
+            )
+            norm_positions = _normalize_image_points(image_points, self.intrinsics)
+            for g, norm_pos in zip(predictions, norm_positions):
+                g["norm_pos"] = norm_pos
+
+        return predictions
+
     def _toWorld(self, p):
         point = np.ones(4)
         point[:3] = p[:3]
@@ -227,6 +279,8 @@ class Model3D_Binocular(Model3D):
     def set_params(self, **params):
         super().set_params(**params)
         self.last_gaze_distance = 500.0
+        # gaze distance per row of the last batch prediction
+        self.last_gaze_distances = None
 
         self.eye_camera_to_world_matricies = (
             np.asarray(params["eye_camera_to_world_matrix0"]),
@@ -305,6 +359,60 @@ class Model3D_Binocular(Model3D):
 
         return g
 
+    def _predict_batch(self, X):
+        self.last_gaze_distances = None
+        assert X.shape[1] == _BINOCULAR_FEATURE_COUNT, X
+        # Same computation as _predict_single, but for all rows at once
+        s1_centers = _transform_points(
+            self.eye_camera_to_world_matricies[1], X[:, _MONOCULAR_SPHERE_CENTER]
+        )
+        s0_centers = _transform_points(
+            self.eye_camera_to_world_matricies[0], X[:, _BINOCULAR_SPHERE_CENTER]
+        )
+        s1_normals = X[:, _MONOCULAR_PUPIL_NORMAL] @ self.rotation_matricies[1].T
+        s0_normals = X[:, _BINOCULAR_PUPIL_NORMAL] @ self.rotation_matricies[0].T
+
+        cyclop_normals = (s0_normals + s1_normals) / 2.0
+        cyclop_centers = (s0_centers + s1_centers) / 2.0
+
+        gaze_planes = np.cross(cyclop_normals, s1_centers - s0_centers)
+        gaze_planes /= np.linalg.norm(gaze_planes, axis=1)[:, np.newaxis]
+
+        s0_norms_on_plane = s0_normals - _row_dot(gaze_planes, s0_normals) * gaze_planes
+        s1_norms_on_plane = s1_normals - _row_dot(gaze_planes, s1_normals) * gaze_planes
+
+        intersection_points = _nearest_intersections(
+            s0_centers, s0_norms_on_plane, s1_centers, s1_norms_on_plane
+        )
+
+        predictions = [
+            {
+                "eye_centers_3d": {0: s0_center, 1: s1_center},
+                "gaze_normals_3d": {0: s0_normal, 1: s1_normal},
+                "gaze_point_3d": intersection_point,
+            }
+            for s0_center, s1_center, s0_normal, s1_normal, intersection_point in zip(
+                s0_centers.tolist(),
+                s1_centers.tolist(),
+                s0_normals.tolist(),
+                s1_normals.tolist(),
+                intersection_points.tolist(),
+            )
+        ]
+
+        if self.intrinsics is not None:
+            cyclop_gazes = intersection_points - cyclop_centers
+            self.last_gaze_distances = np.sqrt(_row_dot(cyclop_gazes, cyclop_gazes))[
+                :, 0
+            ]
+            self.last_gaze_distance = self.last_gaze_distances[-1]
+            image_points = self.intrinsics.projectPoints(intersection_points)
+            norm_positions = _normalize_image_points(image_points, self.intrinsics)
+            for g, norm_pos in zip(predictions, norm_positions):
+                g["norm_pos"] = norm_pos
+
+        return predictions
+
     def _eye0_to_World(self, p):
         point = np.ones(4)
         point[:3] = p[:3]
@@ -316,6 +424,61 @@ class Model3D_Binocular(Model3D):
         return np.dot(self.eye_camera_to_world_matricies[1], point)[:3]
 
 
+def _transform_points(transformation_matrix, points):
+    return points @ transformation_matrix[:3, :3].T + transformation_matrix[:3, 3]
+
+
+def _row_dot(a, b):
+    return np.einsum("ij,ij->i", a, b)[:, np.newaxis]
+
+
+def _nearest_intersections(centers0, directions0, centers1, directions1):
+    """
+    Vectorized version of math_helper.nearest_intersection for lines given by a
+    point and a direction each.
+    """
+
+    def normalise(directions):
+        magnitudes = np.sqrt(_row_dot(directions, directions))
+        return np.divide(
+            directions,
+            magnitudes,
+            out=np.zeros_like(directions),
+            where=magnitudes != 0,
+        )
+
+    d0 = normalise(directions0)
+    d1 = normalise(directions1)
+
+    diff = centers0 - centers1
+    a01 = -_row_dot(d0, d1)
+    b0 = _row_dot(diff, d0)
+    b1 = -_row_dot(diff, d1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        det = 1.0 - a01 * a01
+        s0 = (a01 * b1 - b0) / det
+        s1 = (a01 * b0 - b1) / det
+
+    # Lines are parallel, select any pair of closest points.
+    parallel = ~(np.abs(a01) < 1.0)
+    s0 = np.where(parallel, -b0, s0)
+    s1 = np.where(parallel, 0.0, s1)
+
+    closest_points0 = centers0 + s0 * d0
+    closest_points1 = centers1 + s1 * d1
+    return closest_points1 + (closest_points0 - closest_points1) * 0.5
+
+
+def _normalize_image_points(image_points, intrinsics):
+    width, height = intrinsics.resolution
+    image_points = image_points.reshape(-1, 2)
+    norm_points = np.empty_like(image_points)
+    norm_points[:, 0] = image_points[:, 0] / float(width)
+    norm_points[:, 1] = 1 - image_points[:, 1] / float(height)
+    return list(zip(*_clamp_norm_points(norm_points).T))
+
+
 class Gazer3D(GazerBase):
     label = "3D"
 
@@ -361,57 +524,71 @@ class Gazer3D(GazerBase):
     def predict(
         self, matched_pupil_data: T.Iterator[T.List["Pupil"]]
     ) -> T.Iterator["Gaze"]:
-        for pupil_match in matched_pupil_data:
-            num_matched = len(pupil_match)
-            gaze_positions = ...  # Placeholder for gaze_positions
-
-            if num_matched == 2:
-                if self.binocular_model.is_fitted:
-                    right = self._extract_pupil_features([pupil_match[0]])
-                    left = self._extract_pupil_features([pupil_match[1]])
-                    X = np.hstack([left, right])
-                    gaze_positions = self.binocular_model.predict(X)
-                    topic = "gaze.3d.01."
-                else:
-                    logger.debug(
-                        "Prediction failed because binocular model is not fitted"
-                    )
-            elif num_matched == 1:
-                X = self._extract_pupil_features([pupil_match[0]])
-                if pupil_match[0]["id"] == 0:
-                    if self.right_model.is_fitted:
-                        gaze_positions = self.right_model.predict(X)
-                        topic = "gaze.3d.0."
-                    else:
-                        logger.debug(
-                            "Prediction failed because right model is not fitted"
-                        )
-                elif pupil_match[0]["id"] == 1:
-                    if self.left_model.is_fitted:
-                        gaze_positions = self.left_model.predict(X)
-                        topic = "gaze.3d.1."
-                    else:
-                        logger.debug(
-                            "Prediction failed because left model is not fitted"
-                        )
-            else:
-                raise ValueError(
-                    f"Unexpected number of matched pupil_data: {num_matched}"
+        for batch in self._pupil_match_batches(matched_pupil_data):
+            yield from self._predict_matches(batch)
+
+    def _predict_matches(self, pupil_matches) -> T.Iterator["Gaze"]:
+        indices_by_model_key = self._indices_by_model_key(pupil_matches)
+
+        gaze_positions = [None] * len(pupil_matches)
+        topics = [None] * len(pupil_matches)
+
+        # Monocular predictions depend on the gaze distance of the preceding
+        # binocular prediction. Predict binocular matches first and pass the gaze
+        # distances on, such that results equal predicting one match at a time.
+        binocular_indices = indices_by_model_key.pop("binocular", [])
+        binocular_gaze_distances = None
+        if self.binocular_model.is_fitted:
+            binocular_gaze_distance = self.binocular_model.last_gaze_distance
+        if binocular_indices:
+            model, topic = self._prediction_model("binocular", "gaze.3d.")
+            if model is not None:
+                right = self._extract_pupil_features(
+                    [pupil_matches[idx][0] for idx in binocular_indices]
                 )
-
-            if gaze_positions is ...:
+                left = self._extract_pupil_features(
+                    [pupil_matches[idx][1] for idx in binocular_indices]
+                )
+                predictions = model.predict_batch(np.hstack([left, right]))
+                binocular_gaze_distances = model.last_gaze_distances
+                for idx, gaze_pos in zip(binocular_indices, predictions):
+                    gaze_positions[idx] = gaze_pos
+                    topics[idx] = topic
+
+        for model_key, indices in indices_by_model_key.items():
+            model, topic = self._prediction_model(model_key, "gaze.3d.")
+            if model is None:
                 continue  # Prediction failed and the reason was logged
 
-            for gaze_pos in gaze_positions:
-                gaze_pos.update(
-                    {
-                        "topic": topic,
-                        "confidence": np.mean([p["confidence"] for p in pupil_match]),
-                        "timestamp": np.mean([p["timestamp"] for p in pupil_match]),
-                        "base_data": pupil_match,
-                    }
-                )
-                yield gaze_pos
+            gaze_distances = None
+            binocular_model = model.binocular_model
+            if binocular_model is self.binocular_model and binocular_model.is_fitted:
+                gaze_distances = np.full(len(indices), binocular_gaze_distance)
+                if binocular_gaze_distances is not None:
+                    preceding = np.searchsorted(binocular_indices, indices) - 1
+                    has_preceding = preceding >= 0
+                    gaze_distances[has_preceding] = binocular_gaze_distances[
+                        preceding[has_preceding]
+                    ]
+
+            X = self._extract_pupil_features([pupil_matches[idx][0] for idx in indices])
+            predictions = model.predict_batch(X, gaze_distances=gaze_distances)
+            for idx, gaze_pos in zip(indices, predictions):
+                gaze_positions[idx] = gaze_pos
+                topics[idx] = topic
+
+        for pupil_match, gaze_pos, topic in zip(pupil_matches, gaze_positions, topics):
+            if not gaze_pos:
+                continue
+            gaze_pos.update(
+                {
+                    "topic": topic,
+                    "confidence": np.mean([p["confidence"] for p in pupil_match]),
+                    "timestamp": np.mean([p["timestamp"] for p in pupil_match]),
+                    "base_data": pupil_match,
+                }
+            )
+            yield gaze_pos
 
     def filter_pupil_data(
         self, pupil_data: T.Iterable, confidence_threshold: T.Optional[float] = None
@@ -159,3 +159,9 @@ def _clamp_norm_point(pos):
     and can cause overflow erorr when denormalized and cast as int32.
     """
     return min(100.0, max(-100.0, pos[0])), min(100.0, max(-100.0, pos[1]))
+
+
+def _clamp_norm_points(points):
+    """Vectorized version of _clamp_norm_point"""
+    points = np.where(points > -100.0, points, -100.0)
+    return np.where(points < 100.0, points, 100.0)
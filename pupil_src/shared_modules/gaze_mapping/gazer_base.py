@@ -20,7 +20,7 @@ import numpy as np
 from plugin import Plugin
 import file_methods as fm
 
-from .matching import RealtimeMatcher
+from .matching import OfflineMatcher, RealtimeMatcher
 from .notifications import (
     CalibrationSuccessNotification,
     CalibrationFailureNotification,
@@ -35,6 +35,8 @@ from .utils import (
 
 logger = logging.getLogger(__name__)
 
+_PREDICTION_BATCH_SIZE = 1000
+
 
 class CalibrationError(Exception):
     message = "Unexpected error. Please check the log file."
@@ -373,6 +375,78 @@ class GazerBase(abc.ABC, Plugin):
 
         yield from self.predict(matches)
 
+    def map_pupil_to_gaze_offline(self, pupil_data, start_ts=None):
+        """Maps all pupil data of a recording at once
+
+        Yields the same gaze as map_pupil_to_gaze with a new matcher, but matches
+        the pupil data with an OfflineMatcher.
+
+        Pupil data before `start_ts` is only used to initialize the matcher and the
+        models, e.g. the gaze distance of 3d models. No gaze is yielded for matches
+        made while processing it. This allows to map a recording in chunks that are
+        preceded by the end of the previous chunk.
+        """
+        pupil_data = self.filter_pupil_data(pupil_data)
+        pupil_data.sort(key=lambda p: p["timestamp"])
+        num_warm_up = 0
+        if start_ts is not None:
+            num_warm_up = sum(1 for p in pupil_data if p["timestamp"] < start_ts)
+        if num_warm_up:
+            # matches made while processing data only depend on preceding data
+            warm_up_matches = OfflineMatcher().match(pupil_data[:num_warm_up])
+            for _ in self.predict(warm_up_matches):
+                pass
+        matches = OfflineMatcher().match(pupil_data, num_warm_up=num_warm_up)
+        yield from self.predict(matches)
+
+    # -- Batched Prediction
+
+    @staticmethod
+    def _pupil_match_batches(matched_pupil_data) -> T.Iterator[T.List]:
+        matched_pupil_data = iter(matched_pupil_data)
+        while True:
+            batch = list(itertools.islice(matched_pupil_data, _PREDICTION_BATCH_SIZE))
+            if not batch:
+                return
+            yield batch
+
+    @staticmethod
+    def _indices_by_model_key(pupil_matches) -> T.Dict[T.Any, T.List[int]]:
+        """Groups indices of matches by the model that maps them
+
+        Keys are "binocular" for binocular matches and the eye id otherwise.
+        """
+        indices_by_model_key = collections.defaultdict(list)
+        for idx, pupil_match in enumerate(pupil_matches):
+            num_matched = len(pupil_match)
+            if num_matched == 2:
+                model_key = "binocular"
+            elif num_matched == 1:
+                model_key = pupil_match[0]["id"]
+            else:
+                raise ValueError(
+                    f"Unexpected number of matched pupil_data: {num_matched}"
+                )
+            indices_by_model_key[model_key].append(idx)
+        return indices_by_model_key
+
+    def _prediction_model(
+        self, model_key, topic_prefix: str
+    ) -> T.Tuple[T.Optional[Model], str]:
+        """Returns the fitted model and gaze topic for a model key, or None"""
+        if model_key == "binocular":
+            model, topic, name = self.binocular_model, "01.", "binocular"
+        elif model_key == 0:
+            model, topic, name = self.right_model, "0.", "right"
+        elif model_key == 1:
+            model, topic, name = self.left_model, "1.", "left"
+        else:
+            return None, ""
+        if not model.is_fitted:
+            logger.debug(f"Prediction failed because {name} model is not fitted")
+            return None, ""
+        return model, topic_prefix + topic
+
 
 class Matches(T.NamedTuple):
     left: object
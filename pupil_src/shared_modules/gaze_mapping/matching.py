@@ -100,3 +100,161 @@ class RealtimeMatcher:
         elif len(self._caches[1]) > self.sample_cutoff:
             p = self._caches[1].popleft()
             yield [p]
+
+
+class OfflineMatcher:
+    """Matches all pupil data of a recording at once.
+
+    Produces the same matches as feeding the data one datum at a time into a new
+    RealtimeMatcher, but works on plain timestamp, eye id and confidence arrays
+    instead of queues of pupil data. The caches of the realtime matcher are
+    represented as ranges of the per-eye timestamp arrays, such that each datum
+    is processed in constant time.
+    """
+
+    def __init__(self):
+        realtime_matcher = RealtimeMatcher()
+        self.min_pupil_confidence = realtime_matcher.min_pupil_confidence
+        self.initial_framerate = realtime_matcher.recently_estimated_framerate
+        self.framerate_estimation_smoothing_factor = (
+            realtime_matcher.framerate_estimation_smoothing_factor
+        )
+        self.sample_cutoff = realtime_matcher.sample_cutoff
+
+    def match(self, pupil_data, num_warm_up=0) -> T.List[T.List]:
+        """Returns matches like RealtimeMatcher.on_pupil_datum for sorted data"""
+        match_indices = self.match_indices(
+            [p["timestamp"] for p in pupil_data],
+            [p["id"] for p in pupil_data],
+            [p["confidence"] for p in pupil_data],
+            num_warm_up=num_warm_up,
+        )
+        return [
+            [pupil_data[idx0], pupil_data[idx1]] if idx1 >= 0 else [pupil_data[idx0]]
+            for idx0, idx1 in match_indices.tolist()
+        ]
+
+    def match_indices(
+        self, timestamps, eye_ids, confidences, num_warm_up=0
+    ) -> np.ndarray:
+        """Matches pupil data given by timestamp sorted arrays.
+
+        Returns an array of shape (num_matches, 2) with indices into the input
+        arrays. Binocular matches hold the eye 0 index first, monocular matches
+        have -1 as second index.
+
+        The first `num_warm_up` data only initialize the matcher state: matches
+        returned while processing them are dropped. This allows to match a
+        recording in chunks, with each chunk being preceded by the end of the
+        previous one.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        eye_ids = np.asarray(eye_ids, dtype=np.int64)
+        confidences = np.asarray(confidences, dtype=np.float64)
+        if not np.isin(eye_ids, (0, 1)).all():
+            raise ValueError("Pupil data can only be matched for eye ids 0 and 1")
+
+        # indices, timestamps and confidences of each eye's data
+        eye_indices = [np.flatnonzero(eye_ids == eye_id) for eye_id in (0, 1)]
+        ts0, ts1 = (timestamps[indices].tolist() for indices in eye_indices)
+        conf0, conf1 = (confidences[indices].tolist() for indices in eye_indices)
+        idc0, idc1 = (indices.tolist() for indices in eye_indices)
+
+        min_confidence = self.min_pupil_confidence
+        smoothing_factor = self.framerate_estimation_smoothing_factor
+        sample_cutoff = self.sample_cutoff
+        framerate = self.initial_framerate
+
+        # The cache of each eye are its data in [head, tail)
+        head0 = head1 = tail0 = tail1 = 0
+        matches = []
+        num_warm_up_matches = 0
+        for step, eye_id in enumerate(eye_ids.tolist()):
+            if step == num_warm_up:
+                num_warm_up_matches = len(matches)
+            if eye_id == 0:
+                tail0 += 1
+            else:
+                tail1 += 1
+            len0 = tail0 - head0
+            len1 = tail1 - head1
+
+            if len0 >= 2 and len1 >= 2:
+                framerate_raw = max(
+                    _mean_diff(ts0, head0, tail0), _mean_diff(ts1, head1, tail1)
+                )
+                framerate += (framerate_raw - framerate) * smoothing_factor
+            elif len0 >= 2:
+                framerate_raw = _mean_diff(ts0, head0, tail0)
+                framerate += (framerate_raw - framerate) * smoothing_factor
+            elif len1 >= 2:
+                framerate_raw = _mean_diff(ts1, head1, tail1)
+                framerate += (framerate_raw - framerate) * smoothing_factor
+            temporal_cutoff = 2 * framerate
+
+            # map low confidence pupil data monocularly
+            if len0 and conf0[head0] < min_confidence:
+                matches.append((idc0[head0], -1))
+                head0 += 1
+            elif len1 and conf1[head1] < min_confidence:
+                matches.append((idc1[head1], -1))
+                head1 += 1
+            # map high confidence data binocularly if available
+            elif len0 and len1:
+                if abs(ts0[head0] - ts1[head1]) < temporal_cutoff:
+                    matches.append((idc0[head0], idc1[head1]))
+                elif ts0[head0] < ts1[head1]:
+                    matches.append((idc0[head0], -1))
+                else:
+                    matches.append((idc1[head1], -1))
+                # the older datum is removed from its cache
+                if ts0[head0] < ts1[head1]:
+                    head0 += 1
+                else:
+                    head1 += 1
+            elif len0 > sample_cutoff:
+                matches.append((idc0[head0], -1))
+                head0 += 1
+            elif len1 > sample_cutoff:
+                matches.append((idc1[head1], -1))
+                head1 += 1
+
+        if num_warm_up >= len(eye_ids):
+            num_warm_up_matches = len(matches)
+        matches = matches[num_warm_up_matches:]
+        return np.array(matches, dtype=np.int64).reshape(-1, 2)
+
+
+def _mean_diff(values, start, stop):
+    """Equals np.mean(np.diff(values[start:stop])) without the overhead for few values
+
+    Differences are summed in the same order as NumPy's pairwise summation, which
+    sums blocks of up to 128 values with eight partial sums.
+    """
+    num_diffs = stop - start - 1
+    if num_diffs == 1:
+        return values[start + 1] - values[start]
+    elif num_diffs == 2:
+        diff_sum = (values[start + 1] - values[start]) + (
+            values[start + 2] - values[start + 1]
+        )
+        return diff_sum / 2
+    diffs = [values[idx + 1] - values[idx] for idx in range(start, stop - 1)]
+    if num_diffs > 128:
+        return np.mean(diffs)
+    if num_diffs < 8:
+        diff_sum = 0.0
+        for diff in diffs:
+            diff_sum += diff
+        return diff_sum / num_diffs
+
+    partial_sums = diffs[:8]
+    num_blocks = num_diffs // 8
+    for block_start in range(8, num_blocks * 8, 8):
+        for idx in range(8):
+            partial_sums[idx] += diffs[block_start + idx]
+    p = partial_sums
+    diff_sum = ((p[0] + p[1]) + (p[2] + p[3])) + ((p[4] + p[5]) + (p[6] + p[7]))
+    for diff in diffs[num_blocks * 8 :]:
+        diff_sum += diff
+    return diff_sum / num_diffs
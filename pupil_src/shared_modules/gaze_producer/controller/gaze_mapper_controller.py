@@ -94,9 +94,15 @@ class GazeMapperController(Observable):
     def _create_mapping_task(self, gaze_mapper, calibration):
         task = worker.map_gaze.create_task(gaze_mapper, calibration)
 
-        def on_yield_gaze(mapped_gaze_ts_and_data):
+        def on_yield_gaze(packed_gaze):
             gaze_mapper.status = f"Mapping {task.progress * 100:.0f}% complete"
-            for timestamp, gaze_datum in mapped_gaze_ts_and_data:
+            for timestamp, gaze_datum in worker.map_gaze.unpack_gaze(packed_gaze):
+                # Gaze is not yielded with monotonic timestamps. Binocular pupil
+                # matches are delayed internally. To keep the gaze timestamps
+                # sorted, we use the largest timestamp that has been returned up
+                # to the current point in time.
+                if gaze_mapper.gaze_ts:
+                    timestamp = max(timestamp, gaze_mapper.gaze_ts[-1])
                 gaze_mapper.gaze.append(gaze_datum)
                 gaze_mapper.gaze_ts.append(timestamp)
 
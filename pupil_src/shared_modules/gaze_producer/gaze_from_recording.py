@@ -30,7 +30,7 @@ class GazeFromRecording(GazeProducerBase):
         self._gaze_changed_announcer.announce_existing()
 
     def _load_gaze_data(self):
-        gaze = fm.load_pldata_file(self.g_pool.rec_dir, "gaze")
+        gaze = fm.load_pldata_file(self.g_pool.rec_dir, "gaze", lazy=True)
         return pm.Bisector(gaze.data, gaze.timestamps)
 
     def init_ui(self):
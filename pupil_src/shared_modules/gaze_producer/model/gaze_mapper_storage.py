@@ -77,11 +77,11 @@ class GazeMapperStorage(SingleFileStorage, Observable):
 
     def _delete_mapping_file(self, gaze_mapper):
         mapping_file_path = self._gaze_mapping_file_path(gaze_mapper)
-        try:
-            os.remove(mapping_file_path + ".pldata")
-            os.remove(mapping_file_path + "_timestamps.npy")
-        except FileNotFoundError:
-            pass
+        for suffix in (".pldata", "_timestamps.npy", "_offsets.npy"):
+            try:
+                os.remove(mapping_file_path + suffix)
+            except FileNotFoundError:
+                pass
 
     def rename(self, gaze_mapper, new_name):
         old_mapping_file_path = self._gaze_mapping_file_path(gaze_mapper)
@@ -90,16 +90,13 @@ class GazeMapperStorage(SingleFileStorage, Observable):
         self._rename_mapping_file(old_mapping_file_path, new_mapping_file_path)
 
     def _rename_mapping_file(self, old_mapping_file_path, new_mapping_file_path):
-        try:
-            os.rename(
-                old_mapping_file_path + ".pldata", new_mapping_file_path + ".pldata"
-            )
-            os.rename(
-                old_mapping_file_path + "_timestamps.npy",
-                new_mapping_file_path + "_timestamps.npy",
-            )
-        except FileNotFoundError:
-            pass
+        for suffix in (".pldata", "_timestamps.npy", "_offsets.npy"):
+            try:
+                os.rename(
+                    old_mapping_file_path + suffix, new_mapping_file_path + suffix
+                )
+            except FileNotFoundError:
+                pass
 
     def save_to_disk(self):
         # this will save everything except gaze and gaze_ts
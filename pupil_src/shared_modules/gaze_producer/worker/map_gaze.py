@@ -8,9 +8,14 @@ Lesser General Public License (LGPL v3.0).
 See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
+import multiprocessing
+
+import numpy as np
+
 import file_methods as fm
 import player_methods as pm
 import tasklib
+import tasklib.background.pool
 from gaze_mapping import gazer_classes_by_class_name, registered_gazer_classes
 
 from .fake_gpool import FakeGPool
@@ -18,12 +23,18 @@ from .fake_gpool import FakeGPool
 
 g_pool = None  # set by the plugin
 
+# Pupil data that precede a chunk to initialize the pupil matcher and gaze models
+NUM_WARM_UP_PUPIL_DATA = 3000
+MIN_PUPIL_DATA_PER_CHUNK = 20000
+# Number of gaze data that are sent to the foreground at once
+GAZE_BATCH_SIZE = 1000
+
 
 class NotEnoughPupilData(ValueError):
     pass
 
 
-def create_task(gaze_mapper, calibration):
+def create_task(gaze_mapper, calibration, num_workers=None):
     assert g_pool, "You forgot to set g_pool by the plugin"
     mapping_window = pm.exact_window(g_pool.timestamps, gaze_mapper.mapping_index_range)
     pupil_pos_in_mapping_range = g_pool.pupil_positions.by_ts_window(mapping_window)
@@ -36,54 +47,131 @@ def create_task(gaze_mapper, calibration):
     # calibration_params = fm._recursive_deep_copy(calibration.params)
     calibration_params = calibration.params
 
-    args = (
-        calibration.gazer_class_name,
-        calibration_params,
-        fake_gpool,
-        pupil_pos_in_mapping_range,
-        gaze_mapper.manual_correction_x,
-        gaze_mapper.manual_correction_y,
-    )
+    if num_workers is None:
+        # Leave one core for the foreground process
+        num_workers = max(multiprocessing.cpu_count() - 1, 1)
+    pupil_ts = pupil_pos_in_mapping_range.data_ts
+    chunks = mapping_chunks(pupil_ts, num_workers)
+
+    args_per_task = [
+        (
+            calibration.gazer_class_name,
+            calibration_params,
+            fake_gpool,
+            pupil_pos_in_mapping_range[warm_up_start:stop],
+            pupil_ts[start] if warm_up_start < start else None,
+            gaze_mapper.manual_correction_x,
+            gaze_mapper.manual_correction_y,
+        )
+        for warm_up_start, start, stop in chunks
+    ]
     name = f"Create gaze mapper {gaze_mapper.name}"
-    return tasklib.background.create(
+    return tasklib.background.create_group(
         name,
         _map_gaze,
-        args=args,
+        args_per_task,
         pass_shared_memory=True,
+        weights=[stop - start for _, start, stop in chunks],
+        # Chunks are mapped by warm workers, whose shared buffers transport the
+        # packed gaze batches
+        worker_pool=tasklib.background.pool.shared_pool(),
     )
 
 
+def mapping_chunks(pupil_ts, num_workers):
+    """Splits timestamp sorted pupil data into chunks that can be mapped in parallel
+
+    Returns a list of (warm_up_start, start, stop) index triples. Gaze is mapped
+    for the pupil data in [start, stop), the pupil data in [warm_up_start, start)
+    only initialize the pupil matcher and the gazer, e.g. the gaze distance of 3d
+    models. The matcher state depends on all preceding data, such that a few pupil
+    data right after a chunk start can be matched differently than when mapping
+    the whole range at once. Chunks never start in between pupil data with the
+    same timestamp.
+    """
+    num_pupil_data = len(pupil_ts)
+    num_chunks = min(num_workers, num_pupil_data // MIN_PUPIL_DATA_PER_CHUNK)
+    num_chunks = max(num_chunks, 1)
+
+    starts = np.linspace(0, num_pupil_data, num_chunks + 1).astype(int)[:-1]
+    # move chunk starts to the first of all data with the same timestamp
+    starts = np.searchsorted(pupil_ts, np.asarray(pupil_ts)[starts], side="left")
+    starts = np.unique(starts).tolist()
+    stops = starts[1:] + [num_pupil_data]
+    return [
+        (max(start - NUM_WARM_UP_PUPIL_DATA, 0), start, stop)
+        for start, stop in zip(starts, stops)
+    ]
+
+
 def _map_gaze(
     gazer_class_name,
     gazer_params,
     fake_gpool,
-    pupil_pos_in_mapping_range,
+    pupil_pos_in_chunk,
+    chunk_start_ts,
     manual_correction_x,
     manual_correction_y,
     shared_memory,
 ):
+    """Maps a chunk of the mapping range, see mapping_chunks()
+
+    Pupil data before `chunk_start_ts` only initialize the gazer. Gaze is yielded
+    in batches, see unpack_gaze().
+    """
     fake_gpool.import_runtime_plugins()
     gazers_by_name = gazer_classes_by_class_name(registered_gazer_classes())
     gazer_cls = gazers_by_name[gazer_class_name]
     gazer = gazer_cls(fake_gpool, params=gazer_params)
 
-    first_ts = pupil_pos_in_mapping_range[0]["timestamp"]
-    last_ts = pupil_pos_in_mapping_range[-1]["timestamp"]
+    if chunk_start_ts is None:
+        first_ts = pupil_pos_in_chunk[0]["timestamp"]
+    else:
+        first_ts = chunk_start_ts
+    last_ts = pupil_pos_in_chunk[-1]["timestamp"]
     ts_span = last_ts - first_ts
     curr_ts = first_ts
 
-    for gaze_datum in gazer.map_pupil_to_gaze(pupil_pos_in_mapping_range):
+    batch = []
+    for gaze_datum in gazer.map_pupil_to_gaze_offline(
+        pupil_pos_in_chunk, start_ts=chunk_start_ts
+    ):
         _apply_manual_correction(gaze_datum, manual_correction_x, manual_correction_y)
-
-        # gazer.map_pupil_to_gaze does not yield gaze with monotonic timestamps.
-        # Binocular pupil matches are delayed internally. To avoid non-monotonic
-        # progress updates, we use the largest timestamp that has been returned up to
-        # the current point in time.
+        batch.append(gaze_datum)
+        # gazer.map_pupil_to_gaze_offline does not yield gaze with monotonic
+        # timestamps. Binocular pupil matches are delayed internally. To avoid
+        # non-monotonic progress updates, we use the largest timestamp that has been
+        # returned up to the current point in time.
         curr_ts = max(curr_ts, gaze_datum["timestamp"])
-        shared_memory.progress = (curr_ts - first_ts) / ts_span
-
-        result = (curr_ts, fm.Serialized_Dict(gaze_datum))
-        yield [result]
+        if len(batch) == GAZE_BATCH_SIZE:
+            if ts_span:
+                shared_memory.progress = (curr_ts - first_ts) / ts_span
+            yield _pack_gaze(batch)
+            batch = []
+    if batch:
+        yield _pack_gaze(batch)
+
+
+def _pack_gaze(gaze):
+    """Packs gaze into arrays to send them to the foreground with little overhead"""
+    timestamps = np.array([gaze_datum["timestamp"] for gaze_datum in gaze])
+    payloads = [
+        fm.Serialized_Dict(python_dict=gaze_datum).serialized for gaze_datum in gaze
+    ]
+    offsets = np.cumsum([0] + [len(payload) for payload in payloads])
+    payload = np.frombuffer(b"".join(payloads), dtype=np.uint8)
+    return timestamps, offsets, payload
+
+
+def unpack_gaze(packed_gaze):
+    """Returns a list of (timestamp, gaze datum) of gaze packed by _map_gaze"""
+    timestamps, offsets, payload = packed_gaze
+    payload = payload.tobytes()
+    offsets = offsets.tolist()
+    return [
+        (ts, fm.Serialized_Dict(msgpack_bytes=payload[start:stop]))
+        for ts, start, stop in zip(timestamps.tolist(), offsets[:-1], offsets[1:])
+    ]
 
 
 def _apply_manual_correction(gaze_datum, manual_correction_x, manual_correction_y):
@@ -10,6 +10,7 @@ See COPYING and COPYING.LESSER for license details.
 """
 
 import logging
+import multiprocessing
 
 import tasklib
 from head_pose_tracker import worker
@@ -27,6 +28,7 @@ class OfflineDetectionController(Observable):
         get_current_trim_mark_range,
         all_timestamps,
         source_path,
+        num_workers=None,
     ):
         self._general_settings = general_settings
         self._detection_storage = detection_storage
@@ -34,6 +36,10 @@ class OfflineDetectionController(Observable):
         self._get_current_trim_mark_range = get_current_trim_mark_range
         self._all_timestamps = all_timestamps
         self._source_path = source_path
+        if num_workers is None:
+            # Leave one core for the foreground process
+            num_workers = max(multiprocessing.cpu_count() - 1, 1)
+        self._num_workers = num_workers
         self._task = None
 
     def calculate(self):
@@ -66,17 +72,39 @@ class OfflineDetectionController(Observable):
         logger.info("Start marker detection")
 
     def _create_task(self):
-        args = (
-            self._source_path,
-            self._all_timestamps,
-            self._general_settings.detection_frame_index_range,
-            set(self._detection_storage.frame_index_to_num_markers.keys()),
+        frame_index_range = self._general_settings.detection_frame_index_range
+        calculated_frame_indices = set(
+            self._detection_storage.frame_index_to_num_markers.keys()
         )
-        return self._task_manager.create_background_task(
+        chunks = worker.offline_detection_chunks(
+            frame_index_range, calculated_frame_indices, self._num_workers
+        )
+        if len(chunks) == 1:
+            args = (
+                self._source_path,
+                self._all_timestamps,
+                frame_index_range,
+                calculated_frame_indices,
+            )
+            return self._task_manager.create_background_task(
+                name="marker detection",
+                routine_or_generator_function=worker.offline_detection,
+                pass_shared_memory=True,
+                args=args,
+            )
+
+        args_per_task = [
+            (self._source_path, self._all_timestamps, chunk, calculated_frame_indices)
+            for chunk in chunks
+        ]
+        return self._task_manager.create_background_task_group(
             name="marker detection",
-            routine_or_generator_function=worker.offline_detection,
+            generator_function=worker.offline_detection,
+            args_per_task=args_per_task,
             pass_shared_memory=True,
-            args=args,
+            # every worker detects in a single thread, workers run in parallel
+            kwargs={"nthreads": 1},
+            weights=[frame_end - frame_start + 1 for frame_start, frame_end in chunks],
         )
 
     def _insert_markers_bisector(self, data_pairs):
@@ -12,7 +12,6 @@ See COPYING and COPYING.LESSER for license details.
 import collections
 import logging
 
-import cv2
 import numpy as np
 from scipy import optimize as scipy_optimize
 from scipy import sparse as scipy_sparse
@@ -43,12 +42,25 @@ class BundleAdjustment:
         self._marker_ids = []
         self._frame_ids = []
 
-    def calculate(self, initial_guess_result):
+        # key markers and markers that were optimized in previous calculations
+        self._optimized_key_marker_ids = set()
+        self._optimized_marker_ids = set()
+
+    def calculate(self, initial_guess_result, local=False):
         """run bundle adjustment given the initial guess and then check the result of
         markers_3d_model
+
+        With local=True only the variables affected by key markers that were not part
+        of a previous calculation are optimized, i.e. the extrinsics of their frames
+        and of markers that were not optimized before. All other variables keep the
+        values of the initial guess, which is the result of the previous calculation.
+        Camera intrinsics are only optimized in global calculations.
         """
 
         self._enough_samples = bool(len(initial_guess_result.key_markers) >= 30)
+        self._optimize_intrinsics_now = (
+            self._optimize_camera_intrinsics and self._enough_samples and not local
+        )
 
         self._marker_ids, self._frame_ids = self._set_ids(
             initial_guess_result.frame_id_to_extrinsics,
@@ -60,21 +72,39 @@ class BundleAdjustment:
         )
         self._prepare_basic_data(initial_guess_result.key_markers)
 
-        initial_guess_array, bounds, sparsity_matrix = self._prepare_parameters(
+        initial_guess_array, bounds = self._prepare_parameters(
             camera_extrinsics_array, marker_extrinsics_array
         )
+        self._set_free_variables(initial_guess_result.key_markers, local)
+        self._variables = initial_guess_array
+        sparsity_matrix = self._construct_sparsity_matrix()
 
         try:
             least_sq_result = self._least_squares(
-                initial_guess_array, bounds, sparsity_matrix
+                initial_guess_array[self._free_variables],
+                (
+                    bounds[0][self._free_variables],
+                    bounds[1][self._free_variables],
+                ),
+                sparsity_matrix,
             )
         except ValueError as err:
             logger.debug(
                 f"Value error encountered during optimizing 3d markers model: {err}"
             )
             return None
-        else:
-            return self._get_result(least_sq_result)
+
+        variables = initial_guess_array.copy()
+        variables[self._free_variables] = least_sq_result.x
+        residuals = self._compute_residuals(variables)
+        result = self._get_result(variables, residuals)
+
+        self._optimized_key_marker_ids.update(
+            (marker.frame_id, marker.marker_id)
+            for marker in initial_guess_result.key_markers
+        )
+        self._optimized_marker_ids.update(result.marker_id_to_extrinsics.keys())
+        return result
 
     @staticmethod
     def _set_ids(frame_id_to_extrinsics, marker_id_to_extrinsics):
@@ -94,11 +124,20 @@ class BundleAdjustment:
         return camera_extrinsics_array, marker_extrinsics_array
 
     def _prepare_basic_data(self, key_markers):
+        frame_id_to_index = {
+            frame_id: frame_index
+            for frame_index, frame_id in enumerate(self._frame_ids)
+        }
+        marker_id_to_index = {
+            marker_id: marker_index
+            for marker_index, marker_id in enumerate(self._marker_ids)
+        }
         self._frame_indices = np.array(
-            [self._frame_ids.index(marker.frame_id) for marker in key_markers]
+            [frame_id_to_index[marker.frame_id] for marker in key_markers], dtype=int
         )
         self._marker_indices = np.array(
-            [self._marker_ids.index(marker.marker_id) for marker in key_markers]
+            [marker_id_to_index[marker.marker_id] for marker in key_markers],
+            dtype=int,
         )
         self._markers_points_2d_detected = np.array(
             [marker.verts for marker in key_markers]
@@ -111,7 +150,7 @@ class BundleAdjustment:
         initial_guess_array = np.vstack(
             (camera_extrinsics_array, marker_extrinsics_array)
         ).ravel()
-        if self._optimize_camera_intrinsics and self._enough_samples:
+        if self._optimize_intrinsics_now:
             camera_intrinsics_params = self._load_camera_intrinsics_params(
                 self._camera_intrinsics.K, self._camera_intrinsics.D
             )
@@ -121,11 +160,59 @@ class BundleAdjustment:
 
         bounds = self._calculate_bounds()
 
-        sparsity_matrix = self._construct_sparsity_matrix()
+        return initial_guess_array, bounds
+
+    def _set_free_variables(self, key_markers, local):
+        """decide which variables are optimized and which key markers are needed for
+        computing the residuals
+        """
+
+        n_frames = self._camera_extrinsics_shape[0]
+        n_markers = self._marker_extrinsics_shape[0]
+        if local:
+            key_marker_is_new = np.array(
+                [
+                    (marker.frame_id, marker.marker_id)
+                    not in self._optimized_key_marker_ids
+                    for marker in key_markers
+                ],
+                dtype=bool,
+            )
+            frames_free = np.zeros(n_frames, dtype=bool)
+            frames_free[self._frame_indices[key_marker_is_new]] = True
+            markers_free = np.array(
+                [
+                    marker_id not in self._optimized_marker_ids
+                    for marker_id in self._marker_ids
+                ],
+                dtype=bool,
+            )
+        else:
+            frames_free = np.ones(n_frames, dtype=bool)
+            markers_free = np.ones(n_markers, dtype=bool)
+
+        if not frames_free.any() and not markers_free.any():
+            # nothing new since the last calculation, refine everything instead
+            self._set_free_variables(key_markers, local=False)
+            return
 
-        return initial_guess_array, bounds, sparsity_matrix
+        self._free_variables = np.concatenate(
+            (
+                np.repeat(frames_free, self._camera_extrinsics_shape[1]),
+                np.repeat(markers_free, self._marker_extrinsics_shape[1]),
+                np.full(
+                    self._camera_intrinsics_params_size
+                    if self._optimize_intrinsics_now
+                    else 0,
+                    True,
+                ),
+            )
+        )
+        self._key_markers_used = (
+            frames_free[self._frame_indices] | markers_free[self._marker_indices]
+        )
 
-    def _calculate_bounds(self, eps=np.finfo(np.float).eps, scale=np.inf):
+    def _calculate_bounds(self, eps=np.finfo(float).eps, scale=np.inf):
         """calculate the lower and upper bounds on independent variables
         fix the first marker at the origin of the coordinate system
         """
@@ -145,7 +232,7 @@ class BundleAdjustment:
             (camera_extrinsics_upper_bound, marker_extrinsics_upper_bound)
         ).ravel()
 
-        if self._optimize_camera_intrinsics and self._enough_samples:
+        if self._optimize_intrinsics_now:
             camera_matrix_lower_bound = np.full(4, 0)
             camera_matrix_upper_bound = np.full(4, 2000)
             dist_coefs_lower_bound = np.full(self._camera_intrinsics.D.size, -1)
@@ -166,52 +253,60 @@ class BundleAdjustment:
         providing the sparsity structure will greatly speed up the computations. A zero
         entry means that a corresponding element in the Jacobian is identically zero.
 
-        :return: scipy.sparse.lil_matrix, with shape (n_residuals, n_variables), where
-        n_residuals = markers_points_2d_detected.size,
-        n_variables = camera_extrinsics_array.size + marker_extrinsics_array.size
+        The structure is assembled from the indices of the non-zero entries, such
+        that its size grows with the number of key markers instead of the number of
+        key markers times the number of variables.
+
+        :return: scipy.sparse.csr_matrix, with shape (n_residuals, n_variables), where
+        n_residuals = the number of residuals of the used key markers,
+        n_variables = the number of free variables
         """
 
-        n_samples = len(self._frame_indices)
+        frame_indices = self._frame_indices[self._key_markers_used]
+        marker_indices = self._marker_indices[self._key_markers_used]
+        n_samples = len(frame_indices)
+        n_residuals_per_sample = self._markers_points_2d_detected[0].size
+
+        camera_extrinsics_size = self._camera_extrinsics_shape[1]
+        marker_extrinsics_size = self._marker_extrinsics_shape[1]
+        variable_indices = [
+            frame_indices[:, np.newaxis] * camera_extrinsics_size
+            + np.arange(camera_extrinsics_size),
+            np.prod(self._camera_extrinsics_shape)
+            + marker_indices[:, np.newaxis] * marker_extrinsics_size
+            + np.arange(marker_extrinsics_size),
+        ]
+        if self._optimize_intrinsics_now:
+            n_extrinsics = np.prod(self._camera_extrinsics_shape) + np.prod(
+                self._marker_extrinsics_shape
+            )
+            variable_indices.append(
+                np.broadcast_to(
+                    n_extrinsics + np.arange(self._camera_intrinsics_params_size),
+                    (n_samples, self._camera_intrinsics_params_size),
+                )
+            )
+        variable_indices = np.hstack(variable_indices)
 
-        mat_camera = np.zeros(
-            (n_samples, self._camera_extrinsics_shape[0]), dtype=np.uint8
-        )
-        mat_camera[np.arange(n_samples), self._frame_indices] = 1
-        mat_camera = cv2.resize(
-            mat_camera,
-            (
-                np.prod(self._camera_extrinsics_shape),
-                self._markers_points_2d_detected.size,
-            ),
-            interpolation=cv2.INTER_NEAREST,
+        # every residual of a sample depends on all variables of the sample
+        rows = np.repeat(
+            np.arange(n_samples * n_residuals_per_sample), variable_indices.shape[1]
         )
+        cols = np.repeat(variable_indices, n_residuals_per_sample, axis=0).ravel()
 
-        mat_marker = np.zeros(
-            (n_samples, self._marker_extrinsics_shape[0]), dtype=np.uint8
-        )
-        mat_marker[np.arange(n_samples), self._marker_indices] = 1
-        mat_marker = cv2.resize(
-            mat_marker,
+        # keep only the free variables and renumber them consecutively
+        is_free = self._free_variables[cols]
+        free_variable_indices = np.cumsum(self._free_variables) - 1
+        sparsity_matrix = scipy_sparse.csr_matrix(
             (
-                np.prod(self._marker_extrinsics_shape),
-                self._markers_points_2d_detected.size,
+                np.ones(np.count_nonzero(is_free), dtype=np.uint8),
+                (rows[is_free], free_variable_indices[cols[is_free]]),
+            ),
+            shape=(
+                n_samples * n_residuals_per_sample,
+                np.count_nonzero(self._free_variables),
             ),
-            interpolation=cv2.INTER_NEAREST,
         )
-
-        sparsity_matrix = np.hstack((mat_camera, mat_marker))
-
-        if self._optimize_camera_intrinsics and self._enough_samples:
-            mat_camera_intrinsics = np.ones(
-                (
-                    self._markers_points_2d_detected.size,
-                    self._camera_intrinsics_params_size,
-                ),
-                dtype=int,
-            )
-            sparsity_matrix = np.hstack((sparsity_matrix, mat_camera_intrinsics))
-
-        sparsity_matrix = scipy_sparse.lil_matrix(sparsity_matrix)
         return sparsity_matrix
 
     def _least_squares(self, initial_guess_array, bounds, sparsity_matrix):
@@ -230,23 +325,25 @@ class BundleAdjustment:
         )
         return result
 
-    def _get_result(self, least_sq_result):
+    def _get_result(self, variables, residuals):
         camera_extrinsics_array, marker_extrinsics_array = self._get_extrinsics_arrays(
-            least_sq_result.x
+            variables
         )
         frame_indices_failed, marker_indices_failed = self._find_failed_indices(
-            least_sq_result.fun
+            residuals
         )
+        frame_indices_failed_set = set(frame_indices_failed)
+        marker_indices_failed_set = set(marker_indices_failed)
 
         frame_id_to_extrinsics_opt = {
             self._frame_ids[frame_index]: extrinsics
             for frame_index, extrinsics in enumerate(camera_extrinsics_array)
-            if frame_index not in frame_indices_failed
+            if frame_index not in frame_indices_failed_set
         }
         marker_id_to_extrinsics_opt = {
             self._marker_ids[marker_index]: extrinsics
             for marker_index, extrinsics in enumerate(marker_extrinsics_array)
-            if marker_index not in marker_indices_failed or marker_index == 0
+            if marker_index not in marker_indices_failed_set or marker_index == 0
         }
         frame_ids_failed = [self._frame_ids[i] for i in frame_indices_failed]
 
@@ -255,22 +352,30 @@ class BundleAdjustment:
         )
         return bundle_adjustment_result
 
-    def _function_compute_residuals(self, variables):
+    def _function_compute_residuals(self, free_variables):
         """Function which computes the vector of residuals,
         i.e., the minimization proceeds with respect to params
         """
+        variables = self._variables.copy()
+        variables[self._free_variables] = free_variables
+        return self._compute_residuals(variables, self._key_markers_used)
+
+    def _compute_residuals(self, variables, key_markers_used=slice(None)):
         camera_extrinsics_array, marker_extrinsics_array = self._get_extrinsics_arrays(
             variables
         )
-        if self._optimize_camera_intrinsics and self._enough_samples:
+        if self._optimize_intrinsics_now:
             self._unload_camera_intrinsics_params(
                 variables[-self._camera_intrinsics_params_size :]
             )
 
         markers_points_2d_projected = self._project_markers(
-            camera_extrinsics_array, marker_extrinsics_array
+            camera_extrinsics_array, marker_extrinsics_array, key_markers_used
+        )
+        residuals = (
+            markers_points_2d_projected
+            - self._markers_points_2d_detected[key_markers_used]
         )
-        residuals = markers_points_2d_projected - self._markers_points_2d_detected
         return residuals.ravel()
 
     def _get_extrinsics_arrays(self, variables):
@@ -291,23 +396,22 @@ class BundleAdjustment:
 
         return camera_extrinsics_array, marker_extrinsics_array
 
-    def _project_markers(self, camera_extrinsics_array, marker_extrinsics_array):
-        markers_points_3d = np.array(
-            [
-                utils.convert_marker_extrinsics_to_points_3d(extrinsics)
-                for extrinsics in marker_extrinsics_array
-            ]
+    def _project_markers(
+        self, camera_extrinsics_array, marker_extrinsics_array, key_markers_used
+    ):
+        markers_points_3d = utils.convert_markers_extrinsics_to_points_3d(
+            marker_extrinsics_array
         )
-        markers_points_2d_projected = np.array(
-            [
-                self._camera_intrinsics.projectPoints(points, cam[0:3], cam[3:6])
-                for cam, points in zip(
-                    camera_extrinsics_array[self._frame_indices],
-                    markers_points_3d[self._marker_indices],
-                )
-            ]
+        # transform the points of all key markers into their camera coordinate
+        # systems at once and project them without any further transformation
+        markers_points_3d_cam = utils.transform_points_3d(
+            markers_points_3d[self._marker_indices[key_markers_used]],
+            camera_extrinsics_array[self._frame_indices[key_markers_used]],
         )
-        return markers_points_2d_projected
+        markers_points_2d_projected = self._camera_intrinsics.projectPoints(
+            markers_points_3d_cam.reshape(-1, 3)
+        )
+        return markers_points_2d_projected.reshape(-1, 4, 2)
 
     def _find_failed_indices(self, residuals, thres_frame=8, thres_marker=8):
         """find out those frame_indices and marker_indices which cause large
@@ -317,18 +421,18 @@ class BundleAdjustment:
         residuals.shape = -1, 4, 2
         reprojection_errors = np.linalg.norm(residuals, axis=2).sum(axis=1)
 
-        frame_indices_failed = [
-            frame_indice
-            for frame_indice in set(self._frame_indices)
-            if np.min(reprojection_errors[self._frame_indices == frame_indice])
-            > thres_frame
-        ]
-        marker_indices_failed = [
-            marker_indice
-            for marker_indice in set(self._marker_indices)
-            if np.min(reprojection_errors[self._marker_indices == marker_indice])
-            > thres_marker
-        ]
+        def indices_failed(indices, n_indices, thres):
+            min_errors = np.full(n_indices, np.inf)
+            np.minimum.at(min_errors, indices, reprojection_errors)
+            # indices without key markers have an infinite error, but did not fail
+            return np.flatnonzero(np.isfinite(min_errors) & (min_errors > thres))
+
+        frame_indices_failed = indices_failed(
+            self._frame_indices, self._camera_extrinsics_shape[0], thres_frame
+        ).tolist()
+        marker_indices_failed = indices_failed(
+            self._marker_indices, self._marker_extrinsics_shape[0], thres_marker
+        ).tolist()
         return frame_indices_failed, marker_indices_failed
 
     def _load_camera_intrinsics_params(self, camera_matrix, dist_coefs):
@@ -79,6 +79,56 @@ def convert_marker_extrinsics_to_points_3d(marker_extrinsics):
     return marker_points_3d
 
 
+def rotation_vectors_to_matrices(rotation_vectors):
+    """Vectorized version of cv2.Rodrigues for an array of rotation vectors"""
+    rotation_vectors = np.asarray(rotation_vectors, dtype=np.float64).reshape(-1, 3)
+    angles = np.linalg.norm(rotation_vectors, axis=1)
+    axes = rotation_vectors / np.where(angles > 0, angles, 1)[:, np.newaxis]
+
+    cross_product_matrices = np.zeros((len(axes), 3, 3))
+    cross_product_matrices[:, 0, 1] = -axes[:, 2]
+    cross_product_matrices[:, 0, 2] = axes[:, 1]
+    cross_product_matrices[:, 1, 0] = axes[:, 2]
+    cross_product_matrices[:, 1, 2] = -axes[:, 0]
+    cross_product_matrices[:, 2, 0] = -axes[:, 1]
+    cross_product_matrices[:, 2, 1] = axes[:, 0]
+
+    sin = np.sin(angles)[:, np.newaxis, np.newaxis]
+    cos = np.cos(angles)[:, np.newaxis, np.newaxis]
+    return (
+        np.eye(3)
+        + sin * cross_product_matrices
+        + (1 - cos) * cross_product_matrices @ cross_product_matrices
+    )
+
+
+def transform_points_3d(points_3d, extrinsics_array):
+    """
+    Applies one set of extrinsics to each set of points.
+
+    :param points_3d: array of shape (N, M, 3)
+    :param extrinsics_array: array of shape (N, 6)
+    :return: array of shape (N, M, 3)
+    """
+    extrinsics_array = np.asarray(extrinsics_array, dtype=np.float64).reshape(-1, 6)
+    rotation_matrices = rotation_vectors_to_matrices(extrinsics_array[:, 0:3])
+    points_3d = np.einsum("nij,nmj->nmi", rotation_matrices, points_3d)
+    return points_3d + extrinsics_array[:, np.newaxis, 3:6]
+
+
+def convert_markers_extrinsics_to_points_3d(markers_extrinsics):
+    """
+    Vectorized version of convert_marker_extrinsics_to_points_3d, which also
+    computes in single precision.
+    """
+    markers_extrinsics = np.asarray(markers_extrinsics, dtype=np.float32).reshape(-1, 6)
+    points_3d_origin = np.broadcast_to(
+        get_marker_points_3d_origin(), (len(markers_extrinsics), 4, 3)
+    )
+    points_3d = transform_points_3d(points_3d_origin, markers_extrinsics)
+    return points_3d.astype(np.float32)
+
+
 def get_marker_points_3d_origin():
     return np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], dtype=np.float32)
 
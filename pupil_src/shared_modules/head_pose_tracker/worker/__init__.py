@@ -11,6 +11,7 @@ See COPYING and COPYING.LESSER for license details.
 
 from head_pose_tracker.worker.detection_worker import (
     offline_detection,
+    offline_detection_chunks,
     online_detection,
 )
 from head_pose_tracker.worker.localization_worker import (
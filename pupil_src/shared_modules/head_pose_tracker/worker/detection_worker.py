@@ -25,6 +25,9 @@ logger = logging.getLogger(__name__)
 
 apriltag_detector = pupil_apriltags.Detector(nthreads=2)
 
+# Spawning a worker with its own decoder and detector only pays off for enough frames
+MIN_FRAMES_PER_WORKER = 300
+
 
 def get_markers_data(detection, img_size, timestamp):
     return {
@@ -52,9 +55,9 @@ def dedupliciate_markers(marker_old, marker_new):
     return marker_old if perimeter_old > perimeter_new else marker_new
 
 
-def _detect(frame):
+def _detect(frame, detector=apriltag_detector):
     image = frame.gray
-    apriltag_detections = apriltag_detector.detect(image)
+    apriltag_detections = detector.detect(image)
     apriltag_detections = unique(
         apriltag_detections,
         key=lambda marker: marker.tag_id,
@@ -68,17 +71,45 @@ def _detect(frame):
     ]
 
 
+def _uncalculated_frame_indices(frame_index_range, calculated_frame_indices):
+    frame_start, frame_end = frame_index_range
+    return sorted(set(range(frame_start, frame_end + 1)) - calculated_frame_indices)
+
+
+def offline_detection_chunks(frame_index_range, calculated_frame_indices, num_workers):
+    """
+    Splits the frame index range into consecutive ranges, each containing about the
+    same number of frames that still need to be detected. Returns a list of
+    (frame_start, frame_end) tuples, including frame_end like frame_index_range.
+    """
+    frame_indices = _uncalculated_frame_indices(
+        frame_index_range, calculated_frame_indices
+    )
+    num_chunks = min(num_workers, len(frame_indices) // MIN_FRAMES_PER_WORKER)
+    if num_chunks <= 1:
+        return [tuple(frame_index_range)]
+    frame_start, frame_end = frame_index_range
+    starts = [frame_start]
+    starts += [
+        frame_indices[len(frame_indices) * i // num_chunks]
+        for i in range(1, num_chunks)
+    ]
+    ends = [start - 1 for start in starts[1:]] + [frame_end]
+    return list(zip(starts, ends))
+
+
 def offline_detection(
     source_path,
     all_timestamps,
     frame_index_range,
     calculated_frame_indices,
     shared_memory,
+    nthreads=2,
 ):
     batch_size = 30
     frame_start, frame_end = frame_index_range
-    frame_indices = sorted(
-        set(range(frame_start, frame_end + 1)) - calculated_frame_indices
+    frame_indices = _uncalculated_frame_indices(
+        frame_index_range, calculated_frame_indices
     )
     if not frame_indices:
         return
@@ -93,17 +124,25 @@ def offline_detection(
     timestamps_no_gaps = src.timestamps
     uncalculated_timestamps = all_timestamps[frame_indices]
     seek_poses = np.searchsorted(timestamps_no_gaps, uncalculated_timestamps)
+    # Frames that only exist in all_timestamps are gaps in the video. Both timestamp
+    # arrays are sorted, so the search result tells if a timestamp is in the video.
+    in_video = seek_poses < len(timestamps_no_gaps)
+    in_video[in_video] = (
+        timestamps_no_gaps[seek_poses[in_video]] == uncalculated_timestamps[in_video]
+    )
+
+    detector = pupil_apriltags.Detector(nthreads=nthreads)
 
     queue = []
-    for frame_index, timestamp, target_frame_idx in zip(
-        frame_indices, uncalculated_timestamps, seek_poses
+    for frame_index, timestamp, target_frame_idx, is_in_video in zip(
+        frame_indices, uncalculated_timestamps, seek_poses, in_video
     ):
         detections = []
-        if timestamp in timestamps_no_gaps:
+        if is_in_video:
             if target_frame_idx != src.target_frame_idx:
                 src.seek_to_frame(target_frame_idx)  # only seek frame if necessary
             frame = src.get_frame()
-            detections = _detect(frame)
+            detections = _detect(frame, detector)
 
         serialized_dicts = [fm.Serialized_Dict(d) for d in detections]
         queue.append((timestamp, serialized_dicts, frame_index))
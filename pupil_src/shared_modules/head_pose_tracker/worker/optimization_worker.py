@@ -28,7 +28,7 @@ IntrinsicsTuple = collections.namedtuple(
 random.seed(0)
 
 
-def optimization_routine(bg_storage, camera_intrinsics, bundle_adjustment):
+def optimization_routine(bg_storage, camera_intrinsics, bundle_adjustment, local=False):
     try:
         bg_storage.marker_id_to_extrinsics[bg_storage.origin_marker_id]
     except KeyError:
@@ -43,7 +43,7 @@ def optimization_routine(bg_storage, camera_intrinsics, bundle_adjustment):
     if not initial_guess:
         return None
 
-    result = bundle_adjustment.calculate(initial_guess)
+    result = bundle_adjustment.calculate(initial_guess, local=local)
     if not result:
         return None
 
@@ -75,7 +75,15 @@ def offline_optimization(
     frame_index_to_num_markers,
     camera_intrinsics,
     shared_memory,
+    global_refinement_interval=5,
 ):
+    """
+    Adds key markers in batches and optimizes the model after every batch. Only the
+    variables affected by a new batch are optimized, starting from the previous
+    result. Every global_refinement_interval batches and once all key markers were
+    added, all variables are refined together.
+    """
+
     def find_markers_in_frame(index):
         window = pm.enclosing_window(timestamps, index)
         return markers_bisector.by_ts_window(window)
@@ -108,8 +116,10 @@ def offline_optimization(
     n_key_markers = 25
     opt_times = len(all_key_markers) // n_key_markers + 5
     for t in range(opt_times):
-        bg_storage.all_key_markers += all_key_markers[:n_key_markers]
+        new_key_markers = all_key_markers[:n_key_markers]
+        bg_storage.all_key_markers += new_key_markers
         del all_key_markers[:n_key_markers]
+        local = bool(new_key_markers) and (t + 1) % global_refinement_interval != 0
 
         try:
             (
@@ -117,7 +127,9 @@ def offline_optimization(
                 frame_id_to_extrinsics,
                 frame_ids_failed,
                 intrinsics_tuple,
-            ) = optimization_routine(bg_storage, camera_intrinsics, bundle_adjustment)
+            ) = optimization_routine(
+                bg_storage, camera_intrinsics, bundle_adjustment, local=local
+            )
         except TypeError:
             pass
         else:
@@ -53,7 +53,11 @@ class Bisector(object):
             self.sorted_idc = []
         else:
             self.data_ts = np.asarray(data_ts)
-            self.data = np.asarray(data, dtype=object)
+            if isinstance(data, fm.Lazy_Serialized_Dict_Sequence):
+                # Keep lazy sequences lazy; reordering only creates a view
+                self.data = data
+            else:
+                self.data = np.asarray(data, dtype=object)
 
             # Find correct order once and reorder both lists in-place
             self.sorted_idc = np.argsort(self.data_ts)
@@ -67,6 +71,19 @@ class Bisector(object):
         copy.sorted_idc = self.sorted_idc.copy()
         return copy
 
+    def extract(self, field, dtype=np.float64, default=np.nan):
+        """Numeric `field` of all data as array, see `fm.extract_field`
+
+        Results are cached per bisector.
+        """
+        cache = self.__dict__.setdefault("_extracted_fields", {})
+        key = field, np.dtype(dtype).str, default
+        if key not in cache:
+            cache[key] = fm.extract_field(
+                self.data, field, dtype=dtype, default=default
+            )
+        return cache[key]
+
     def by_ts(self, ts):
         """
         :param ts: timestamp to extract.
@@ -92,6 +109,12 @@ class Bisector(object):
     def _start_stop_idc_for_window(self, ts_window):
         return np.searchsorted(self.data_ts, ts_window)
 
+    def start_stop_idc_for_windows(self, window_starts, window_stops):
+        """Vectorized start and stop indices of data in many `ts_window`s"""
+        return self._start_stop_idc_for_window(
+            (np.asarray(window_starts), np.asarray(window_stops))
+        )
+
     def __getitem__(self, key):
         return self.data[key]
 
@@ -121,6 +144,7 @@ class Mutable_Bisector(Bisector):
         insert_idx = np.searchsorted(self.data_ts, timestamp)
         self.data_ts = np.insert(self.data_ts, insert_idx, timestamp)
         self.data = np.insert(self.data, insert_idx, datum)
+        self.__dict__.pop("_extracted_fields", None)
 
 
 class Affiliator(Bisector):
@@ -190,12 +190,13 @@ class Pupil_Producer_Base(Observable, System_Plugin_Base):
                         pupil_positions.timestamps, timestamps_target
                     )
                     data_indeces = np.unique(data_indeces)
-                    for idx in data_indeces:
-                        ts_data_pair = (
-                            pupil_positions.timestamps[idx],
-                            pupil_positions[idx][key],
+                    data_values = fm.extract_field(pupil_positions[data_indeces], key)
+                    ts_data_pairs_right_left[eye_id].extend(
+                        zip(
+                            pupil_positions.timestamps[data_indeces].tolist(),
+                            data_values.tolist(),
                         )
-                        ts_data_pairs_right_left[eye_id].append(ts_data_pair)
+                    )
 
             if ylim is None:
                 # max_val must not be 0, else gl will crash
@@ -15,16 +15,32 @@ import logging
 import os
 import typing
 
+import numpy as np
 from pyglui import ui
 
 import csv_utils
+import file_methods as fm
 import player_methods as pm
 from plugin import Plugin
 
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
 # logging
 logger = logging.getLogger(__name__)
 
 
+def available_columnar_formats() -> typing.Tuple[str, ...]:
+    """File formats that positions can be exported to in addition to csv"""
+    if pyarrow is None:
+        return ("npz",)
+    return ("npz", "parquet", "feather")
+
+
 class Raw_Data_Exporter(Plugin):
     """
     pupil_positions.csv
@@ -114,11 +130,15 @@ class Raw_Data_Exporter(Plugin):
         should_export_pupil_positions=True,
         should_export_field_info=True,
         should_export_gaze_positions=True,
+        columnar_export_format=None,
     ):
         super().__init__(g_pool)
         self.should_export_pupil_positions = should_export_pupil_positions
         self.should_export_field_info = should_export_field_info
         self.should_export_gaze_positions = should_export_gaze_positions
+        if columnar_export_format not in available_columnar_formats():
+            columnar_export_format = None
+        self.columnar_export_format = columnar_export_format
 
     def init_ui(self):
         self.add_menu()
@@ -146,6 +166,16 @@ class Raw_Data_Exporter(Plugin):
                 "should_export_gaze_positions", self, label="Export Gaze Positions"
             )
         )
+        formats = available_columnar_formats()
+        self.menu.append(
+            ui.Selector(
+                "columnar_export_format",
+                self,
+                selection=[None, *formats],
+                labels=["None", *(f".{format_}" for format_ in formats)],
+                label="Additional Format",
+            )
+        )
         self.menu.append(
             ui.Info_Text("Press the export button or type 'e' to start the export.")
         )
@@ -165,6 +195,7 @@ class Raw_Data_Exporter(Plugin):
                 timestamps=self.g_pool.timestamps,
                 export_window=export_window,
                 export_dir=export_dir,
+                columnar_format=self.columnar_export_format,
             )
 
         if self.should_export_gaze_positions:
@@ -174,6 +205,7 @@ class Raw_Data_Exporter(Plugin):
                 timestamps=self.g_pool.timestamps,
                 export_window=export_window,
                 export_dir=export_dir,
+                columnar_format=self.columnar_export_format,
             )
 
         if self.should_export_field_info:
@@ -184,6 +216,12 @@ class Raw_Data_Exporter(Plugin):
 
 
 class _Base_Positions_Exporter(abc.ABC):
+    # Number of rows that are formatted and written at once
+    csv_block_size = 10000
+    # Labels of float columns that hold integer values, e.g. because they can be
+    # missing, and that are written as integers
+    csv_integer_labels = ()
+
     @classmethod
     @abc.abstractmethod
     def csv_export_filename(cls) -> str:
@@ -201,24 +239,82 @@ class _Base_Positions_Exporter(abc.ABC):
     ) -> dict:
         pass
 
+    @classmethod
+    @abc.abstractmethod
+    def columns_export(
+        cls, raw_values: typing.Sequence, world_indices: np.ndarray
+    ) -> typing.Dict[str, np.ndarray]:
+        """
+        Columnar version of dict_export() for many data at once
+
+        Returns one array per label. Missing numeric values are NaN, missing strings
+        are None.
+        """
+        pass
+
     def csv_export_write(
-        self, positions_bisector, timestamps, export_window, export_dir
+        self,
+        positions_bisector,
+        timestamps,
+        export_window,
+        export_dir,
+        columnar_format=None,
     ):
         export_file = type(self).csv_export_filename()
         export_path = os.path.join(export_dir, export_file)
 
         export_section = positions_bisector.init_dict_for_window(export_window)
         export_world_idc = pm.find_closest(timestamps, export_section["data_ts"])
+        columns = type(self).columns_export(export_section["data"], export_world_idc)
 
         with open(export_path, "w", encoding="utf-8", newline="") as csvfile:
-            csv_header = type(self).csv_export_labels()
-            dict_writer = csv.DictWriter(csvfile, fieldnames=csv_header)
-            dict_writer.writeheader()
+            type(self).csv_write_columns(csvfile, columns)
+        logger.info(f"Created '{export_file}' file.")
+
+        if columnar_format is not None:
+            self.columnar_export_write(columns, export_dir, columnar_format)
 
-            for g, idx in zip(export_section["data"], export_world_idc):
-                dict_row = type(self).dict_export(raw_value=g, world_index=idx)
-                dict_writer.writerow(dict_row)
+    @classmethod
+    def csv_write_columns(cls, csvfile, columns: typing.Dict[str, np.ndarray]):
+        """Writes columns in the csv format of dict_export() rows"""
+        labels = cls.csv_export_labels()
+        csv.writer(csvfile).writerow(labels)
+
+        num_rows = len(columns[labels[0]])
+        for start in range(0, num_rows, cls.csv_block_size):
+            block = slice(start, start + cls.csv_block_size)
+            cells = [
+                _csv_cells(columns[label][block], label in cls.csv_integer_labels)
+                for label in labels
+            ]
+            rows = map(",".join, zip(*cells))
+            csvfile.write("".join(row + "\r\n" for row in rows))
+
+    def columnar_export_write(
+        self, columns: typing.Dict[str, np.ndarray], export_dir, columnar_format
+    ):
+        """Writes columns with the csv schema to npz, parquet, or feather files"""
+        if columnar_format not in available_columnar_formats():
+            raise ValueError(f"Unsupported export format '{columnar_format}'")
+        export_name = os.path.splitext(type(self).csv_export_filename())[0]
+        export_file = f"{export_name}.{columnar_format}"
+        export_path = os.path.join(export_dir, export_file)
 
+        labels = type(self).csv_export_labels()
+        if columnar_format == "npz":
+            arrays = {label: _npz_array(columns[label]) for label in labels}
+            np.savez(export_path, **arrays)
+        else:
+            table = pyarrow.table(
+                {
+                    label: pyarrow.array(columns[label], from_pandas=True)
+                    for label in labels
+                }
+            )
+            if columnar_format == "parquet":
+                pyarrow.parquet.write_table(table, export_path)
+            else:
+                pyarrow.feather.write_feather(table, export_path)
         logger.info(f"Created '{export_file}' file.")
 
 
@@ -269,6 +365,103 @@ class Pupil_Positions_Exporter(_Base_Positions_Exporter):
             "projected_sphere_angle",
         )
 
+    csv_integer_labels = ("model_id",)
+
+    _ellipse_fields = ("ellipse.center", "ellipse.axes", "ellipse.angle")
+    _3d_fields = (
+        "diameter_3d",
+        "model_confidence",
+        "model_id",
+        "sphere.center",
+        "sphere.radius",
+        "circle_3d.center",
+        "circle_3d.normal",
+        "circle_3d.radius",
+        "theta",
+        "phi",
+        "projected_sphere.center",
+        "projected_sphere.axes",
+        "projected_sphere.angle",
+    )
+
+    _vector_sizes = {
+        "ellipse.center": 2,
+        "ellipse.axes": 2,
+        "sphere.center": 3,
+        "circle_3d.center": 3,
+        "circle_3d.normal": 3,
+        "projected_sphere.center": 2,
+        "projected_sphere.axes": 2,
+    }
+
+    @classmethod
+    def columns_export(
+        cls, raw_values: typing.Sequence, world_indices: np.ndarray
+    ) -> typing.Dict[str, np.ndarray]:
+        fields = fm.extract_fields(
+            raw_values,
+            (
+                "timestamp",
+                "id",
+                "confidence",
+                "norm_pos",
+                "diameter",
+                "method",
+                *cls._ellipse_fields,
+                *cls._3d_fields,
+            ),
+            dtype={"id": np.int64, "method": object},
+            default={"id": -1, "method": None},
+        )
+        num_rows = len(raw_values)
+        norm_pos = _vectors(fields["norm_pos"], num_rows, 2)
+
+        # like dict_export(), groups are exported only if all of their fields exist
+        ellipse = _complete_group(
+            fields, cls._ellipse_fields, cls._vector_sizes, num_rows
+        )
+        data_3d = _complete_group(fields, cls._3d_fields, cls._vector_sizes, num_rows)
+
+        return {
+            # 2d data
+            "pupil_timestamp": fields["timestamp"],
+            "world_index": np.asarray(world_indices),
+            "eye_id": fields["id"],
+            "confidence": fields["confidence"],
+            "norm_pos_x": norm_pos[:, 0],
+            "norm_pos_y": norm_pos[:, 1],
+            "diameter": fields["diameter"],
+            "method": fields["method"],
+            # ellipse data
+            "ellipse_center_x": ellipse["ellipse.center"][:, 0],
+            "ellipse_center_y": ellipse["ellipse.center"][:, 1],
+            "ellipse_axis_a": ellipse["ellipse.axes"][:, 0],
+            "ellipse_axis_b": ellipse["ellipse.axes"][:, 1],
+            "ellipse_angle": ellipse["ellipse.angle"],
+            # 3d data
+            "diameter_3d": data_3d["diameter_3d"],
+            "model_confidence": data_3d["model_confidence"],
+            "model_id": data_3d["model_id"],
+            "sphere_center_x": data_3d["sphere.center"][:, 0],
+            "sphere_center_y": data_3d["sphere.center"][:, 1],
+            "sphere_center_z": data_3d["sphere.center"][:, 2],
+            "sphere_radius": data_3d["sphere.radius"],
+            "circle_3d_center_x": data_3d["circle_3d.center"][:, 0],
+            "circle_3d_center_y": data_3d["circle_3d.center"][:, 1],
+            "circle_3d_center_z": data_3d["circle_3d.center"][:, 2],
+            "circle_3d_normal_x": data_3d["circle_3d.normal"][:, 0],
+            "circle_3d_normal_y": data_3d["circle_3d.normal"][:, 1],
+            "circle_3d_normal_z": data_3d["circle_3d.normal"][:, 2],
+            "circle_3d_radius": data_3d["circle_3d.radius"],
+            "theta": data_3d["theta"],
+            "phi": data_3d["phi"],
+            "projected_sphere_center_x": data_3d["projected_sphere.center"][:, 0],
+            "projected_sphere_center_y": data_3d["projected_sphere.center"][:, 1],
+            "projected_sphere_axis_a": data_3d["projected_sphere.axes"][:, 0],
+            "projected_sphere_axis_b": data_3d["projected_sphere.axes"][:, 1],
+            "projected_sphere_angle": data_3d["projected_sphere.angle"],
+        }
+
     @classmethod
     def dict_export(
         cls, raw_value: csv_utils.CSV_EXPORT_RAW_TYPE, world_index: int
@@ -394,6 +587,103 @@ class Gaze_Positions_Exporter(_Base_Positions_Exporter):
             "gaze_normal1_z",
         )
 
+    @classmethod
+    def columns_export(
+        cls, raw_values: typing.Sequence, world_indices: np.ndarray
+    ) -> typing.Dict[str, np.ndarray]:
+        fields = fm.extract_fields(
+            raw_values,
+            (
+                "timestamp",
+                "confidence",
+                "norm_pos",
+                "base_data",
+                "gaze_point_3d",
+                "eye_centers_3d",
+                "gaze_normals_3d",
+                "eye_center_3d",
+                "gaze_normal_3d",
+            ),
+            dtype={
+                "base_data": object,
+                "eye_centers_3d": object,
+                "gaze_normals_3d": object,
+            },
+            default={
+                "base_data": None,
+                "eye_centers_3d": None,
+                "gaze_normals_3d": None,
+            },
+        )
+        num_rows = len(raw_values)
+        norm_pos = _vectors(fields["norm_pos"], num_rows, 2)
+        gaze_points_3d = _vectors(fields["gaze_point_3d"], num_rows, 3)
+        eye_centers_3d = np.full((2, num_rows, 3), np.nan)
+        gaze_normals_3d = np.full((2, num_rows, 3), np.nan)
+
+        base_data = np.empty(num_rows, dtype=object)
+        num_unexpected_base_data = 0
+        for idx, (datum_base_data, binocular_centers, binocular_normals) in enumerate(
+            zip(
+                fields["base_data"],
+                fields["eye_centers_3d"],
+                fields["gaze_normals_3d"],
+            )
+        ):
+            if datum_base_data is not None:
+                base_data[idx] = " ".join(
+                    "{}-{}".format(b["timestamp"], b["id"]) for b in datum_base_data
+                )
+            if np.isnan(gaze_points_3d[idx, 0]):
+                continue
+            if binocular_centers is not None:
+                for eye_id in (0, 1):
+                    eye_centers_3d[eye_id, idx] = _vector_or_nan(
+                        binocular_centers.get(eye_id)
+                    )
+                    gaze_normals_3d[eye_id, idx] = _vector_or_nan(
+                        binocular_normals.get(eye_id)
+                    )
+            elif not np.isnan(fields["eye_center_3d"][idx]).all():
+                try:
+                    eye_id = str(datum_base_data[0]["id"])
+                except (KeyError, IndexError, TypeError):
+                    num_unexpected_base_data += 1
+                    continue
+                if eye_id in ("0", "1"):
+                    eye_centers_3d[int(eye_id), idx] = fields["eye_center_3d"][idx]
+                    gaze_normals_3d[int(eye_id), idx] = fields["gaze_normal_3d"][idx]
+
+        if num_unexpected_base_data:
+            logger.warning(
+                f"Unexpected raw base_data for {num_unexpected_base_data} monocular"
+                " gaze data!"
+            )
+
+        return {
+            "gaze_timestamp": fields["timestamp"],
+            "world_index": np.asarray(world_indices),
+            "confidence": fields["confidence"],
+            "norm_pos_x": norm_pos[:, 0],
+            "norm_pos_y": norm_pos[:, 1],
+            "base_data": base_data,
+            "gaze_point_3d_x": gaze_points_3d[:, 0],
+            "gaze_point_3d_y": gaze_points_3d[:, 1],
+            "gaze_point_3d_z": gaze_points_3d[:, 2],
+            "eye_center0_3d_x": eye_centers_3d[0, :, 0],
+            "eye_center0_3d_y": eye_centers_3d[0, :, 1],
+            "eye_center0_3d_z": eye_centers_3d[0, :, 2],
+            "gaze_normal0_x": gaze_normals_3d[0, :, 0],
+            "gaze_normal0_y": gaze_normals_3d[0, :, 1],
+            "gaze_normal0_z": gaze_normals_3d[0, :, 2],
+            "eye_center1_3d_x": eye_centers_3d[1, :, 0],
+            "eye_center1_3d_y": eye_centers_3d[1, :, 1],
+            "eye_center1_3d_z": eye_centers_3d[1, :, 2],
+            "gaze_normal1_x": gaze_normals_3d[1, :, 0],
+            "gaze_normal1_y": gaze_normals_3d[1, :, 1],
+            "gaze_normal1_z": gaze_normals_3d[1, :, 2],
+        }
+
     @classmethod
     def dict_export(
         cls, raw_value: csv_utils.CSV_EXPORT_RAW_TYPE, world_index: int
@@ -469,3 +759,69 @@ class Gaze_Positions_Exporter(_Base_Positions_Exporter):
             "gaze_normal1_y": gaze_normals1_3d[1],
             "gaze_normal1_z": gaze_normals1_3d[2],
         }
+
+
+def _vectors(array: np.ndarray, num_rows: int, size: int) -> np.ndarray:
+    """Array of shape (num_rows, size), also if the field is missing in all data"""
+    if array.ndim == 2 and array.shape[1] == size:
+        return array
+    return np.full((num_rows, size), np.nan)
+
+
+def _vector_or_nan(value, size=3) -> np.ndarray:
+    try:
+        return np.asarray(value, dtype=np.float64).reshape(size)
+    except (TypeError, ValueError):
+        return np.full(size, np.nan)
+
+
+def _complete_group(fields, group_fields, vector_sizes, num_rows):
+    """Fields of a group, set to NaN for data that lack any field of the group"""
+    group = {}
+    for field in group_fields:
+        array = fields[field]
+        if field in vector_sizes:
+            array = _vectors(array, num_rows, vector_sizes[field])
+        group[field] = array.astype(np.float64)
+    is_incomplete = np.zeros(num_rows, dtype=bool)
+    for array in group.values():
+        is_incomplete |= np.isnan(array.reshape(num_rows, -1)).any(axis=1)
+    for array in group.values():
+        array[is_incomplete] = np.nan
+    return group
+
+
+def _csv_cells(column: np.ndarray, is_integer: bool) -> typing.List[str]:
+    """Values of a column formatted like csv.writer formats dict_export() values"""
+    if column.dtype.hasobject:
+        return [_csv_quote(value) for value in column.tolist()]
+    if column.dtype.kind != "f":
+        return list(map(str, column.tolist()))
+
+    is_missing = np.isnan(column)
+    if is_integer:
+        cells = list(
+            map(str, np.where(is_missing, 0, column).astype(np.int64).tolist())
+        )
+    else:
+        # csv.writer uses repr() for floats, i.e. the shortest exact representation
+        cells = list(map(repr, column.tolist()))
+    for idx in np.flatnonzero(is_missing).tolist():
+        cells[idx] = ""
+    return cells
+
+
+def _csv_quote(value) -> str:
+    if value is None:
+        return ""
+    value = str(value)
+    if any(char in value for char in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def _npz_array(column: np.ndarray) -> np.ndarray:
+    if column.dtype.hasobject:
+        # npz files with object arrays can only be loaded with pickle
+        return np.array(["" if value is None else value for value in column], dtype=str)
+    return column
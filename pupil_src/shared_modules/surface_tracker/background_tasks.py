@@ -9,13 +9,15 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import bisect
 import csv
-import itertools
+import heapq
 import logging
 import os
 import types
 
 import cv2
+import numpy as np
 
 import background_helper
 import player_methods
@@ -23,9 +25,18 @@ import player_methods
 logger = logging.getLogger(__name__)
 
 
+# Spawning a worker with its own decoder only pays off for enough frames
+MIN_FRAMES_PER_VIDEO_PROCESSOR = 500
+
+
 def background_video_processor(
-    video_file_path, callable, visited_list, seek_idx, mp_context
+    video_file_path, callable, visited_list, seek_idx, mp_context, num_workers=1
 ):
+    chunks = video_processing_chunks(visited_list, num_workers)
+    if len(chunks) > 1:
+        return Background_Video_Processor_Pool(
+            video_file_path, callable, visited_list, seek_idx, mp_context, chunks
+        )
     return background_helper.IPC_Logging_Task_Proxy(
         "Background Video Processor",
         video_processing_generator,
@@ -34,6 +45,88 @@ def background_video_processor(
     )
 
 
+def video_processing_chunks(visited_list, num_workers):
+    """
+    Splits the frame range into contiguous chunks, each containing about the same
+    number of unvisited frames. Returns a list of (start, stop) tuples.
+    """
+    unvisited = [idx for idx, x in enumerate(visited_list) if x is None]
+    num_chunks = min(num_workers, len(unvisited) // MIN_FRAMES_PER_VIDEO_PROCESSOR)
+    if num_chunks <= 1:
+        return [(0, len(visited_list))]
+    starts = [0]
+    starts += [
+        unvisited[len(unvisited) * i // num_chunks] for i in range(1, num_chunks)
+    ]
+    stops = starts[1:] + [len(visited_list)]
+    return list(zip(starts, stops))
+
+
+class Background_Video_Processor_Pool:
+    """
+    Processes the unvisited frames of a video with one background task per chunk.
+
+    Every task decodes its chunk with its own File_Source. Seek requests are
+    forwarded to the task whose chunk contains the requested frame. Provides the
+    interface of the Task_Proxy returned by background_video_processor().
+    """
+
+    def __init__(
+        self, video_file_path, callable, visited_list, seek_idx, mp_context, chunks
+    ):
+        self._seek_idx = seek_idx
+        self._chunk_starts = [start for start, _ in chunks]
+        self._chunk_seek_idc = []
+        self._tasks = []
+        self._next_task_idx = 0
+
+        for chunk_idx, (start, stop) in enumerate(chunks):
+            # Frames outside of the chunk are handled by other tasks
+            chunk_visited_list = [
+                x if start <= idx < stop else True for idx, x in enumerate(visited_list)
+            ]
+            chunk_seek_idx = mp_context.Value("i", -1)
+            task = background_helper.IPC_Logging_Task_Proxy(
+                f"Background Video Processor {chunk_idx + 1}/{len(chunks)}",
+                video_processing_generator,
+                (video_file_path, callable, chunk_seek_idx, chunk_visited_list),
+                context=mp_context,
+            )
+            self._chunk_seek_idc.append(chunk_seek_idx)
+            self._tasks.append(task)
+
+    def _forward_seek(self):
+        seek_idx = self._seek_idx.value
+        if seek_idx == -1:
+            return
+        self._seek_idx.value = -1
+        chunk_idx = bisect.bisect_right(self._chunk_starts, seek_idx) - 1
+        self._chunk_seek_idc[max(chunk_idx, 0)].value = seek_idx
+
+    def fetch(self):
+        self._forward_seek()
+        # Rotate the first task to fetch from, such that callers which stop
+        # fetching early do not starve the other tasks.
+        num_tasks = len(self._tasks)
+        first_task_idx = self._next_task_idx
+        self._next_task_idx = (first_task_idx + 1) % num_tasks
+        for offset in range(num_tasks):
+            task = self._tasks[(first_task_idx + offset) % num_tasks]
+            yield from task.fetch()
+
+    def cancel(self, timeout=1):
+        for task in self._tasks:
+            task.cancel(timeout)
+
+    @property
+    def completed(self):
+        return all(task.completed or task.canceled for task in self._tasks)
+
+    @property
+    def canceled(self):
+        return all(task.canceled for task in self._tasks)
+
+
 def video_processing_generator(video_file_path, callable, seek_idx, visited_list):
     import os
     import logging
@@ -222,6 +315,7 @@ def get_export_proxy(
     fixations,
     camera_model,
     mp_context,
+    num_workers=None,
 ):
     exporter = Exporter(
         export_dir,
@@ -232,6 +326,10 @@ def get_export_proxy(
         fixations,
         camera_model,
     )
+    if num_workers is None:
+        num_workers = mp_context.cpu_count()
+    if num_workers > 1 and surfaces:
+        return Background_Export_Pool(exporter, mp_context, num_workers)
     proxy = background_helper.IPC_Logging_Task_Proxy(
         "Offline Surface Tracker Exporter",
         exporter.save_surface_statisics_to_file,
@@ -240,6 +338,101 @@ def get_export_proxy(
     return proxy
 
 
+class Background_Export_Pool:
+    """
+    Runs an Exporter with one background task for the statistics across all
+    surfaces and one background task per surface.
+
+    At most `num_workers` tasks run at the same time. Pending tasks are started
+    whenever running tasks complete during fetch(). Each surface task yields the
+    timestamps of its gaze on the surface. The gaze distribution across surfaces is
+    exported from these once all surface tasks completed. Provides the interface of
+    the Task_Proxy returned by get_export_proxy().
+    """
+
+    def __init__(self, exporter, mp_context, num_workers):
+        self._exporter = exporter
+        self._mp_context = mp_context
+        self._num_workers = num_workers
+        self._pending = []
+        self._running = []
+        self._canceled = False
+        self._num_tasks = 0
+        self._num_done = 0
+        self._gaze_on_surf_ts = {}
+        self._is_done = False
+
+        if not exporter.create_metrics_dir():
+            return
+
+        self._pending.append(
+            ("surface statistics", None, exporter.save_section_statistics_to_file, ())
+        )
+        for surf_idx, surface in enumerate(exporter.surfaces):
+            self._pending.append(
+                (
+                    f"'{surface.name}'",
+                    surf_idx,
+                    exporter.save_surface_to_file,
+                    (surf_idx,),
+                )
+            )
+        self._num_tasks = len(self._pending)
+        self._start_pending_tasks()
+
+    def _start_pending_tasks(self):
+        while self._pending and len(self._running) < self._num_workers:
+            name, surf_idx, generator, args = self._pending.pop(0)
+            task = background_helper.IPC_Logging_Task_Proxy(
+                f"Offline Surface Tracker Exporter: {name}",
+                generator,
+                args,
+                context=self._mp_context,
+            )
+            self._running.append((name, surf_idx, task))
+
+    def fetch(self):
+        for name, surf_idx, task in list(self._running):
+            for result in task.fetch():
+                if surf_idx is None:
+                    yield result
+                else:
+                    self._gaze_on_surf_ts[surf_idx] = result
+            if task.completed or task.canceled:
+                self._running.remove((name, surf_idx, task))
+                self._num_done += 1
+                logger.info(
+                    f"Surface export {self._num_done}/{self._num_tasks}: "
+                    f"finished {name}"
+                )
+        self._start_pending_tasks()
+        is_done = self._is_done or self._canceled
+        if self.completed and self._num_tasks and not is_done:
+            self._is_done = True
+            if len(self._gaze_on_surf_ts) == len(self._exporter.surfaces):
+                self._exporter.save_surface_gaze_distribution_to_file(
+                    [
+                        self._gaze_on_surf_ts[surf_idx]
+                        for surf_idx in range(len(self._exporter.surfaces))
+                    ]
+                )
+            logger.info("Done exporting reference surface data.")
+
+    def cancel(self, timeout=1):
+        self._canceled = True
+        self._pending.clear()
+        for _, _, task in self._running:
+            task.cancel(timeout)
+
+    @property
+    def completed(self):
+        return not self._pending and not self._running
+
+    @property
+    def canceled(self):
+        return self._canceled
+
+
 class Exporter:
     def __init__(
         self,
@@ -258,10 +451,20 @@ class Exporter:
         self.gaze_positions = gaze_positions
         self.fixations = fixations
         self.camera_model = camera_model
-        self.gaze_on_surfaces = None
-        self.fixations_on_surfaces = None
 
     def save_surface_statisics_to_file(self):
+        if not self.create_metrics_dir():
+            return
+
+        yield from self.save_section_statistics_to_file()
+        gaze_on_surf_ts = []
+        for surf_idx in range(len(self.surfaces)):
+            gaze_on_surf_ts.extend(self.save_surface_to_file(surf_idx))
+        self.save_surface_gaze_distribution_to_file(gaze_on_surf_ts)
+
+        logger.info("Done exporting reference surface data.")
+
+    def create_metrics_dir(self):
         logger.info("exporting metrics to {}".format(self.metrics_dir))
         if os.path.isdir(self.metrics_dir):
             logger.info("Will overwrite previous export for this section")
@@ -270,73 +473,79 @@ class Exporter:
                 os.mkdir(self.metrics_dir)
             except OSError:
                 logger.warning("Could not make metrics dir {}".format(self.metrics_dir))
-                return
-
-        (
-            self.gaze_on_surfaces,
-            self.fixations_on_surfaces,
-        ) = self._map_gaze_and_fixations()
+                return False
+        return True
 
+    def save_section_statistics_to_file(self):
+        """
+        Exports the files that cover all surfaces, except for the gaze distribution.
+        """
         self._export_surface_visibility()
-        self._export_surface_gaze_distribution()
         self._export_surface_events()
-
-        for surf_idx, surface in enumerate(self.surfaces):
-            # Sanitize surface name to include it in the filename
-            surface_name = "_" + surface.name.replace("/", "")
-
-            self._export_surface_positions(surface, surface_name)
-            self._export_gaze_on_surface(
-                self.gaze_on_surfaces[surf_idx], surface, surface_name
-            )
-            self._export_fixations_on_surface(
-                self.fixations_on_surfaces[surf_idx], surface, surface_name
-            )
-            self._export_surface_heatmap(surface, surface_name)
-
-            logger.info(
-                "Saved surface gaze and fixation data for '{}'".format(surface.name)
-            )
-
-        logger.info("Done exporting reference surface data.")
         return
 
         # Task_proxy requires a genrator. The `yield` below
         # triggers this function to become a generator.
         yield
 
-    def _map_gaze_and_fixations(self):
+    def save_surface_to_file(self, surf_idx):
         """
-        Result: Tuple[events_per_surface, events_per_surface]
-        events_per_surface = List[events_surface_0, ..., events_surface_N]
-        events_surface_i = List[events_world_frame_0, ..., events_world_frame_M]
-        events_world_frame_j: List[event, ...]
+        Maps gaze and fixations onto a single surface and exports its files.
 
-        N: Number of surfaces
-        M: Number of world frames
+        Yields the unique timestamps of the gaze on the surface, which are needed
+        for save_surface_gaze_distribution_to_file().
         """
+        surface = self.surfaces[surf_idx]
+        # Sanitize surface name to include it in the filename
+        surface_name = "_" + surface.name.replace("/", "")
+
         section = slice(*self.export_range)
-        gaze_on_surface = list(
-            gaze_on_surface_generator(
-                self.surfaces,
-                section,
-                self.world_timestamps,
-                self.gaze_positions,
-                self.camera_model,
-            )
+        gaze_on_surf = surface.map_section(
+            section, self.world_timestamps, self.gaze_positions, self.camera_model
+        )
+        fixations_on_surf = surface.map_section(
+            section, self.world_timestamps, self.fixations, self.camera_model
         )
 
-        fixations_on_surface = list(
-            gaze_on_surface_generator(
-                self.surfaces,
-                section,
-                self.world_timestamps,
-                self.fixations,
-                self.camera_model,
-            )
+        self._export_surface_positions(surface, surface_name)
+        self._export_gaze_on_surface(gaze_on_surf, surface, surface_name)
+        self._export_fixations_on_surface(fixations_on_surf, surface, surface_name)
+        self._export_surface_heatmap(surface, surface_name)
+
+        logger.info(
+            "Saved surface gaze and fixation data for '{}'".format(surface.name)
         )
+        yield np.unique(gaze_on_surf.timestamp[gaze_on_surf.on_surf])
 
-        return gaze_on_surface, fixations_on_surface
+    def save_surface_gaze_distribution_to_file(self, gaze_on_surf_ts):
+        """
+        gaze_on_surf_ts: Timestamps of the gaze on each surface, in surface order,
+            as yielded by save_surface_to_file()
+        """
+        with open(
+            os.path.join(self.metrics_dir, "surface_gaze_distribution.csv"),
+            "w",
+            encoding="utf-8",
+            newline="",
+        ) as csv_file:
+            csv_writer = csv.writer(csv_file, delimiter=",")
+
+            export_window = player_methods.exact_window(
+                self.world_timestamps, self.export_range
+            )
+            gaze_in_section = self.gaze_positions.by_ts_window(export_window)
+            not_on_any_surf_ts = set([gp["timestamp"] for gp in gaze_in_section])
+
+            csv_writer.writerow(("total_gaze_point_count", len(gaze_in_section)))
+            csv_writer.writerow("")
+            csv_writer.writerow(("surface_name", "gaze_count"))
+
+            for surface, surface_ts in zip(self.surfaces, gaze_on_surf_ts):
+                not_on_any_surf_ts.difference_update(surface_ts.tolist())
+                csv_writer.writerow((surface.name, len(surface_ts)))
+
+            csv_writer.writerow(("not_on_any_surface", len(not_on_any_surf_ts)))
+            logger.info("Created 'surface_gaze_distribution.csv' file")
 
     def _export_surface_visibility(self):
         with open(
@@ -364,37 +573,6 @@ class Exporter:
                 csv_writer.writerow((surface.name, visible_count))
             logger.info("Created 'surface_visibility.csv' file")
 
-    def _export_surface_gaze_distribution(self):
-        with open(
-            os.path.join(self.metrics_dir, "surface_gaze_distribution.csv"),
-            "w",
-            encoding="utf-8",
-            newline="",
-        ) as csv_file:
-            csv_writer = csv.writer(csv_file, delimiter=",")
-
-            export_window = player_methods.exact_window(
-                self.world_timestamps, self.export_range
-            )
-            gaze_in_section = self.gaze_positions.by_ts_window(export_window)
-            not_on_any_surf_ts = set([gp["timestamp"] for gp in gaze_in_section])
-
-            csv_writer.writerow(("total_gaze_point_count", len(gaze_in_section)))
-            csv_writer.writerow("")
-            csv_writer.writerow(("surface_name", "gaze_count"))
-
-            for surf_idx, surface in enumerate(self.surfaces):
-                gaze_on_surf = self.gaze_on_surfaces[surf_idx]
-                gaze_on_surf = list(itertools.chain.from_iterable(gaze_on_surf))
-                gaze_on_surf_ts = set(
-                    [gp["base_data"][1] for gp in gaze_on_surf if gp["on_surf"]]
-                )
-                not_on_any_surf_ts -= gaze_on_surf_ts
-                csv_writer.writerow((surface.name, len(gaze_on_surf_ts)))
-
-            csv_writer.writerow(("not_on_any_surface", len(not_on_any_surf_ts)))
-            logger.info("Created 'surface_gaze_distribution.csv' file")
-
     def _export_surface_events(self):
         with open(
             os.path.join(self.metrics_dir, "surface_events.csv"),
@@ -408,39 +586,24 @@ class Exporter:
                 ("world_index", "world_timestamp", "surface_name", "event_type")
             )
 
-            events = []
-            for surface in self.surfaces:
-                for (
-                    enter_frame_id,
-                    exit_frame_id,
-                ) in surface.location_cache.positive_ranges:
-                    events.append(
-                        {
-                            "frame_id": enter_frame_id,
-                            "surf_name": surface.name,
-                            "event": "enter",
-                        }
-                    )
-                    events.append(
-                        {
-                            "frame_id": exit_frame_id,
-                            "surf_name": surface.name,
-                            "event": "exit",
-                        }
-                    )
-
-            events.sort(key=lambda x: x["frame_id"])
-            for e in events:
+            # Events of each surface are ordered by frame already. Merging them keeps
+            # the surface order for events of the same frame.
+            events = heapq.merge(
+                *(self._surface_events(surface) for surface in self.surfaces),
+                key=lambda e: e[0],
+            )
+            for frame_id, surf_name, event in events:
                 csv_writer.writerow(
-                    (
-                        e["frame_id"],
-                        self.world_timestamps[e["frame_id"]],
-                        e["surf_name"],
-                        e["event"],
-                    )
+                    (frame_id, self.world_timestamps[frame_id], surf_name, event)
                 )
             logger.info("Created 'surface_events.csv' file")
 
+    @staticmethod
+    def _surface_events(surface):
+        for enter_frame_id, exit_frame_id in surface.location_cache.positive_ranges:
+            yield enter_frame_id, surface.name, "enter"
+            yield exit_frame_id, surface.name, "exit"
+
     def _export_surface_heatmap(self, surface, surface_name):
         if surface.within_surface_heatmap is not None:
             logger.info("Saved Heatmap as .png file.")
@@ -527,23 +690,26 @@ class Exporter:
                     "confidence",
                 )
             )
-            for idx, gaze_on_surf in enumerate(gazes_on_surface):
-                idx += self.export_range[0]
-                if gaze_on_surf:
-                    for gp in gaze_on_surf:
-                        csv_writer.writerow(
-                            (
-                                self.world_timestamps[idx],
-                                idx,
-                                gp["timestamp"],
-                                gp["norm_pos"][0],
-                                gp["norm_pos"][1],
-                                gp["norm_pos"][0] * surface.real_world_size["x"],
-                                gp["norm_pos"][1] * surface.real_world_size["y"],
-                                gp["on_surf"],
-                                gp["confidence"],
-                            )
-                        )
+            world_indices = gazes_on_surface.event_frames + self.export_range[0]
+            timestamps = gazes_on_surface.timestamp.tolist()
+            norm_pos = gazes_on_surface.norm_pos.tolist()
+            on_surf = gazes_on_surface.on_surf.tolist()
+            confidence = gazes_on_surface.confidence.tolist()
+            for event_idx, world_idx in enumerate(world_indices.tolist()):
+                x_norm, y_norm = norm_pos[event_idx]
+                csv_writer.writerow(
+                    (
+                        self.world_timestamps[world_idx],
+                        world_idx,
+                        timestamps[event_idx],
+                        x_norm,
+                        y_norm,
+                        x_norm * surface.real_world_size["x"],
+                        y_norm * surface.real_world_size["y"],
+                        on_surf[event_idx],
+                        confidence[event_idx],
+                    )
+                )
 
     def _export_fixations_on_surface(self, fixations_on_surf, surface, surface_name):
         """
@@ -573,22 +739,29 @@ class Exporter:
                     "on_surf",
                 )
             )
-            for world_idx, fixs_for_frame in enumerate(fixations_on_surf):
-                world_idx += self.export_range[0]
-                if fixs_for_frame:
-                    for fix in fixs_for_frame:
-                        csv_writer.writerow(
-                            (
-                                self.world_timestamps[world_idx],
-                                world_idx,
-                                fix["id"],
-                                fix["timestamp"],
-                                fix["duration"],
-                                fix["dispersion"],
-                                fix["norm_pos"][0],
-                                fix["norm_pos"][1],
-                                fix["norm_pos"][0] * surface.real_world_size["x"],
-                                fix["norm_pos"][1] * surface.real_world_size["y"],
-                                fix["on_surf"],
-                            )
-                        )
+            world_indices = fixations_on_surf.event_frames + self.export_range[0]
+            if not len(world_indices):
+                return
+            ids = fixations_on_surf.fixation_fields["id"].tolist()
+            durations = fixations_on_surf.fixation_fields["duration"].tolist()
+            dispersions = fixations_on_surf.fixation_fields["dispersion"].tolist()
+            timestamps = fixations_on_surf.timestamp.tolist()
+            norm_pos = fixations_on_surf.norm_pos.tolist()
+            on_surf = fixations_on_surf.on_surf.tolist()
+            for event_idx, world_idx in enumerate(world_indices.tolist()):
+                x_norm, y_norm = norm_pos[event_idx]
+                csv_writer.writerow(
+                    (
+                        self.world_timestamps[world_idx],
+                        world_idx,
+                        ids[event_idx],
+                        timestamps[event_idx],
+                        durations[event_idx],
+                        dispersions[event_idx],
+                        x_norm,
+                        y_norm,
+                        x_norm * surface.real_world_size["x"],
+                        y_norm * surface.real_world_size["y"],
+                        on_surf[event_idx],
+                    )
+                )
@@ -9,10 +9,85 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import bisect
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
-import itertools
+
+
+class Ranges:
+    """Sorted, disjoint and non-touching ranges of indices
+
+    Ranges are inclusive [start, end] pairs. Starts and ends are kept in two sorted
+    lists, such that adding or removing a single index only needs a binary search
+    instead of a scan over all ranges.
+    """
+
+    def __init__(self, starts=(), ends=()):
+        self._starts = list(starts)
+        self._ends = list(ends)
+
+    @classmethod
+    def from_mask(cls, mask):
+        mask = np.asarray(mask, dtype=bool)
+        padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+        edges = np.flatnonzero(np.diff(padded))
+        return cls(edges[::2].tolist(), (edges[1::2] - 1).tolist())
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        return ([start, end] for start, end in zip(self._starts, self._ends))
+
+    def __contains__(self, index):
+        range_idx = bisect.bisect_right(self._starts, index) - 1
+        return range_idx >= 0 and index <= self._ends[range_idx]
+
+    def as_list(self):
+        return list(self)
+
+    def add(self, index):
+        range_idx = bisect.bisect_right(self._starts, index) - 1
+        if range_idx >= 0 and index <= self._ends[range_idx]:
+            return
+        next_idx = range_idx + 1
+        extends_prev = range_idx >= 0 and self._ends[range_idx] == index - 1
+        extends_next = (
+            next_idx < len(self._starts) and self._starts[next_idx] == index + 1
+        )
+        if extends_prev and extends_next:
+            # index closes the gap between two ranges
+            self._ends[range_idx] = self._ends[next_idx]
+            del self._starts[next_idx]
+            del self._ends[next_idx]
+        elif extends_prev:
+            self._ends[range_idx] = index
+        elif extends_next:
+            self._starts[next_idx] = index
+        else:
+            self._starts.insert(next_idx, index)
+            self._ends.insert(next_idx, index)
+
+    def remove(self, index):
+        range_idx = bisect.bisect_right(self._starts, index) - 1
+        if range_idx < 0 or index > self._ends[range_idx]:
+            return
+        start, end = self._starts[range_idx], self._ends[range_idx]
+        if start == end:
+            del self._starts[range_idx]
+            del self._ends[range_idx]
+        elif index == start:
+            self._starts[range_idx] = index + 1
+        elif index == end:
+            self._ends[range_idx] = index - 1
+        else:
+            # split range
+            self._ends[range_idx] = index - 1
+            self._starts.insert(range_idx + 1, index + 1)
+            self._ends.insert(range_idx + 1, end)
 
 
 class Cache(list):
@@ -23,6 +98,8 @@ class Cache(list):
     self.positive_ranges show ranges where the cache does not evaluate as 'False' using eval_fn
     this allows to use ranges a a way of showing where no caching has happed (default) or whatever you do with eval_fn
     self.complete indicated that the cache list has no unknowns aka False
+    Ranges are updated incrementally per index, see Ranges.
+    Entries are stored as given, e.g. lists of Surface_Marker for the marker cache.
     """
 
     def __init__(self, init_list):
@@ -30,16 +107,22 @@ class Cache(list):
 
         self.length = len(self)
 
-        self._positive_ranges = self.recompute_ranges(self.positive_eval_fn)
-        self._visited_ranges = self.recompute_ranges(self.visited_eval_fn)
+        self._positive_ranges = Ranges.from_mask(
+            [self.positive_eval_fn(x) for x in self]
+        )
+        self._visited_ranges = Ranges.from_mask([self.visited_eval_fn(x) for x in self])
 
     @property
     def visited_ranges(self):
-        return self._visited_ranges
+        return self._visited_ranges.as_list()
 
     @property
     def positive_ranges(self):
-        return self._positive_ranges
+        return self._positive_ranges.as_list()
+
+    @property
+    def complete(self):
+        return [[0, self.length - 1]] == self.visited_ranges or not self.length
 
     def update(self, key, item, force=False):
         if self[key] is not None:
@@ -47,20 +130,19 @@ class Cache(list):
                 raise IndexError(
                     "Can not overwrite an already cached position without force!"
                 )
-            self[key] = item
-            self._visited_ranges = self.recompute_ranges(self.visited_eval_fn)
-            self._positive_ranges = self.recompute_ranges(self.positive_eval_fn)
-
-        elif item is not None:
-            # unvisited
-            self[key] = item
-
-            self.update_ranges(self._visited_ranges, key)
-            if self.positive_eval_fn(item):
-                self.update_ranges(self._positive_ranges, key)
-        else:
+        elif item is None:
             raise ValueError("`None` is not a valid value to be assigned in the cache!")
 
+        self[key] = item
+        for ranges, eval_fn in (
+            (self._visited_ranges, self.visited_eval_fn),
+            (self._positive_ranges, self.positive_eval_fn),
+        ):
+            if eval_fn(item):
+                ranges.add(key)
+            else:
+                ranges.remove(key)
+
     @staticmethod
     def visited_eval_fn(x):
         return x is not None
@@ -68,39 +150,3 @@ class Cache(list):
     @staticmethod
     def positive_eval_fn(x):
         return bool(x)
-
-    def recompute_ranges(self, eval_fn):
-        group_end_index = -1
-        ranges = []
-        for key, group in itertools.groupby(self, eval_fn):
-            group_start_index = group_end_index + 1
-            group_end_index += sum(1 for _ in group)
-            if key:
-                ranges.append([group_start_index, group_end_index])
-        return ranges
-
-    @staticmethod
-    def update_ranges(ranges, index):
-        for _range in ranges:
-            # most common case: extend a range
-            if index == _range[0] - 1:
-                _range[0] = index
-                Cache.merge_ranges(ranges)
-                return
-            elif index == _range[1] + 1:
-                _range[1] = index
-                Cache.merge_ranges(ranges)
-                return
-        # somewhere outside of range proximity
-        ranges.append([index, index])
-        ranges.sort(key=lambda x: x[0])
-
-    @staticmethod
-    def merge_ranges(ranges):
-        for i in range(len(ranges) - 1):
-            if ranges[i][1] == ranges[i + 1][0] - 1:
-                # merge touching fields
-                ranges[i] = [ranges[i][0], ranges[i + 1][1]]
-                # del second field
-                del ranges[i + 1]
-                return
@@ -0,0 +1,124 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import logging
+import os
+import typing as T
+
+import numpy as np
+
+from .cache import Cache
+from .surface import Surface_Location
+
+logger = logging.getLogger(__name__)
+
+
+class Location_Cache_Store:
+    """
+    File storage for complete surface location caches of a recording.
+
+    Every location cache is stored as NumPy arrays in its own file, named after a
+    key that identifies the surface definition and the marker cache the locations
+    were computed from. Surfaces that did not change since the last session can be
+    restored without locating them again, while edited surfaces get a new key.
+    """
+
+    version = 1
+
+    _TRANSFORMATIONS = (
+        "dist_img_to_surf_trans",
+        "surf_to_dist_img_trans",
+        "img_to_surf_trans",
+        "surf_to_img_trans",
+    )
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def file_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".npz")
+
+    def load(self, key: str, num_frames: int) -> T.Optional[Cache]:
+        """Returns the stored location cache or None if there is no valid one."""
+        try:
+            with np.load(self.file_path(key)) as arrays:
+                if int(arrays["version"]) != self.version:
+                    return None
+                detected = arrays["detected"]
+                num_detected_markers = arrays["num_detected_markers"].tolist()
+                transformations = [arrays[name] for name in self._TRANSFORMATIONS]
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Surface location cache could not be read.")
+            return None
+        if len(detected) != num_frames:
+            return None
+
+        locations = []
+        for idx, is_detected in enumerate(detected.tolist()):
+            if is_detected:
+                location = Surface_Location(
+                    True,
+                    *(trans[idx] for trans in transformations),
+                    num_detected_markers=num_detected_markers[idx],
+                )
+            else:
+                location = Surface_Location(detected=False)
+            locations.append(location)
+        return Cache(locations)
+
+    def save(self, key: str, location_cache: Cache):
+        """Stores a complete location cache, unless it was stored before."""
+        file_path = self.file_path(key)
+        if os.path.exists(file_path):
+            return
+
+        num_frames = len(location_cache)
+        detected = np.zeros(num_frames, dtype=bool)
+        num_detected_markers = np.zeros(num_frames, dtype=np.int32)
+        transformations = {
+            name: np.full((num_frames, 3, 3), np.nan) for name in self._TRANSFORMATIONS
+        }
+        for idx, location in enumerate(location_cache):
+            if location is None:
+                raise ValueError("Partial location caches can not be stored.")
+            if not location.detected:
+                continue
+            detected[idx] = True
+            num_detected_markers[idx] = location.num_detected_markers
+            for name, trans in transformations.items():
+                trans[idx] = getattr(location, name)
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first such that crashes do not leave a partial
+        # file behind that would be mistaken for a valid cache.
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "wb") as fh:
+            np.savez(
+                fh,
+                version=self.version,
+                detected=detected,
+                num_detected_markers=num_detected_markers,
+                **transformations,
+            )
+        os.replace(tmp_path, file_path)
+
+    def remove_unused(self, used_keys: T.Iterable[str]):
+        """Deletes stored caches of surfaces that were edited or removed."""
+        used_file_names = {key + ".npz" for key in used_keys}
+        try:
+            file_names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for file_name in file_names:
+            if file_name.endswith(".npz") and file_name not in used_file_names:
+                os.remove(os.path.join(self.directory, file_name))
@@ -0,0 +1,107 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import logging
+import os
+import typing as T
+
+import msgpack
+import numpy as np
+
+import file_methods
+
+logger = logging.getLogger(__name__)
+
+
+class Marker_Cache_Store:
+    """
+    Append-only file storage for marker detections of a recording.
+
+    Detections are stored as a stream of (frame_index, markers) records, such that
+    saving only appends the frames that were detected since the last save instead
+    of rewriting the whole cache. The meta file holds information about how the
+    markers were detected and is rewritten, together with an empty record file,
+    whenever the cache is reset.
+
+    Only the file format is compact. Once loaded, detections are kept in memory as
+    lists of Surface_Marker per frame, since surfaces, their location cache and the
+    background tasks consume these objects directly.
+    """
+
+    version = 1
+
+    def __init__(self, directory, file_name="surface_marker_cache"):
+        self.directory = directory
+        self.file_name = file_name
+
+    @property
+    def records_path(self) -> str:
+        return os.path.join(self.directory, self.file_name + ".msgpack")
+
+    @property
+    def meta_path(self) -> str:
+        return os.path.join(self.directory, self.file_name + ".meta")
+
+    def load(self) -> T.Optional[T.Tuple[dict, T.Dict[int, list]]]:
+        """
+        Returns meta data and detected markers by frame index or None if there is
+        no valid cache. Markers are returned in their serialized form.
+        """
+        try:
+            meta = file_methods.load_object(self.meta_path, allow_legacy=False)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Marker cache meta data could not be read.")
+            return None
+        if meta.get("version") != self.version:
+            logger.debug("Marker cache store version mismatch.")
+            return None
+
+        markers_by_frame = {}
+        try:
+            with open(self.records_path, "rb") as fh:
+                unpacker = msgpack.Unpacker(fh, raw=False, use_list=True)
+                for frame_index, markers in unpacker:
+                    # later records overwrite earlier ones
+                    markers_by_frame[frame_index] = markers
+                is_complete = unpacker.tell() == os.fstat(fh.fileno()).st_size
+        except FileNotFoundError:
+            return None
+        except (ValueError, msgpack.UnpackException):
+            is_complete = False
+
+        if not is_complete:
+            # Incomplete record, e.g. after a crash while appending. Rewrite the
+            # valid records such that later appends can be read again.
+            logger.warning("Marker cache is partially corrupted. Repairing it.")
+            self.reset(meta)
+            self.append(sorted(markers_by_frame.items()))
+        return meta, markers_by_frame
+
+    def reset(self, meta: dict):
+        """Drops all stored records and stores new meta data."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.records_path, "wb"):
+            pass
+        file_methods.save_object({**meta, "version": self.version}, self.meta_path)
+
+    def append(self, records: T.Iterable[T.Tuple[int, list]]):
+        packer = msgpack.Packer(use_bin_type=True, default=_ndarray_to_list)
+        with open(self.records_path, "ab") as fh:
+            for frame_index, markers in records:
+                fh.write(packer.pack((frame_index, markers)))
+
+
+def _ndarray_to_list(o):
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    return o
@@ -17,6 +17,7 @@ import uuid
 import cv2
 import numpy as np
 
+import file_methods as fm
 import methods
 from stdlib_utils import is_none, is_not_none
 
@@ -31,6 +32,83 @@ Surface_Marker_UID_To_Aggregate_Mapping = typing.Mapping[
 ]
 
 
+class Events_On_Surface_By_Frame:
+    """Columnar gaze or fixation on surface events, grouped by world frame.
+
+    Behaves like a list that contains a list of event dicts per world frame, see
+    Surface.map_gaze_and_fixation_events(). Dicts are only created on access, bulk
+    consumers should use the columns directly. Columns have one entry per event,
+    events of frame `i` are at `frame_offsets[i]:frame_offsets[i + 1]`.
+    """
+
+    def __init__(
+        self,
+        frame_offsets,
+        topics,
+        norm_pos,
+        confidence,
+        on_surf,
+        timestamp,
+        fixation_fields=None,
+    ):
+        self.frame_offsets = frame_offsets
+        self.topics = topics
+        self.norm_pos = norm_pos
+        self.confidence = confidence
+        self.on_surf = on_surf
+        self.timestamp = timestamp
+        # id, duration and dispersion of events with topic "fixations"
+        self.fixation_fields = fixation_fields or {}
+
+    @classmethod
+    def empty(cls, num_frames=0):
+        return cls(
+            frame_offsets=np.zeros(num_frames + 1, dtype=np.int64),
+            topics=np.array([], dtype=object),
+            norm_pos=np.empty((0, 2)),
+            confidence=np.empty(0),
+            on_surf=np.empty(0, dtype=bool),
+            timestamp=np.empty(0),
+        )
+
+    @property
+    def event_frames(self):
+        """Index of the frame of each event"""
+        return np.repeat(np.arange(len(self)), np.diff(self.frame_offsets))
+
+    def __len__(self):
+        return len(self.frame_offsets) - 1
+
+    def __getitem__(self, frame_idx):
+        if isinstance(frame_idx, slice):
+            return [self[idx] for idx in range(len(self))[frame_idx]]
+        if frame_idx < 0:
+            frame_idx += len(self)
+        if not 0 <= frame_idx < len(self):
+            raise IndexError("frame index out of range")
+        start, stop = self.frame_offsets[frame_idx], self.frame_offsets[frame_idx + 1]
+        return [self._event_dict(event_idx) for event_idx in range(start, stop)]
+
+    def __iter__(self):
+        return (self[frame_idx] for frame_idx in range(len(self)))
+
+    def _event_dict(self, event_idx):
+        topic = self.topics[event_idx]
+        timestamp = float(self.timestamp[event_idx])
+        mapped_datum = {
+            "topic": f"{topic}_on_surface",
+            "norm_pos": self.norm_pos[event_idx].tolist(),
+            "confidence": float(self.confidence[event_idx]),
+            "on_surf": bool(self.on_surf[event_idx]),
+            "base_data": (topic, timestamp),
+            "timestamp": timestamp,
+        }
+        if topic == "fixations":
+            for key, values in self.fixation_fields.items():
+                mapped_datum[key] = values[event_idx].item()
+        return mapped_datum
+
+
 class Surface(abc.ABC):
     """A Surface is a quadrangle whose position is defined in relation to a set of
     square markers in the real world. The markers are assumed to be in a fixed spatial
@@ -273,6 +351,98 @@ class Surface(abc.ABC):
             results.append(mapped_datum)
         return results
 
+    def map_gaze_and_fixation_events_by_frame(
+        self, frame_indices, trans_matrices, world_timestamps, events, camera_model
+    ):
+        """
+        Map gaze or fixation events of many world frames onto the surface at once.
+
+        Equivalent to calling map_gaze_and_fixation_events() with the events of
+        each frame's enclosing window, but decodes, undistorts and transforms all
+        events in one go.
+
+        Args:
+            frame_indices: Indices of the world frames to map events for.
+            trans_matrices: Image to surface transformation matrix per frame, None
+            for frames in which the surface was not detected.
+            world_timestamps: Timestamps of all world frames.
+            events: Bisector or Affiliator of gaze or fixation events.
+            camera_model: Camera Model object.
+
+        Returns:
+            Events_On_Surface_By_Frame with the mapped events of each frame.
+
+        """
+        frame_indices = np.asarray(frame_indices, dtype=np.int64)
+        if not len(events) or not len(frame_indices):
+            return Events_On_Surface_By_Frame.empty(len(frame_indices))
+
+        # Enclosing windows, see player_methods.enclosing_window()
+        world_timestamps = np.asarray(world_timestamps, dtype=np.float64)
+        midpoints = (world_timestamps[1:] + world_timestamps[:-1]) / 2.0
+        window_starts = np.concatenate(([-np.inf], midpoints))[frame_indices]
+        window_stops = np.concatenate((midpoints, [np.inf]))[frame_indices]
+        starts, stops = events.start_stop_idc_for_windows(window_starts, window_stops)
+
+        detected = np.array([m is not None for m in trans_matrices], dtype=bool)
+        counts = np.where(detected, np.maximum(stops - starts, 0), 0)
+        frame_offsets = np.concatenate(([0], np.cumsum(counts)))
+        event_frames = np.repeat(np.arange(len(frame_indices)), counts)
+        event_idc = np.arange(frame_offsets[-1]) - np.repeat(
+            frame_offsets[:-1] - starts, counts
+        )
+        if not len(event_idc):
+            return Events_On_Surface_By_Frame.empty(len(frame_indices))
+
+        # Events can belong to multiple frames, e.g. fixations. Decode them once.
+        unique_idc, inverse = np.unique(event_idc, return_inverse=True)
+        unique_events = events.data[unique_idc]
+        columns = fm.extract_fields(
+            unique_events, ("norm_pos", "confidence", "timestamp")
+        )
+        topics = fm.extract_field(unique_events, "topic", dtype=object, default="")
+        fixation_fields = {}
+        if np.any(topics == "fixations"):
+            fixation_fields["id"] = fm.extract_field(
+                unique_events, "id", dtype=np.int64, default=-1
+            )[inverse]
+            for key in ("duration", "dispersion"):
+                fixation_fields[key] = fm.extract_field(unique_events, key)[inverse]
+
+        norm_pos = columns["norm_pos"][inverse]
+        width, height = camera_model.resolution
+        img_points = np.empty_like(norm_pos)
+        img_points[:, 0] = norm_pos[:, 0] * width
+        img_points[:, 1] = (1 - norm_pos[:, 1]) * height
+        img_points = camera_model.undistort_points_on_image_plane(img_points)
+        img_points = np.asarray(img_points, dtype=np.float64).reshape(-1, 2)
+
+        # Apply the homography of each event's frame, like cv2.perspectiveTransform
+        homographies = np.stack([trans_matrices[idx] for idx in np.flatnonzero(counts)])
+        homographies = homographies[np.cumsum(counts > 0)[event_frames] - 1]
+        points_h = np.einsum(
+            "eij,ej->ei",
+            homographies,
+            np.column_stack((img_points, np.ones(len(img_points)))),
+        )
+        w = points_h[:, 2]
+        valid_w = np.abs(w) > np.finfo(np.float64).eps
+        surf_norm_pos = np.zeros((len(w), 2))
+        surf_norm_pos[valid_w] = points_h[valid_w, :2] / w[valid_w, np.newaxis]
+
+        with np.errstate(invalid="ignore"):
+            on_surf = np.all((0 <= surf_norm_pos) & (surf_norm_pos <= 1), axis=1)
+
+        return Events_On_Surface_By_Frame(
+            frame_offsets=frame_offsets,
+            topics=topics[inverse],
+            norm_pos=surf_norm_pos,
+            confidence=columns["confidence"][inverse],
+            on_surf=on_surf,
+            timestamp=columns["timestamp"][inverse],
+            fixation_fields=fixation_fields,
+        )
+
     @abc.abstractmethod
     def update_location(self, frame_idx, visible_markers, camera_model):
         """Update surface location based on marker detections in the current frame."""
@@ -597,13 +767,18 @@ class Surface(abc.ABC):
         """Compute the gaze distribution heatmap based on given gaze events."""
 
         heatmap_data = [g["norm_pos"] for g in gaze_on_surf if g["on_surf"]]
+        self.update_heatmap_from_norm_pos(np.array(heatmap_data).reshape(-1, 2))
+
+    def update_heatmap_from_norm_pos(self, norm_pos):
+        """Compute the gaze distribution heatmap based on on-surface positions."""
+
         aspect_ratio = self.real_world_size["y"] / self.real_world_size["x"]
         grid = (
             max(1, int(self._heatmap_resolution * aspect_ratio)),
             int(self._heatmap_resolution),
         )
-        if heatmap_data:
-            xvals, yvals = zip(*((x, 1.0 - y) for x, y in heatmap_data))
+        if len(norm_pos):
+            xvals, yvals = norm_pos[:, 0], 1.0 - norm_pos[:, 1]
             hist, *edges = np.histogram2d(
                 yvals, xvals, bins=grid, range=[[0, 1.0], [0, 1.0]], normed=False
             )
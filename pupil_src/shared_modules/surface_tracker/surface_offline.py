@@ -13,11 +13,9 @@ import logging
 import multiprocessing
 import platform
 
-import player_methods
-
 from . import background_tasks, offline_utils
 from .cache import Cache
-from .surface import Surface, Surface_Location
+from .surface import Events_On_Surface_By_Frame, Surface, Surface_Location
 
 logger = logging.getLogger(__name__)
 
@@ -43,12 +41,14 @@ class Surface_Offline(Surface):
         self.location_cache_filler = None
         self.observations_frame_idxs = []
         self.on_surface_change = None
+        self.location_cache_loader = None
         self.start_idx = None
 
     def __getstate__(self):
         state = self.__dict__.copy()
         # Remove the unpicklable entries.
         del state["on_surface_change"]
+        del state["location_cache_loader"]
         return state
 
     def __setstate__(self, state):
@@ -58,24 +58,20 @@ class Surface_Offline(Surface):
         try:
             location_cache = self.location_cache[section]
         except TypeError:
-            return []
-
-        section_gaze_on_surf = []
-        for frame_idx, location in enumerate(location_cache):
-            frame_idx += section.start
-            if location and location.detected:
-                frame_window = player_methods.enclosing_window(
-                    all_world_timestamps, frame_idx
-                )
-                gaze_events = all_gaze_events.by_ts_window(frame_window)
-
-                gaze_on_surf = self.map_gaze_and_fixation_events(
-                    gaze_events, camera_model, trans_matrix=location.img_to_surf_trans
-                )
-            else:
-                gaze_on_surf = []
-            section_gaze_on_surf.append(gaze_on_surf)
-        return section_gaze_on_surf
+            return Events_On_Surface_By_Frame.empty()
+
+        frame_indices = range(len(all_world_timestamps))[section]
+        trans_matrices = [
+            location.img_to_surf_trans if location and location.detected else None
+            for location in location_cache
+        ]
+        return self.map_gaze_and_fixation_events_by_frame(
+            frame_indices[: len(trans_matrices)],
+            trans_matrices,
+            all_world_timestamps,
+            all_gaze_events,
+            camera_model,
+        )
 
     def update_location(self, frame_idx, marker_cache, camera_model):
         if not self.defined:
@@ -156,7 +152,7 @@ class Surface_Offline(Surface):
                 self.on_surface_change(self)
 
     def update_location_cache(self, frame_idx, marker_cache, camera_model):
-        """ Update a single entry in the location cache."""
+        """Update a single entry in the location cache."""
 
         try:
             if not marker_cache[frame_idx]:
@@ -175,9 +171,20 @@ class Surface_Offline(Surface):
             self._recalculate_location_cache(frame_idx, marker_cache, camera_model)
 
     def _recalculate_location_cache(self, frame_idx, marker_cache, camera_model):
-        logging.debug("Recalculate Surface Cache!")
         if self.location_cache_filler is not None:
             self.location_cache_filler.cancel()
+            self.location_cache_filler = None
+
+        if self.location_cache_loader is not None:
+            location_cache = self.location_cache_loader(self)
+            if location_cache is not None:
+                logging.debug("Restored Surface Cache!")
+                self.location_cache = location_cache
+                if self.on_surface_change is not None:
+                    self.on_surface_change(self)
+                return
+
+        logging.debug("Recalculate Surface Cache!")
 
         # Reset cache and recalculate.
         self.cache_seek_idx.value = frame_idx
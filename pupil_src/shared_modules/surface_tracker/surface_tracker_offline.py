@@ -9,6 +9,7 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
+import hashlib
 import itertools
 import logging
 import multiprocessing
@@ -32,6 +33,8 @@ from plugin import Plugin
 from . import background_tasks, offline_utils
 from .cache import Cache
 from .gui import Heatmap_Mode
+from .location_cache_store import Location_Cache_Store
+from .marker_cache_store import Marker_Cache_Store
 from .surface_marker import Surface_Marker
 from .surface_marker_detector import MarkerDetectorMode, MarkerType
 from .surface_offline import Surface_Offline
@@ -69,9 +72,14 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
     order = 0.2
     TIMELINE_LINE_HEIGHT = 16
 
-    def __init__(self, g_pool, *args, **kwargs):
+    def __init__(self, g_pool, *args, marker_detection_workers=None, **kwargs):
         super().__init__(g_pool, *args, use_online_detection=False, **kwargs)
 
+        if marker_detection_workers is None:
+            # Leave one core for the foreground process
+            marker_detection_workers = max(mp_context.cpu_count() - 1, 1)
+        self.marker_detection_workers = marker_detection_workers
+
         self.MARKER_CACHE_VERSION = 3
         # Also add very small detected markers to cache and filter cache afterwards
         self.CACHE_MIN_MARKER_PERIMETER = 20
@@ -79,6 +87,9 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
         self.marker_cache = None
         self.marker_cache_unfiltered = None
         self.cache_filler = None
+        self._location_cache_store = Location_Cache_Store(
+            os.path.join(self.g_pool.rec_dir, "offline_data", "surface_location_cache")
+        )
         self._init_marker_cache()
         self.last_cache_update_ts = time.perf_counter()
         self.CACHE_UPDATE_INTERVAL_SEC = 5
@@ -143,6 +154,19 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             return marker_detector_mode
 
     def _init_marker_cache(self):
+        self._marker_cache_store = Marker_Cache_Store(
+            os.path.join(self.g_pool.rec_dir, "offline_data")
+        )
+        self._unsaved_marker_cache_indices = []
+
+        previous_params, previous_state = self._load_marker_cache_from_store()
+        if previous_params is not None:
+            self._recalculate_marker_cache(
+                parameters=previous_params, previous_state=previous_state
+            )
+            logger.debug("Restored previous marker cache.")
+            return
+
         previous_cache_config = file_methods.Persistent_Dict(
             os.path.join(self.g_pool.rec_dir, "square_marker_cache")
         )
@@ -172,8 +196,56 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             self._recalculate_marker_cache(
                 parameters=previous_params, previous_state=marker_cache_unfiltered
             )
+            # Migrate legacy cache to the append-only store
+            self._reset_marker_cache_store(previous_params)
+            self._save_marker_cache()
             logger.debug("Restored previous marker cache.")
 
+    def _load_marker_cache_from_store(self):
+        loaded = self._marker_cache_store.load()
+        if loaded is None:
+            return None, None
+        meta, markers_by_frame = loaded
+        num_frames = len(self.g_pool.timestamps)
+        if meta.get("marker_cache_version") != self.MARKER_CACHE_VERSION:
+            logger.debug("Marker cache version missmatch. Rebuilding marker cache.")
+            return None, None
+        if meta.get("num_frames") != num_frames:
+            return None, None
+
+        params = _CacheRelevantDetectorParams(
+            mode=MarkerDetectorMode.from_tuple(meta["marker_detector_mode"]),
+            inverted_markers=meta["inverted_markers"],
+            quad_decimate=meta["quad_decimate"],
+            sharpening=meta["sharpening"],
+        )
+        marker_cache_unfiltered = [None] * num_frames
+        for frame_index, markers in markers_by_frame.items():
+            if markers:
+                markers = [
+                    Surface_Marker.deserialize(args) if args else None
+                    for args in markers
+                ]
+            marker_cache_unfiltered[frame_index] = markers
+        return params, marker_cache_unfiltered
+
+    def _reset_marker_cache_store(self, parameters: _CacheRelevantDetectorParams):
+        self._marker_cache_store.reset(
+            {
+                "marker_cache_version": self.MARKER_CACHE_VERSION,
+                "num_frames": len(self.g_pool.timestamps),
+                "marker_detector_mode": parameters.mode.as_tuple(),
+                "inverted_markers": parameters.inverted_markers,
+                "quad_decimate": parameters.quad_decimate,
+                "sharpening": parameters.sharpening,
+            }
+        )
+        self._unsaved_marker_cache_indices = [
+            frame_index
+            for start, end in self.marker_cache_unfiltered.visited_ranges
+            for frame_index in range(start, end + 1)
+        ]
+
     def _set_detector_params(self, params: _CacheRelevantDetectorParams):
         self.marker_detector._marker_detector_mode = params.mode
         self.marker_detector._square_marker_inverted_markers = params.inverted_markers
@@ -215,7 +287,8 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
     ):
         # Ensures consistency across foreground and background detectors
         self._set_detector_params(parameters)
-        if previous_state is None:
+        is_new_cache = previous_state is None
+        if is_new_cache:
             previous_state = [None for _ in self.g_pool.timestamps]
 
             # If we had a previous_state argument, surface objects had just been
@@ -227,7 +300,12 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
 
         self.marker_cache_unfiltered = Cache(previous_state)
         self.marker_cache = self._filter_marker_cache(self.marker_cache_unfiltered)
+        if is_new_cache:
+            self._reset_marker_cache_store(parameters)
 
+        self._start_cache_filler()
+
+    def _start_cache_filler(self):
         if self.cache_filler is not None:
             self.cache_filler.cancel()
 
@@ -239,6 +317,7 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             list(self.marker_cache),
             self.cache_seek_idx,
             mp_context,
+            num_workers=self.marker_detection_workers,
         )
 
     def _filter_marker_cache(self, cache_to_filter):
@@ -261,6 +340,25 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             if m.perimeter >= self.marker_detector.marker_min_perimeter
         ]
 
+    def _update_ui_custom(self):
+        def set_marker_detection_workers(val):
+            self.marker_detection_workers = val
+            # Restart unfinished detection with the new number of workers
+            if self.cache_filler is not None:
+                self._start_cache_filler()
+
+        self.menu.append(
+            pyglui.ui.Slider(
+                "marker_detection_workers",
+                self,
+                label="Marker detection workers",
+                setter=set_marker_detection_workers,
+                step=1,
+                min=1,
+                max=mp_context.cpu_count(),
+            )
+        )
+
     def init_ui(self):
         super().init_ui()
 
@@ -330,6 +428,7 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             if frame_index is not None:
                 markers = self._remove_duplicate_markers(markers)
                 self.marker_cache_unfiltered.update(frame_index, markers)
+                self._unsaved_marker_cache_indices.append(frame_index)
                 marker_type = self.marker_detector.marker_detector_mode.marker_type
                 if marker_type == MarkerType.SQUARE_MARKER:
                     markers_filtered = self._filter_markers(markers)
@@ -352,6 +451,7 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             self._fill_gaze_on_surf_buffer()
             self._save_marker_cache()
             self.save_surface_definitions_to_file()
+            self._save_location_caches()
 
         now = time.perf_counter()
         if now - self.last_cache_update_ts > self.CACHE_UPDATE_INTERVAL_SEC:
@@ -381,23 +481,17 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
         for surface in self._heatmap_update_requests:
             surf_idx = self.surfaces.index(surface)
             gaze_on_surf = self.gaze_on_surf_buffer[surf_idx]
-            gaze_on_surf = itertools.chain.from_iterable(gaze_on_surf)
-            gaze_on_surf = (
-                g
-                for g in gaze_on_surf
-                if g["confidence"] >= self.g_pool.min_data_confidence
+            mask = gaze_on_surf.on_surf & (
+                gaze_on_surf.confidence >= self.g_pool.min_data_confidence
             )
-            gaze_on_surf = list(gaze_on_surf)
-            surface.update_heatmap(gaze_on_surf)
+            surface.update_heatmap_from_norm_pos(gaze_on_surf.norm_pos[mask])
 
         self._heatmap_update_requests.clear()
 
     def _compute_across_surfaces_heatmap(self):
         gaze_counts_per_surf = []
         for gaze in self.gaze_on_surf_buffer:
-            gaze = list(itertools.chain.from_iterable(gaze))
-            gaze = [g for g in gaze if g["on_surf"]]
-            gaze_counts_per_surf.append(len(gaze))
+            gaze_counts_per_surf.append(int(gaze.on_surf.sum()))
 
         if gaze_counts_per_surf:
             max_count = max(gaze_counts_per_surf)
@@ -509,6 +603,7 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
         except AttributeError:
             pass
         self.surfaces[-1].on_surface_change = self.on_surface_change
+        self.surfaces[-1].location_cache_loader = self._load_location_cache
         self._set_timeline_refresh_needed()
 
     def remove_surface(self, surface):
@@ -585,9 +680,71 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
 
     def on_surface_change(self, surface):
         self.save_surface_definitions_to_file()
+        self._save_location_caches()
         self._heatmap_update_requests.add(surface)
         self._debounced_fill_gaze_on_surf_buffer()
 
+    def _location_cache_key(self, surface):
+        """
+        Identifies the locations of a surface by its definition and everything that
+        influences the marker cache. Returns None if the surface is not defined yet.
+        """
+        if not surface.defined:
+            return None
+        marker_type = self.marker_detector.marker_detector_mode.marker_type
+        if marker_type == MarkerType.SQUARE_MARKER:
+            marker_min_perimeter = self.marker_detector.marker_min_perimeter
+        else:
+            marker_min_perimeter = None
+        params = self._cache_relevant_params_from_controller()
+        camera_model = self.camera_model
+        key_data = (
+            self._location_cache_store.version,
+            self.MARKER_CACHE_VERSION,
+            params.mode.as_tuple(),
+            params.inverted_markers,
+            params.quad_decimate,
+            params.sharpening,
+            marker_min_perimeter,
+            tuple(camera_model.resolution),
+            camera_model.K.tolist(),
+            camera_model.D.tolist(),
+            len(self.g_pool.timestamps),
+            [
+                sorted(
+                    (str(uid), np.asarray(aggregate.verts_uv).tolist())
+                    for uid, aggregate in registered_markers.items()
+                )
+                for registered_markers in (
+                    surface.registered_markers_undist,
+                    surface.registered_markers_dist,
+                )
+            ],
+        )
+        return hashlib.sha1(repr(key_data).encode()).hexdigest()
+
+    def _load_location_cache(self, surface):
+        key = self._location_cache_key(surface)
+        if key is None:
+            return None
+        return self._location_cache_store.load(key, len(self.g_pool.timestamps))
+
+    def _save_location_caches(self):
+        used_keys = []
+        for surface in self.surfaces:
+            key = self._location_cache_key(surface)
+            if key is None:
+                continue
+            used_keys.append(key)
+            location_cache = surface.location_cache
+            if (
+                location_cache is not None
+                and surface.location_cache_filler is None
+                and location_cache.complete
+            ):
+                self._location_cache_store.save(key, location_cache)
+        self._location_cache_store.remove_unused(used_keys)
+
     def _debounced_fill_gaze_on_surf_buffer(self):
         self.notify_all(
             {
@@ -602,6 +759,11 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
         self.timeline = None
         self.glfont = None
 
+    def get_init_dict(self):
+        init_dict = super().get_init_dict()
+        init_dict["marker_detection_workers"] = self.marker_detection_workers
+        return init_dict
+
     def cleanup(self):
         super().cleanup()
         self._save_marker_cache()
@@ -611,16 +773,11 @@ class Surface_Tracker_Offline(Observable, Surface_Tracker, Plugin):
             self.export_proxies.remove(proxy)
 
     def _save_marker_cache(self):
-        marker_cache_file = file_methods.Persistent_Dict(
-            os.path.join(self.g_pool.rec_dir, "square_marker_cache")
-        )
-        marker_cache_file["marker_cache_unfiltered"] = list(
-            self.marker_cache_unfiltered
+        # Only append frames that were detected since the last save
+        if not self._unsaved_marker_cache_indices:
+            return
+        self._marker_cache_store.append(
+            (frame_index, self.marker_cache_unfiltered[frame_index])
+            for frame_index in self._unsaved_marker_cache_indices
         )
-        marker_cache_file["version"] = self.MARKER_CACHE_VERSION
-
-        current_config = self._cache_relevant_params_from_controller()
-        marker_cache_file["inverted_markers"] = current_config.inverted_markers
-        marker_cache_file["quad_decimate"] = current_config.quad_decimate
-        marker_cache_file["sharpening"] = current_config.sharpening
-        marker_cache_file.save()
+        self._unsaved_marker_cache_indices = []
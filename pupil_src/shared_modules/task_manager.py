@@ -189,7 +189,9 @@ class ManagedTask:
     Create an instance of this and add it to a task manager via add_task()
     """
 
-    def __init__(self, task, args, heading, min_progress, max_progress):
+    def __init__(
+        self, task, args, heading, min_progress, max_progress, preceding_task=None
+    ):
         """
         :param task: function that will be executed in a new process.
             The function needs to yield tuples (status, progress) where status
@@ -198,6 +200,11 @@ class ManagedTask:
         :param heading: Task description shown in the UI
         :param min_progress: minimum progress value your task will yield
         :param max_progress: maximum progress value your task will yield
+        :param preceding_task: optional tasklib task that is started instead of
+            "task", e.g. a group of tasklib.background.create_group(). "task" is
+            started once it completed. Its progress from 0.0 to 1.0 is shown in the
+            range of min_progress and max_progress, status strings it yields are
+            shown as status.
         """
         assert min_progress < max_progress
         self.task = task
@@ -211,17 +218,25 @@ class ManagedTask:
         self.ui = TaskUI(self)
         self._canceled = False
 
+        self.preceding_task = preceding_task
+        self._preceding_exception = None
+        if preceding_task is not None:
+            preceding_task.add_observer("on_yield", self._on_preceding_task_yield)
+            preceding_task.add_observer(
+                "on_exception", self._on_preceding_task_exception
+            )
+
     @property
     def queued(self):
+        if self.preceding_task is not None and self.preceding_task.started:
+            return False
         return self.task_proxy is None
 
     @property
     def running(self):
-        return (
-            self.task_proxy is not None
-            and not self.task_proxy.completed
-            and not self.task_proxy.canceled
-        )
+        if self.task_proxy is None:
+            return not self.queued and not self.canceled
+        return not self.task_proxy.completed and not self.task_proxy.canceled
 
     @property
     def completed(self):
@@ -232,7 +247,12 @@ class ManagedTask:
         # a task can be canceled by canceling the corresponding process or by
         # "canceling" a completed or queued task (in these cases there is no process!)
         process_canceled = self.task_proxy is not None and self.task_proxy.canceled
-        return self._canceled or process_canceled
+        preceding_task_canceled = (
+            self.preceding_task is not None
+            and self.preceding_task.canceled_or_killed
+            and self._preceding_exception is None
+        )
+        return self._canceled or process_canceled or preceding_task_canceled
 
     @property
     def progress_as_fraction(self):
@@ -241,20 +261,51 @@ class ManagedTask:
         )
 
     def start(self):
-        assert self.task_proxy is None
+        assert self.queued
+        if self.preceding_task is not None:
+            self.preceding_task.start()
+        else:
+            self._start_task_proxy()
+
+    def _start_task_proxy(self):
         self.task_proxy = bh.IPC_Logging_Task_Proxy(
             self.heading, self.task, args=self.args
         )
 
     def cancel(self):
         self._canceled = True
+        if self.preceding_task is not None and self.preceding_task.running:
+            self.preceding_task.kill(grace_period=1)
         if self.task_proxy is not None:
             self.task_proxy.cancel()
         self.status = "Task Canceled"
 
     def most_recent_result_or_none(self):
         assert self.running
+        if self.task_proxy is None:
+            return self._update_preceding_task()
         result = None
         for result in self.task_proxy.fetch():
             pass
         return result
+
+    def _update_preceding_task(self):
+        self.preceding_task.update()
+        if self._preceding_exception is not None:
+            # raise in the foreground like Task_Proxy does, the task counts as
+            # canceled afterwards
+            exception, self._preceding_exception = self._preceding_exception, None
+            raise exception
+        if self.preceding_task.completed:
+            self._start_task_proxy()
+        progress = self.min_progress + self.preceding_task.progress * (
+            self.max_progress - self.min_progress
+        )
+        return self.status, progress
+
+    def _on_preceding_task_yield(self, result):
+        if isinstance(result, str):
+            self.status = result
+
+    def _on_preceding_task_exception(self, exception):
+        self._preceding_exception = exception
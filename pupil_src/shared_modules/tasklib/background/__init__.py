@@ -9,4 +9,4 @@ See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
 
-from tasklib.background.create import create
+from tasklib.background.create import create, create_group
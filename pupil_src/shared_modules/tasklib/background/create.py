@@ -13,6 +13,7 @@ import inspect
 
 from tasklib.background.task import BackgroundGeneratorFunction
 from tasklib.background.task import BackgroundRoutine
+from tasklib.background.group import BackgroundGeneratorFunctionGroup
 from tasklib.background.patches import IPCLoggingPatch, KeyboardInterruptHandlerPatch
 
 
@@ -23,6 +24,8 @@ def create(
     args=None,
     kwargs=None,
     patches=None,
+    shared_buffer_size=None,
+    worker_pool=None,
 ):
     """
     Creates the right background task for your type of task.
@@ -39,6 +42,13 @@ def create(
         args = ()
     if kwargs is None:
         kwargs = {}
+    if worker_pool is not None:
+        if not inspect.isgeneratorfunction(routine_or_generator_function):
+            raise TypeError("Only generator functions can run in a worker pool!")
+        # patches and shared buffers are set up once per worker by the pool
+        return worker_pool.create(
+            name, routine_or_generator_function, pass_shared_memory, args, kwargs
+        )
     if patches is None:
         patches = [
             IPCLoggingPatch(),
@@ -53,6 +63,7 @@ def create(
             args,
             kwargs,
             patches,
+            shared_buffer_size,
         )
     elif inspect.isroutine(routine_or_generator_function):
         return BackgroundRoutine(
@@ -69,3 +80,45 @@ def create(
             "routine (function, method, lambda) or generator "
             "function!".format(routine_or_generator_function)
         )
+
+
+def create_group(
+    name,
+    generator_function,
+    args_per_task,
+    pass_shared_memory=False,
+    kwargs=None,
+    patches=None,
+    weights=None,
+    shared_buffer_size=None,
+    worker_pool=None,
+):
+    """
+    Creates a task that runs the generator function once per entry in
+    args_per_task, each in its own background process.
+
+    Normally, you would not use this directly, but use a PluginTaskManager and the
+    create_background_task_group() method there.
+    """
+    if not inspect.isgeneratorfunction(generator_function):
+        raise TypeError(
+            "Cannot create background task group from {}. It must be a "
+            "generator function!".format(generator_function)
+        )
+    num_tasks = len(args_per_task)
+    subtasks = [
+        create(
+            "{} {}/{}".format(name, task_idx + 1, num_tasks),
+            generator_function,
+            pass_shared_memory,
+            args,
+            # every subtask gets its own kwargs, shared memory is added to them
+            dict(kwargs or {}),
+            patches,
+            # every subtask gets its own ring buffer
+            shared_buffer_size,
+            worker_pool,
+        )
+        for task_idx, args in enumerate(args_per_task)
+    ]
+    return BackgroundGeneratorFunctionGroup(subtasks, weights)
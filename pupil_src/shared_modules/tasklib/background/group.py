@@ -0,0 +1,109 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import collections
+import functools
+
+from tasklib.interface import TaskInterface
+
+
+class BackgroundGeneratorFunctionGroup(TaskInterface):
+    """
+    Runs a generator function in several background processes at once, e.g. one
+    per chunk of a recording, and behaves like a single task.
+
+    Results are yielded in the order of the subtasks: all results of the first
+    subtask, then all results of the second one, and so on. Results of subtasks that
+    are ahead are buffered until all previous subtasks completed.
+
+    Subtasks are background tasks themselves and can therefore not be started from
+    within another background task. Create the group in the foreground instead.
+    """
+
+    def __init__(self, subtasks, weights=None):
+        super().__init__()
+        if not subtasks:
+            raise ValueError("A task group needs at least one subtask!")
+        self._subtasks = list(subtasks)
+        self._weights = list(weights) if weights is not None else [1] * len(subtasks)
+        self._buffers = [collections.deque() for _ in self._subtasks]
+        self._next_subtask_idx = 0
+        self._is_canceling = False
+
+        for subtask_idx, subtask in enumerate(self._subtasks):
+            subtask.add_observer(
+                "on_yield", functools.partial(self._on_subtask_yield, subtask_idx)
+            )
+            subtask.add_observer("on_exception", self._on_subtask_exception)
+
+    @property
+    def progress(self):
+        progress = sum(
+            weight * (1.0 if subtask.completed else subtask.progress)
+            for subtask, weight in zip(self._subtasks, self._weights)
+        )
+        return progress / sum(self._weights)
+
+    def start(self):
+        super().start()
+        for subtask in self._subtasks:
+            subtask.start()
+
+    def cancel_gracefully(self):
+        super().cancel_gracefully()
+        self._is_canceling = True
+        for subtask in self._subtasks:
+            if subtask.running:
+                subtask.cancel_gracefully()
+
+    def kill(self, grace_period):
+        super().kill(grace_period)
+        self._kill_running_subtasks(grace_period)
+        self.on_canceled_or_killed()
+
+    def update(self):
+        super().update()
+        for subtask in self._subtasks:
+            if subtask.running:
+                subtask.update()
+            if self.ended:
+                # a subtask raised an exception
+                return
+
+        if self._is_canceling:
+            if not any(subtask.running for subtask in self._subtasks):
+                self.on_canceled_or_killed()
+            return
+
+        while self._next_subtask_idx < len(self._subtasks):
+            buffer = self._buffers[self._next_subtask_idx]
+            while buffer:
+                self.on_yield(buffer.popleft())
+            if not self._subtasks[self._next_subtask_idx].completed:
+                break
+            self._next_subtask_idx += 1
+        else:
+            self.on_completed(None)
+
+    def _on_subtask_yield(self, subtask_idx, datum):
+        if subtask_idx == self._next_subtask_idx and not self._buffers[subtask_idx]:
+            self.on_yield(datum)
+        else:
+            self._buffers[subtask_idx].append(datum)
+
+    def _on_subtask_exception(self, exception):
+        self._kill_running_subtasks(grace_period=None)
+        self.on_exception(exception)
+
+    def _kill_running_subtasks(self, grace_period):
+        for subtask in self._subtasks:
+            if subtask.running:
+                subtask.kill(grace_period)
@@ -0,0 +1,375 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import collections
+import importlib
+import logging
+import multiprocessing as mp
+import time
+
+from tasklib.background.patches import IPCLoggingPatch, KeyboardInterruptHandlerPatch
+from tasklib.background.ring_buffer import SharedRingBuffer
+from tasklib.background.shared_memory import SharedMemory
+from tasklib.background.task import (
+    BackgroundTask,
+    _TaskCanceledSignal,
+    _TaskCompletedSignal,
+    _TaskExceptionSignal,
+    send_generator_results,
+)
+from tasklib.interface import TaskInterface
+
+logger = logging.getLogger(__name__)
+
+# Modules that most background tasks of Player need
+DEFAULT_PRELOAD_MODULES = (
+    "numpy",
+    "cv2",
+    "msgpack",
+    "file_methods",
+    "player_methods",
+    "methods",
+    "video_capture",
+)
+
+# Size of the ring buffer of each worker of the shared pool, see SharedRingBuffer
+SHARED_BUFFER_SIZE = 16 * 1024 * 1024
+
+_shared_pool = None
+
+
+def shared_pool():
+    """Returns the worker pool that is shared by all plugins, started on first use"""
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = WorkerPool(
+            preload_modules=DEFAULT_PRELOAD_MODULES,
+            shared_buffer_size=SHARED_BUFFER_SIZE,
+        )
+    return _shared_pool
+
+
+def shutdown_shared_pool():
+    global _shared_pool
+    if _shared_pool is not None:
+        _shared_pool.shutdown()
+        _shared_pool = None
+
+
+class WorkerPool:
+    """
+    Persistent background processes that run generator functions one after another.
+
+    Starting a process and importing the modules a task needs can take hundreds of
+    milliseconds, which dominates tasks that are restarted often, e.g. when a slider
+    changes. Workers of a pool are started once, import `preload_modules` right
+    away and then wait for tasks. Tasks are queued until a worker is free.
+
+    Generator functions and their arguments are sent to the workers through pipes.
+    They need to be picklable, e.g. functions defined at module level. Patches are
+    applied once per worker.
+
+    Killing a task does not block. The worker is asked to stop the task and is only
+    handed the next task after it did so, see update(). Workers that do not stop
+    within the grace period of kill(), or within `stop_timeout` seconds if no grace
+    period was given, are terminated and replaced.
+    """
+
+    def __init__(
+        self,
+        num_workers=None,
+        preload_modules=(),
+        patches=None,
+        shared_buffer_size=None,
+        stop_timeout=5.0,
+    ):
+        if num_workers is None:
+            # Leave one core for the foreground process
+            num_workers = max(mp.cpu_count() - 1, 1)
+        if patches is None:
+            patches = [IPCLoggingPatch(), KeyboardInterruptHandlerPatch()]
+        self._worker_kwargs = {
+            "preload_modules": tuple(preload_modules),
+            "patches": patches,
+            "shared_buffer_size": shared_buffer_size,
+        }
+        self._workers = [
+            _Worker(f"Worker {idx + 1}/{num_workers}", **self._worker_kwargs)
+            for idx in range(num_workers)
+        ]
+        self._queue = collections.deque()
+        self._stop_timeout = stop_timeout
+
+    @property
+    def num_workers(self):
+        return len(self._workers)
+
+    def create(
+        self, name, generator_function, pass_shared_memory=False, args=None, kwargs=None
+    ):
+        """
+        Creates a task that runs in this pool, see tasklib.background.create()
+
+        Only generator functions are supported.
+        """
+        return PooledBackgroundGeneratorFunction(
+            self, name, generator_function, pass_shared_memory, args, kwargs
+        )
+
+    def shutdown(self, grace_period=1.0):
+        """Stops all workers, running tasks are killed"""
+        for task in list(self._queue):
+            task.kill(grace_period=None)
+        for worker in self._workers:
+            if worker.task is not None:
+                worker.task.kill(grace_period=None)
+        for worker in self._workers:
+            worker.stop(grace_period)
+        self._workers = []
+
+    def update(self):
+        """Reaps workers of killed tasks and starts queued tasks on free workers"""
+        for worker in list(self._workers):
+            if worker.stop_deadline is None:
+                continue
+            try:
+                has_stopped = worker.receive_end_signal()
+            except EOFError:
+                # the worker died while stopping the task
+                self._replace(worker)
+                continue
+            if has_stopped:
+                worker.stop_deadline = None
+            elif time.monotonic() > worker.stop_deadline:
+                # e.g. the task does not yield often enough to notice the request
+                self._replace(worker)
+        self._dispatch()
+
+    def _submit(self, task):
+        self._queue.append(task)
+        self.update()
+
+    def _withdraw(self, task):
+        self._queue.remove(task)
+
+    def _dispatch(self):
+        for worker in self._workers:
+            if not self._queue:
+                return
+            if worker.is_free:
+                worker.run(self._queue.popleft())
+
+    def _release(self, worker, is_broken=False):
+        worker.task = None
+        if is_broken:
+            self._replace(worker)
+        self._dispatch()
+
+    def _release_after_stop(self, worker, grace_period):
+        """Frees the worker of a killed task as soon as the task stopped"""
+        worker.task = None
+        if grace_period is None:
+            grace_period = self._stop_timeout
+        worker.stop_deadline = time.monotonic() + grace_period
+
+    def _replace(self, worker):
+        worker.stop(grace_period=None)
+        worker_idx = self._workers.index(worker)
+        self._workers[worker_idx] = _Worker(worker.name, **self._worker_kwargs)
+
+
+class PooledBackgroundGeneratorFunction(BackgroundTask):
+    """
+    Background task that runs in a worker of a WorkerPool instead of its own
+    process. Behaves like a BackgroundGeneratorFunction, but waits for a free worker
+    after it was started.
+    """
+
+    def __init__(
+        self, pool, name, generator_function, pass_shared_memory, args, kwargs
+    ):
+        TaskInterface.__init__(self)
+        self.name = name
+        self._pool = pool
+        self._job = (
+            generator_function,
+            tuple(args or ()),
+            dict(kwargs or {}),
+            pass_shared_memory,
+        )
+        self._worker = None
+        # replaced by the ones of the worker while running
+        self._shared_memory = SharedMemory()
+        self._ring_buffer = None
+        self.pipe_recv = None
+
+    def get_process(self, *args, **kwargs):
+        raise NotImplementedError("Pooled tasks run in a worker of their pool")
+
+    @property
+    def is_queued(self):
+        return self.running and self._worker is None
+
+    def start(self):
+        TaskInterface.start(self)
+        self._pool._submit(self)
+
+    def cancel_gracefully(self):
+        TaskInterface.cancel_gracefully(self)
+        if self.is_queued:
+            self._pool._withdraw(self)
+            self.on_canceled_or_killed()
+        else:
+            self._ask_process_to_shut_down()
+
+    def kill(self, grace_period):
+        """
+        Ends the task right away, without waiting for its worker.
+
+        The worker stops the task in the background and is freed for the next task
+        once it did so. It is replaced if it does not stop within `grace_period`.
+        """
+        TaskInterface.kill(self, grace_period)
+        if self.is_queued:
+            self._pool._withdraw(self)
+        else:
+            self._ask_process_to_shut_down()
+            self._pool._release_after_stop(self._unassign(), grace_period)
+        self.on_canceled_or_killed()
+
+    def update(self):
+        TaskInterface.update(self)
+        if self._worker is None:
+            self._pool.update()
+            return
+        try:
+            super().update()
+        except EOFError:
+            # the worker died, e.g. due to a crash in an extension module
+            self._pool._release(self._unassign(), is_broken=True)
+            self.on_exception(RuntimeError(f"Worker of task '{self.name}' died"))
+            return
+        if self.ended:
+            self._pool._release(self._unassign())
+
+    def _assign(self, worker):
+        self._worker = worker
+        self._shared_memory = worker.shared_memory
+        self._ring_buffer = worker.ring_buffer
+        self.pipe_recv = worker.pipe_recv
+
+    def _unassign(self):
+        """Detaches the task from its worker and returns the worker"""
+        worker = self._worker
+        self._worker = None
+        # keep the last progress, the shared memory is reused by the next task
+        self._shared_memory = SharedMemory()
+        self._shared_memory.progress = worker.shared_memory.progress
+        return worker
+
+
+class _Worker:
+    def __init__(self, name, preload_modules, patches, shared_buffer_size):
+        self.name = name
+        self.task = None
+        # set while the worker stops a killed task, see WorkerPool.update()
+        self.stop_deadline = None
+        self.shared_memory = SharedMemory()
+        self.ring_buffer = None
+        if shared_buffer_size:
+            self.ring_buffer = SharedRingBuffer(shared_buffer_size)
+
+        job_recv, self.job_send = mp.Pipe(duplex=False)
+        self.pipe_recv, pipe_send = mp.Pipe(duplex=False)
+        self.process = mp.Process(
+            target=_worker_loop,
+            name=name,
+            kwargs={
+                "job_recv": job_recv,
+                "pipe_send": pipe_send,
+                "shared_memory": self.shared_memory,
+                "ring_buffer": self.ring_buffer,
+                "preload_modules": preload_modules,
+                "patches": patches,
+            },
+        )
+        self.process.daemon = True
+        self.process.start()
+
+    @property
+    def is_free(self):
+        return self.task is None and self.stop_deadline is None
+
+    def receive_end_signal(self):
+        """Discards results of a killed task, returns True once the task ended"""
+        end_signals = (_TaskCanceledSignal, _TaskCompletedSignal, _TaskExceptionSignal)
+        while self.pipe_recv.poll(0):
+            signal = self.pipe_recv.recv()
+            if isinstance(signal, end_signals):
+                return True
+            elif self.ring_buffer is not None:
+                self.ring_buffer.discard(signal.datum)
+        return False
+
+    def run(self, task):
+        self.shared_memory.should_terminate_flag = False
+        self.shared_memory.progress = 0.0
+        try:
+            self.job_send.send(task._job)
+        except Exception as e:
+            # e.g. the generator function can not be pickled
+            task.on_exception(e)
+            return
+        self.task = task
+        task._assign(self)
+
+    def stop(self, grace_period):
+        try:
+            self.job_send.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        if grace_period:
+            self.process.join(grace_period)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def _worker_loop(
+    job_recv, pipe_send, shared_memory, ring_buffer, preload_modules, patches
+):
+    """Executed in background, runs one task after another"""
+    for patch in patches:
+        patch.apply()
+    for module_name in preload_modules:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            logger.debug(f"Worker could not preload module '{module_name}'")
+
+    while True:
+        try:
+            job = job_recv.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        generator_function, args, kwargs, pass_shared_memory = job
+        if pass_shared_memory:
+            kwargs["shared_memory"] = shared_memory
+        send_generator_results(
+            pipe_send,
+            generator_function,
+            args,
+            kwargs,
+            (),
+            shared_memory,
+            ring_buffer,
+        )
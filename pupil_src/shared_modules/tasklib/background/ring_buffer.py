@@ -0,0 +1,140 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import multiprocessing as mp
+import time
+from collections import namedtuple
+from ctypes import c_uint8, c_uint64
+
+import numpy as np
+
+_ArrayBlock = namedtuple("_ArrayBlock", ["offset", "end", "dtype", "shape"])
+
+
+class SharedRingBuffer:
+    """
+    Transports NumPy arrays from a background process to the foreground through
+    shared memory instead of pickling them.
+
+    The background process copies arrays into the buffer with pack() and only sends
+    small block descriptors through the pipe. The foreground copies the arrays out
+    of the buffer with unpack() and thereby releases their space. There must be
+    exactly one writing and one reading process, and blocks need to be unpacked in
+    the order in which they were packed.
+
+    Arrays are transported if a datum is an array itself or a tuple or dict that
+    contains arrays, also nested. Lists are treated like any other object, since
+    they usually hold many small data. Arrays that are too small to benefit from the
+    buffer or too large to fit into it are pickled as before.
+    """
+
+    # Smaller arrays are pickled faster than they are synchronized
+    min_array_size = 4096
+    _alignment = 64
+
+    def __init__(self, capacity, context=mp):
+        self.capacity = capacity - capacity % self._alignment
+        self._buffer = context.RawArray(c_uint8, self.capacity)
+        self._read_total = context.Value(c_uint64, 0)
+        # number of bytes written since creation, only used by the writing process
+        self._write_total = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_array", None)
+        return state
+
+    @property
+    def array(self) -> np.ndarray:
+        """The shared memory as array of bytes"""
+        if "_array" not in self.__dict__:
+            self._array = np.frombuffer(self._buffer, dtype=np.uint8)
+        return self._array
+
+    def pack(self, datum, should_stop=None):
+        """
+        Copies the arrays of datum into the buffer and returns datum with the arrays
+        replaced by block descriptors.
+
+        Waits for the reading process if the buffer is full. If `should_stop`
+        returns True while waiting, the array is returned unchanged.
+        """
+        if isinstance(datum, np.ndarray):
+            return self._write(datum, should_stop)
+        elif type(datum) is tuple:
+            return tuple(self.pack(value, should_stop) for value in datum)
+        elif type(datum) is dict:
+            return {key: self.pack(value, should_stop) for key, value in datum.items()}
+        return datum
+
+    def unpack(self, datum):
+        """Returns packed datum with its arrays copied out of the buffer"""
+        if isinstance(datum, _ArrayBlock):
+            return self._read(datum)
+        elif type(datum) is tuple:
+            return tuple(self.unpack(value) for value in datum)
+        elif type(datum) is dict:
+            return {key: self.unpack(value) for key, value in datum.items()}
+        return datum
+
+    def discard(self, datum):
+        """Releases the space of a packed datum without reading its arrays"""
+        ends = [block.end for block in _blocks(datum)]
+        if ends:
+            self._read_total.value = max(ends)
+
+    def _write(self, array, should_stop):
+        if array.dtype.hasobject or not (
+            self.min_array_size <= array.nbytes <= self.capacity
+        ):
+            return array
+
+        start = self._write_total
+        offset = start % self.capacity
+        if offset + array.nbytes > self.capacity:
+            # blocks are contiguous, skip the remainder at the end of the buffer
+            start += self.capacity - offset
+            offset = 0
+        aligned_size = -(-array.nbytes // self._alignment) * self._alignment
+        end = start + aligned_size
+
+        while not self._is_free(end):
+            if should_stop is not None and should_stop():
+                return array
+            time.sleep(0.001)
+
+        block = self.array[offset : offset + array.nbytes]
+        block[:] = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+        self._write_total = end
+        return _ArrayBlock(offset, end, array.dtype, array.shape)
+
+    def _is_free(self, end):
+        read_total = self._read_total.value
+        # The space up to `end` was used in the previous round through the buffer
+        # and must have been read, unless all written data was read already.
+        return end - read_total <= self.capacity or read_total == self._write_total
+
+    def _read(self, block):
+        nbytes = block.dtype.itemsize * int(np.prod(block.shape, dtype=np.int64))
+        array = self.array[block.offset : block.offset + nbytes].copy()
+        self._read_total.value = block.end
+        return array.view(block.dtype).reshape(block.shape)
+
+
+def _blocks(datum):
+    if isinstance(datum, _ArrayBlock):
+        yield datum
+    elif type(datum) is tuple:
+        for value in datum:
+            yield from _blocks(value)
+    elif type(datum) is dict:
+        for value in datum.values():
+            yield from _blocks(value)
@@ -17,6 +17,7 @@ from collections import namedtuple
 from tasklib.interface import TaskInterface
 from tasklib.background.shared_memory import SharedMemory
 from tasklib.background.patches import Patch
+from tasklib.background.ring_buffer import SharedRingBuffer
 
 _TaskYieldSignal = namedtuple("_TaskYieldSignal", "datum")
 _TaskCompletedSignal = namedtuple("_TaskCompletedSignal", "return_value")
@@ -26,13 +27,23 @@ _TaskExceptionSignal = namedtuple("_TaskExceptionSignal", ["exception", "traceba
 
 class BackgroundTask(TaskInterface, metaclass=abc.ABCMeta):
     def __init__(
-        self, name, generator_function, pass_shared_memory, args, kwargs, patches
+        self,
+        name,
+        generator_function,
+        pass_shared_memory,
+        args,
+        kwargs,
+        patches,
+        shared_buffer_size=None,
     ):
         super().__init__()
 
         self._shared_memory = SharedMemory()
         if pass_shared_memory:
             kwargs["shared_memory"] = self._shared_memory
+        self._ring_buffer = None
+        if shared_buffer_size:
+            self._ring_buffer = SharedRingBuffer(shared_buffer_size)
 
         pipe_recv, pipe_send = mp.Pipe(duplex=False)
         self.process = self.get_process(
@@ -99,7 +110,10 @@ class BackgroundTask(TaskInterface, metaclass=abc.ABCMeta):
             self.on_exception(signal.exception)
             return False
         elif isinstance(signal, _TaskYieldSignal):
-            self.on_yield(signal.datum)
+            datum = signal.datum
+            if self._ring_buffer is not None:
+                datum = self._ring_buffer.unpack(datum)
+            self.on_yield(datum)
             return True
         else:
             raise ValueError(
@@ -113,6 +127,8 @@ class BackgroundTask(TaskInterface, metaclass=abc.ABCMeta):
             self.on_canceled_or_killed()
             return False
         elif isinstance(signal, _TaskYieldSignal):
+            if self._ring_buffer is not None:
+                self._ring_buffer.discard(signal.datum)
             return True
         else:
             raise ValueError(
@@ -133,22 +149,48 @@ class BackgroundGeneratorFunction(BackgroundTask):
             "args": args,
             "kwargs": kwargs,
             "patches": patches,
+            "ring_buffer": self._ring_buffer,
         }
 
         return mp.Process(target=_generator_wrapper, name=name, kwargs=wrapper_kwargs)
 
 
 def _generator_wrapper(
-    pipe_send, generator_function, args, kwargs, patches, shared_memory
+    pipe_send, generator_function, args, kwargs, patches, shared_memory, ring_buffer
 ):
     """Executed in background, pipes results to foreground"""
+    try:
+        send_generator_results(
+            pipe_send,
+            generator_function,
+            args,
+            kwargs,
+            patches,
+            shared_memory,
+            ring_buffer,
+        )
+    finally:
+        pipe_send.close()
+
+
+def send_generator_results(
+    pipe_send, generator_function, args, kwargs, patches, shared_memory, ring_buffer
+):
+    """Runs generator_function and sends its results as signals to the foreground"""
+
+    def should_terminate():
+        return shared_memory.should_terminate_flag
+
     try:
         for patch in patches:
             patch.apply()
         for datum in generator_function(*args, **kwargs):
             if shared_memory.should_terminate_flag:
                 pipe_send.send(_TaskCanceledSignal())
-                return  # will also trigger "finally"
+                return
+            if ring_buffer is not None:
+                # only block descriptors of arrays are sent through the pipe
+                datum = ring_buffer.pack(datum, should_stop=should_terminate)
             pipe_send.send(_TaskYieldSignal(datum))
     except Exception as e:
         import traceback
@@ -156,8 +198,6 @@ def _generator_wrapper(
         pipe_send.send(_TaskExceptionSignal(e, traceback.format_exc()))
     else:
         pipe_send.send(_TaskCompletedSignal(return_value=None))
-    finally:
-        pipe_send.close()
 
 
 class BackgroundRoutine(BackgroundTask):
@@ -210,6 +250,7 @@ class TypedBackgroundGeneratorFunction(
         kwargs: typing.Mapping[str, typing.Any] = {},
         pass_shared_memory: bool = False,
         patches: typing.Iterable[typing.Type[Patch]] = tuple(),
+        shared_buffer_size: typing.Optional[int] = None,
     ):
         super().__init__(
             name=name,
@@ -218,6 +259,7 @@ class TypedBackgroundGeneratorFunction(
             args=args,
             kwargs=kwargs,
             patches=patches,
+            shared_buffer_size=shared_buffer_size,
         )
 
     def add_observers(
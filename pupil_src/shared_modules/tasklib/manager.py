@@ -46,6 +46,8 @@ class PluginTaskManager:
         args=None,
         kwargs=None,
         patches=None,
+        shared_buffer_size=None,
+        worker_pool=None,
     ):
         """
         Creates a managed background task.
@@ -73,6 +75,14 @@ class PluginTaskManager:
                 something in the environment of the new process (see
                 tasklib.background.patches.py).
                 Per default, the IPC logging is patched.
+            shared_buffer_size (int): If given, NumPy arrays yielded by a generator
+                function are transported through a shared memory ring buffer of
+                this size in bytes instead of being pickled (see
+                tasklib.background.ring_buffer.py).
+            worker_pool (WorkerPool): If given, the task runs in a persistent worker
+                of the pool instead of a new process (see
+                tasklib.background.pool.py). Patches and shared buffers are then
+                configured by the pool.
 
         Returns:
             A new task with base class TaskInterface.
@@ -85,6 +95,44 @@ class PluginTaskManager:
             args,
             kwargs,
             patches,
+            shared_buffer_size,
+            worker_pool,
+        )
+        self._tasks.append(task)
+        return task
+
+    def create_background_task_group(
+        self,
+        name,
+        generator_function,
+        args_per_task,
+        pass_shared_memory=False,
+        kwargs=None,
+        patches=None,
+        weights=None,
+        shared_buffer_size=None,
+        worker_pool=None,
+    ):
+        """
+        Creates a managed task that runs a generator function in several background
+        processes, one per entry in args_per_task.
+
+        The returned task behaves like a single task created by
+        create_background_task(). Results of the processes are yielded in the order
+        of args_per_task and the progress is averaged over all processes, weighted by
+        `weights` if given.
+        See create_background_task() for the other parameters.
+        """
+        task = tasklib.background.create_group(
+            name,
+            generator_function,
+            args_per_task,
+            pass_shared_memory,
+            kwargs,
+            patches,
+            weights,
+            shared_buffer_size,
+            worker_pool,
         )
         self._tasks.append(task)
         return task
@@ -26,6 +26,7 @@ from camera_models import Camera_Model
 from pupil_recording import PupilRecording
 
 from .base_backend import Base_Manager, Base_Source, EndofVideoError, Playback_Source
+from .prefetching_decoder import PrefetchingDecoder
 from .utils import VideoSet, InvalidContainerError
 
 logger = logging.getLogger(__name__)
@@ -206,6 +207,7 @@ class File_Source(Playback_Source, Base_Source):
         source_path (str): Path to source file
         loop (bool): loop video set if timing!="external"
         buffered_decoding (bool): use buffered decode
+        prefetch_decoding (bool): decode ahead of the playhead in a background thread
         fill_gaps (bool): fill gaps with static frames
         show_plugin_menu (bool): enable to show regular capture UI with source selection
     """
@@ -216,6 +218,7 @@ class File_Source(Playback_Source, Base_Source):
         source_path=None,
         loop=False,
         buffered_decoding=False,
+        prefetch_decoding=False,
         fill_gaps=False,
         show_plugin_menu=False,
         *args,
@@ -243,8 +246,14 @@ class File_Source(Playback_Source, Base_Source):
             # TODO: where does the fallback framerate of 1/20 come from?
             self._frame_rate = 20
         self.buffering = buffered_decoding
+        self.prefetching = prefetch_decoding
         # Load video split for first frame
         self.reset_video()
+        self._prefetcher = None
+        if self.prefetching and self.initialised:
+            self._prefetcher = PrefetchingDecoder(
+                self.videoset.lookup, self._open_decoder
+            )
         self._intrinsics = Camera_Model.from_file(rec, set_name, self.frame_size)
 
         self.show_plugin_menu = show_plugin_menu
@@ -302,13 +311,34 @@ class File_Source(Playback_Source, Base_Source):
         else:
             try:
                 container = self.videoset.get_container(container_index)
-                self.video_stream = self._get_streams(container, self.buffering)
+                # frames are decoded by the prefetcher, this stream is only kept for
+                # the frame size
+                should_buffer = self.buffering and not self.prefetching
+                self.video_stream = self._get_streams(container, should_buffer)
             except InvalidContainerError:
                 self.video_stream = BrokenStream()
 
         self.video_stream.seek(0)
         self.current_container_index = container_index
         self.frame_iterator = self.video_stream.get_frame_iterator()
+        # lookup index of the next frame of the frame iterator, None if unknown
+        self._decoder_frame_idx = self._first_frame_idx(container_index)
+
+    def _first_frame_idx(self, container_index):
+        if container_index < 0:
+            return None
+        frame_indices = np.flatnonzero(
+            self.videoset.lookup.container_idx == container_index
+        )
+        return int(frame_indices[0]) if frame_indices.size else None
+
+    def _open_decoder(self, container_index):
+        """Opens an independent decoder for the prefetcher"""
+        try:
+            container = self.videoset.get_container(container_index)
+        except InvalidContainerError:
+            return BrokenStream()
+        return self._get_streams(container, should_buffer=False)
 
     def _get_streams(self, container, should_buffer):
         """Get Video stream from containers."""
@@ -358,6 +388,7 @@ class File_Source(Playback_Source, Base_Source):
             source_path=self.source_path,
             loop=self.loop,
             buffered_decoding=self.buffering,
+            prefetch_decoding=self.prefetching,
             fill_gaps=self.fill_gaps,
             show_plugin_menu=self.show_plugin_menu,
         )
@@ -384,6 +415,9 @@ class File_Source(Playback_Source, Base_Source):
         if target_entry.container_idx == -1:
             return self._get_fake_frame_and_advance(target_entry)
 
+        if self._prefetcher is not None:
+            return self._get_prefetched_frame_and_advance(target_entry)
+
         if target_entry.container_idx != self.current_container_index:
             # Contained index changed, need to load other video split
             self._setup_video(target_entry.container_idx)
@@ -391,6 +425,7 @@ class File_Source(Playback_Source, Base_Source):
         # advance frame iterator until we hit the target frame
         for av_frame in self.frame_iterator:
             if not av_frame:
+                self._decoder_frame_idx = None
                 raise EndofVideoError
             if av_frame.pts == target_entry.pts:
                 break
@@ -412,10 +447,27 @@ class File_Source(Playback_Source, Base_Source):
                     raise EndofVideoError
                 self.target_frame_idx = pts_indices[0]
                 break
+        else:
+            # the frame iterator is exhausted without reaching the target frame
+            self._decoder_frame_idx = None
+            raise EndofVideoError
 
         # update indices, we know that we advanced until target_frame_index!
         self.current_frame_idx = self.target_frame_idx
         self.target_frame_idx += 1
+        self._decoder_frame_idx = self.target_frame_idx
+        return Frame(
+            timestamp=target_entry.timestamp,
+            av_frame=av_frame,
+            index=self.current_frame_idx,
+        )
+
+    def _get_prefetched_frame_and_advance(self, target_entry):
+        av_frame = self._prefetcher.get_frame(int(self.target_frame_idx))
+        if av_frame is None:
+            raise EndofVideoError
+        self.current_frame_idx = self.target_frame_idx
+        self.target_frame_idx += 1
         return Frame(
             timestamp=target_entry.timestamp,
             av_frame=av_frame,
@@ -496,7 +548,15 @@ class File_Source(Playback_Source, Base_Source):
         except IndexError:
             logger.warning("Seeking to invalid position!")
             return
-        if target_entry.container_idx > -1:
+        if self._prefetcher is not None:
+            # nearby frames are usually buffered already, the prefetcher only seeks
+            # the container if it needs to
+            self._prefetcher.seek(int(seek_pos))
+        elif self._is_reached_by_decoding(seek_pos):
+            # seeking would land on the same or an earlier keyframe, the frame
+            # iterator reaches the target frame without decoding more frames
+            pass
+        elif target_entry.container_idx > -1:
             if target_entry.container_idx != self.current_container_index:
                 self._setup_video(target_entry.container_idx)
             try:
@@ -505,14 +565,34 @@ class File_Source(Playback_Source, Base_Source):
                 self.video_stream.seek(int(target_entry.pts))
             except av.AVError as e:
                 raise FileSeekError() from e
+            # need to re-initialize frame_iterator at the new seek position
+            self.frame_iterator = self.video_stream.get_frame_iterator()
+            # seeking lands on the preceding keyframe
+            keyframe_idx = int(target_entry.keyframe_idx)
+            self._decoder_frame_idx = keyframe_idx if keyframe_idx > -1 else None
         else:
             # TODO: Why seek here? Might be inefficient.
             self.video_stream.seek(0)
-        # need to re-initialize frame_iterator at the new seek position
-        self.frame_iterator = self.video_stream.get_frame_iterator()
+            self.frame_iterator = self.video_stream.get_frame_iterator()
+            self._decoder_frame_idx = self._first_frame_idx(
+                self.current_container_index
+            )
         self.finished_sleep = 0
         self.target_frame_idx = seek_pos
 
+    def _is_reached_by_decoding(self, seek_pos):
+        """
+        Whether the frame iterator is positioned between the target frame and its
+        preceding keyframe, such that decoding forward is cheaper than seeking.
+        """
+        target_entry = self.videoset.lookup[seek_pos]
+        return (
+            self._decoder_frame_idx is not None
+            and target_entry.container_idx > -1
+            and target_entry.container_idx == self.current_container_index
+            and target_entry.keyframe_idx <= self._decoder_frame_idx <= seek_pos
+        )
+
     def on_notify(self, notification):
         super().on_notify(notification)
         if (
@@ -590,6 +670,8 @@ class File_Source(Playback_Source, Base_Source):
             self.video_stream.cleanup()
         except AttributeError:
             pass
+        if self._prefetcher is not None:
+            self._prefetcher.cleanup()
         super().cleanup()
 
     @property
@@ -0,0 +1,277 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import logging
+import threading
+import typing as T
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Upper bound of the memory used by decoded frames of one video set, e.g. about 85
+# frames of a 1080p world video.
+PREFETCH_BUFFER_SIZE = 256 * 1024 * 1024
+
+
+class FrameBuffer:
+    """
+    Decoded frames keyed by frame index, limited by the number of bytes they use.
+
+    If the buffer is full, the frames farthest away from the playhead are dropped
+    first. Frames behind the playhead count as twice as far away as frames ahead of
+    it, since they are only needed again when seeking back. The frame at the
+    playhead is never dropped. Not thread-safe.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self._frames = {}
+
+    def __contains__(self, frame_idx: int) -> bool:
+        return frame_idx in self._frames
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def get(self, frame_idx: int):
+        return self._frames[frame_idx][0]
+
+    def put(
+        self, frame_idx: int, frame, num_bytes: int, playhead: int, direction: int
+    ) -> bool:
+        """Stores a frame, returns False if it was dropped right away to make room"""
+        if frame_idx in self._frames:
+            return True
+        self._frames[frame_idx] = frame, num_bytes
+        self.num_bytes += num_bytes
+
+        def distance(idx):
+            distance = (idx - playhead) * direction
+            return distance if distance >= 0 else -2 * distance
+
+        while self.num_bytes > self.max_bytes and len(self._frames) > 1:
+            dropped_idx = max(self._frames, key=distance)
+            if dropped_idx == playhead:
+                break
+            self.num_bytes -= self._frames.pop(dropped_idx)[1]
+            if dropped_idx == frame_idx:
+                return False
+        return True
+
+    def clear(self):
+        self._frames.clear()
+        self.num_bytes = 0
+
+
+class PrefetchingDecoder:
+    """
+    Decodes the frames of a video set in a background thread ahead of the playhead.
+
+    Frames are requested by their index in the lookup table of the video set. The
+    playback direction is derived from the order of requests, such that scrubbing
+    backwards prefetches the preceding frames. Decoded frames are kept in a
+    FrameBuffer, which serves repeated and nearby requests without touching the
+    container again.
+
+    Containers can only be seeked to keyframes. If the decoding position lies
+    between a requested frame and its preceding keyframe, decoding continues instead
+    of seeking, since the seek would decode at least as many frames. Seeking back
+    decodes the whole group of pictures up to the requested frame and keeps all of
+    its frames for the following requests.
+
+    The thread stops after being idle for `idle_timeout` seconds and is restarted by
+    the next request.
+    """
+
+    # Number of frames that are decoded ahead of the playhead
+    prefetch_frames = 120
+    idle_timeout = 1.0
+
+    def __init__(
+        self,
+        lookup: np.recarray,
+        open_decoder: T.Callable[[int], T.Any],
+        buffer_size: int = PREFETCH_BUFFER_SIZE,
+    ):
+        """
+        lookup: Lookup table of a VideoSet, see VideoSet.build_lookup()
+        open_decoder: Returns a file_backend.Decoder for a container index
+        """
+        self._lookup = lookup
+        self._open_decoder = open_decoder
+        self._buffer = FrameBuffer(buffer_size)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._should_stop = False
+
+        # playhead state, written by the requesting thread
+        self._playhead = 0
+        self._direction = 1
+        self._playhead_version = 0
+        self._is_buffer_full = False
+        self._undecodable = set()
+
+        # decoding state, only used by the background thread
+        self._container_idx = None
+        self._decoder = None
+        self._frame_iterator = iter(())
+        self._frame_indices_by_pts = {}
+        # index of the frame that the frame iterator yields next, if known
+        self._next_decode_idx = None
+
+    def get_frame(self, frame_idx: int):
+        """Returns the decoded av frame or None if it can not be decoded"""
+        if not 0 <= frame_idx < len(self._lookup):
+            return None
+        if self._lookup.container_idx[frame_idx] < 0:
+            return None
+        with self._condition:
+            self._move_playhead(frame_idx)
+            while frame_idx not in self._buffer:
+                if frame_idx in self._undecodable or self._should_stop:
+                    return None
+                self._condition.wait()
+            return self._buffer.get(frame_idx)
+
+    def seek(self, frame_idx: int):
+        """Moves the playhead without waiting for the frame"""
+        with self._condition:
+            self._move_playhead(frame_idx)
+
+    def cleanup(self):
+        with self._condition:
+            self._should_stop = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=1.0)
+        if self._decoder is not None:
+            self._decoder.cleanup()
+            self._decoder = None
+        self._buffer.clear()
+
+    def _move_playhead(self, frame_idx):
+        if frame_idx != self._playhead:
+            self._direction = 1 if frame_idx > self._playhead else -1
+            self._playhead = frame_idx
+            self._playhead_version += 1
+            self._is_buffer_full = False
+        if self._thread is None and not self._should_stop:
+            self._thread = threading.Thread(
+                target=self._run, name=type(self).__name__, daemon=True
+            )
+            self._thread.start()
+        self._condition.notify_all()
+
+    def _next_frame_to_decode(self):
+        if self._is_buffer_full:
+            return None
+        for offset in range(self.prefetch_frames):
+            frame_idx = self._playhead + offset * self._direction
+            if not 0 <= frame_idx < len(self._lookup):
+                break
+            if (
+                self._lookup.container_idx[frame_idx] < 0
+                or frame_idx in self._buffer
+                or frame_idx in self._undecodable
+            ):
+                continue
+            return frame_idx
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                frame_idx = self._next_frame_to_decode()
+                if frame_idx is None and not self._should_stop:
+                    self._condition.wait(self.idle_timeout)
+                    frame_idx = self._next_frame_to_decode()
+                if frame_idx is None or self._should_stop:
+                    self._thread = None
+                    return
+                playhead_version = self._playhead_version
+            try:
+                self._decode(frame_idx, playhead_version)
+            except Exception:
+                logger.debug(f"Failed to decode frame {frame_idx}", exc_info=True)
+                self._next_decode_idx = None
+                with self._condition:
+                    self._undecodable.add(frame_idx)
+                    self._condition.notify_all()
+
+    def _decode(self, target_idx, playhead_version):
+        """Decodes frames up to the target frame, or until the playhead moved"""
+        container_idx = int(self._lookup.container_idx[target_idx])
+        if container_idx != self._container_idx:
+            self._open_container(container_idx)
+        if self._should_seek(target_idx):
+            self._decoder.seek(int(self._lookup.pts[target_idx]))
+            self._frame_iterator = self._decoder.get_frame_iterator()
+            self._next_decode_idx = None
+
+        is_target_reached = False
+        for av_frame in self._frame_iterator:
+            frame_idx = self._frame_indices_by_pts.get(av_frame.pts)
+            if frame_idx is None:
+                continue
+            self._next_decode_idx = frame_idx + 1
+            with self._condition:
+                is_stored = self._buffer.put(
+                    frame_idx,
+                    av_frame,
+                    _frame_size(av_frame),
+                    self._playhead,
+                    self._direction,
+                )
+                if frame_idx == target_idx and not is_stored:
+                    # prefetched far enough, wait until the playhead moves
+                    self._is_buffer_full = True
+                self._condition.notify_all()
+                is_target_reached = frame_idx >= target_idx
+                if is_target_reached or playhead_version != self._playhead_version:
+                    break
+        else:
+            # the iterator is exhausted and needs a seek before decoding again
+            self._next_decode_idx = None
+
+        with self._condition:
+            if is_target_reached and target_idx not in self._buffer:
+                if not self._is_buffer_full:
+                    # there is no frame with the pts of the target frame
+                    self._undecodable.add(target_idx)
+            elif not is_target_reached and playhead_version == self._playhead_version:
+                self._undecodable.add(target_idx)
+            self._condition.notify_all()
+
+    def _should_seek(self, target_idx):
+        decode_idx = self._next_decode_idx
+        if decode_idx is None or decode_idx > target_idx:
+            return True
+        # seeking lands on the preceding keyframe of the target frame
+        return decode_idx < self._lookup.keyframe_idx[target_idx]
+
+    def _open_container(self, container_idx):
+        if self._decoder is not None:
+            self._decoder.cleanup()
+        self._decoder = self._open_decoder(container_idx)
+        self._container_idx = container_idx
+        self._frame_iterator = iter(())
+        self._next_decode_idx = None
+        frame_indices = np.flatnonzero(self._lookup.container_idx == container_idx)
+        self._frame_indices_by_pts = dict(
+            zip(self._lookup.pts[frame_indices].tolist(), frame_indices.tolist())
+        )
+
+
+def _frame_size(av_frame):
+    return sum(plane.buffer_size for plane in av_frame.planes)
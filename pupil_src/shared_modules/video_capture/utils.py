@@ -179,6 +179,7 @@ class Video:
         self.path = path
         self.ts = None
         self._pts = None
+        self._keyframes = None
         self._is_valid = None  # calculated on demand
 
     @property
@@ -220,9 +221,13 @@ class Video:
         self.ts = self._fix_negative_time_jumps(self.ts)
 
     def load_pts(self, container):
-        packets = container.demux(video=0)
+        packets = [
+            (packet.pts, packet.is_keyframe) for packet in container.demux(video=0)
+        ]
         # last pts is invalid
-        self._pts = np.array([packet.pts for packet in packets][:-1])
+        packets = packets[:-1]
+        self._pts = np.array([pts for pts, _ in packets])
+        self._keyframes = np.array([is_keyframe for _, is_keyframe in packets], bool)
         return self._pts
 
     @property
@@ -250,6 +255,11 @@ class Video:
             self.load_pts()
         return self._pts
 
+    @property
+    def keyframes(self) -> np.ndarray:
+        """Keyframe flag per pts, loaded together with pts"""
+        return self._keyframes
+
     @staticmethod
     def _fix_negative_time_jumps(timestamps: np.ndarray) -> np.ndarray:
         """Fix cases when large negative time jumps cause huge gaps due to sorting
@@ -332,12 +342,17 @@ class VideoSet:
         The lookup table is a np.recarray containing entries
         for each (virtual and real) frame.
 
-        Each entry consists of 3 values:
+        Each entry consists of 6 values:
             - container_idx: Corresponding self.videos index
             - container_frame_idx: Frame index within the container
             - timestamp: Recorded or virtual Pupil timestamp
+            - pts: Presentation timestamp within the container
+            - keyframe: Whether the frame can be decoded on its own
+            - keyframe_idx: Lookup index of the keyframe that decoding the frame
+                needs to start from, i.e. where seeking to the frame lands
 
-        container_idx entries of value -1 indicate a virtual frame.
+        container_idx entries of value -1 indicate a virtual frame. Virtual frames
+        and frames without preceding keyframe have a keyframe_idx of -1.
 
         The lookup table can be easiliy filtered for real frames:
             lookup = lookup[lookup.container_idx > -1]
@@ -400,6 +415,10 @@ class VideoSet:
                 lookup.container_frame_idx[lookup_mask] = np.arange(vid_timestamps.size)
                 lookup.container_idx[lookup_mask] = container_idx
                 lookup.pts[lookup_mask] = vid_pts
+                lookup.keyframe[lookup_mask] = vid.keyframes[:data_size]
+                lookup.keyframe_idx[lookup_mask] = _preceding_keyframe_indices(
+                    np.flatnonzero(lookup_mask), vid.keyframes[:data_size]
+                )
 
             except InvalidContainerError:
                 # For invalid videos, we still try to load the timestamps (might be empty)
@@ -413,7 +432,12 @@ class VideoSet:
             self._remove_filled_gaps()
 
     def load_lookup(self):
-        self.lookup = np.load(self.lookup_loc).view(np.recarray)
+        lookup = np.load(self.lookup_loc).view(np.recarray)
+        if "keyframe_idx" not in lookup.dtype.names:
+            # Lookup tables of previous versions do not contain keyframes
+            self.build_lookup()
+            return
+        self.lookup = lookup
         if not self.fill_gaps:
             self._remove_filled_gaps()
 
@@ -432,7 +456,14 @@ class VideoSet:
 
     def _remove_filled_gaps(self):
         cont_idc = self.lookup.container_idx
-        self.lookup = self.lookup[cont_idc > -1]
+        is_real_frame = cont_idc > -1
+        self.lookup = self.lookup[is_real_frame]
+        # keyframes are real frames, move their indices to the filtered lookup
+        filtered_indices = np.cumsum(is_real_frame) - 1
+        has_keyframe = self.lookup.keyframe_idx > -1
+        self.lookup.keyframe_idx[has_keyframe] = filtered_indices[
+            self.lookup.keyframe_idx[has_keyframe]
+        ]
 
     def _fill_gaps(self, timestamps: np.ndarray) -> np.ndarray:
         time_diff = np.diff(timestamps)
@@ -474,14 +505,26 @@ class VideoSet:
                 ("container_frame_idx", "<i8"),
                 ("timestamp", "<f8"),
                 ("pts", "<i8"),
+                ("keyframe", "?"),
+                ("keyframe_idx", "<i8"),
             ]
         )
         lookup = np.empty(timestamps.size, dtype=lookup_entry).view(np.recarray)
         lookup.timestamp = timestamps
         lookup.container_idx = -1  # virtual container by default
+        lookup.keyframe = False
+        lookup.keyframe_idx = -1
         return lookup
 
 
+def _preceding_keyframe_indices(
+    frame_indices: np.ndarray, keyframes: np.ndarray
+) -> np.ndarray:
+    """Returns the index of the closest keyframe at or before each frame, or -1"""
+    keyframe_indices = np.where(keyframes, frame_indices, -1)
+    return np.maximum.accumulate(keyframe_indices)
+
+
 def pi_gaze_items(root_dir):
     def find_raw_path(timestamps_path):
         raw_name = timestamps_path.name.replace("_timestamps", "")
@@ -10,15 +10,46 @@ See COPYING and COPYING.LESSER for license details.
 """
 
 import logging
+import multiprocessing as mp
 import os
+import shutil
+
+from pyglui import ui
 
 import player_methods as pm
+import tasklib.background
 from task_manager import ManagedTask
 from video_export.plugin_base.video_exporter import VideoExporter
 from pupil_recording import PupilRecording
 
 logger = logging.getLogger(__name__)
 
+# Segments of parallel exports are at least this long, such that starting the
+# plugins of every segment does not dominate the export
+MIN_FRAMES_PER_SEGMENT = 900
+# Segment lengths are multiples of the GOP size of the mpeg4 encoder, such that the
+# concatenated video has the same keyframes as a sequential export
+SEGMENT_FRAME_ALIGNMENT = 12
+
+
+def segment_frame_ranges(start_frame, end_frame, max_segments):
+    """
+    Splits the frame range [start_frame, end_frame) into at most max_segments
+    consecutive ranges of similar length, see MIN_FRAMES_PER_SEGMENT and
+    SEGMENT_FRAME_ALIGNMENT.
+    """
+    num_frames = end_frame - start_frame
+    num_segments = max(min(max_segments, num_frames // MIN_FRAMES_PER_SEGMENT), 1)
+    num_gops = -(-num_frames // SEGMENT_FRAME_ALIGNMENT)
+    boundaries = [
+        min(
+            start_frame + num_gops * idx // num_segments * SEGMENT_FRAME_ALIGNMENT,
+            end_frame,
+        )
+        for idx in range(num_segments + 1)
+    ]
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
 
 class World_Video_Exporter(VideoExporter):
     """
@@ -28,15 +59,26 @@ class World_Video_Exporter(VideoExporter):
     icon_chr = chr(0xEC09)
     icon_font = "pupil_icons"
 
-    def __init__(self, g_pool):
+    def __init__(self, g_pool, should_export_in_parallel=True):
         super().__init__(g_pool, max_concurrent_tasks=1)
         self.logger = logging.getLogger(__name__)
         self.logger.info("World Video Exporter has been launched.")
         self.rec_name = "world.mp4"
+        self.should_export_in_parallel = should_export_in_parallel
+
+    def get_init_dict(self):
+        return {"should_export_in_parallel": self.should_export_in_parallel}
 
     def customize_menu(self):
         self.menu.label = "World Video Exporter"
         super().customize_menu()
+        self.menu.append(
+            ui.Switch(
+                "should_export_in_parallel",
+                self,
+                label="Export segments in parallel",
+            )
+        )
 
     def export_data(self, export_range, export_dir):
         rec_dir = self.g_pool.rec_dir
@@ -48,8 +90,15 @@ class World_Video_Exporter(VideoExporter):
         plugins = self.g_pool.plugins.get_initializers()
 
         out_file_path = os.path.join(export_dir, self.rec_name)
-        pre_computed_eye_data = self._precomputed_eye_data_for_range(export_range)
 
+        # Leave one core for the foreground process
+        max_segments = mp.cpu_count() - 1 if self.should_export_in_parallel else 1
+        segments = segment_frame_ranges(start_frame, end_frame, max_segments)
+        if len(segments) > 1:
+            self._export_segments(segments, plugins, out_file_path)
+            return
+
+        pre_computed_eye_data = self._precomputed_eye_data_for_range(export_range)
         args = (
             rec_dir,
             user_dir,
@@ -69,6 +118,73 @@ class World_Video_Exporter(VideoExporter):
         )
         self.add_task(task)
 
+    def _export_segments(self, segments, plugins, out_file_path):
+        """
+        Exports every segment with its own File_Source and plugins in a task group
+        and concatenates the segments afterwards
+        """
+        out_dir, out_name = os.path.split(out_file_path)
+        segment_dir = os.path.join(out_dir, f".{out_name}_segments")
+        start_time_synced = self.g_pool.timestamps[segments[0][0]]
+
+        args_per_task = []
+        segment_paths = []
+        for idx, segment_range in enumerate(segments):
+            segment_path = os.path.join(segment_dir, f"{idx:03d}.mp4")
+            segment_paths.append(segment_path)
+            # the data window of the first frame reaches back to the previous frame,
+            # see pm.enclosing_window()
+            eye_data_range = (
+                max(segment_range[0] - 1, segments[0][0]),
+                segment_range[1],
+            )
+            args_per_task.append(
+                (
+                    self.g_pool.rec_dir,
+                    self.g_pool.user_dir,
+                    self.g_pool.min_data_confidence,
+                    *segment_range,
+                    plugins,
+                    segment_path,
+                    self._precomputed_eye_data_for_range(eye_data_range),
+                    start_time_synced,
+                )
+            )
+
+        # Segments run in their own processes instead of the shared worker pool,
+        # which would be blocked by the long running exports
+        segment_export = tasklib.background.create_group(
+            "Export World Video segment",
+            _export_world_video_segment,
+            args_per_task,
+            pass_shared_memory=True,
+            weights=[stop - start for start, stop in segments],
+        )
+
+        def on_ended():
+            if not segment_export.completed:
+                # canceled or failed, there is nothing to concatenate
+                shutil.rmtree(segment_dir, ignore_errors=True)
+
+        segment_export.add_observer("on_ended", on_ended)
+        num_frames = segments[-1][1] - segments[0][0]
+        task = ManagedTask(
+            _concatenate_world_video_segments,
+            args=(
+                segment_dir,
+                segment_paths,
+                out_file_path,
+                start_time_synced,
+                self.g_pool.rec_dir,
+                num_frames,
+            ),
+            heading="Export World Video",
+            min_progress=0.0,
+            max_progress=num_frames,
+            preceding_task=segment_export,
+        )
+        self.add_task(task)
+
     def _precomputed_eye_data_for_range(self, export_range):
         export_window = pm.exact_window(self.g_pool.timestamps, export_range)
         pre_computed = {
@@ -98,17 +214,24 @@ def _export_world_video(
     plugin_initializers,
     out_file_path,
     pre_computed_eye_data,
+    start_time_synced=None,
+    with_audio=True,
+    timestamp_export_format="all",
 ):
     """
     Simulates the generation for the world video and saves a certain time range as a video.
     It simulates a whole g_pool such that all plugins run as normal.
+
+    Segments of parallel exports use the start time of the whole export as
+    start_time_synced, such that their pts continue each other. Audio is added when
+    the segments are concatenated.
     """
     from glob import glob
     from time import time
 
     import file_methods as fm
     import player_methods as pm
-    from av_writer import MPEG_Audio_Writer
+    from av_writer import MPEG_Audio_Writer, MPEG_Writer
 
     # we are not importing manual gaze correction. In Player corrections have already been applied.
     # in batch exporter this plugin makes little sense.
@@ -209,9 +332,14 @@ def _export_world_video(
         )
 
         # setup of writer
-        writer = MPEG_Audio_Writer(
-            out_file_path, start_time_synced=trimmed_timestamps[0], audio_dir=rec_dir
-        )
+        if start_time_synced is None:
+            start_time_synced = trimmed_timestamps[0]
+        if with_audio:
+            writer = MPEG_Audio_Writer(
+                out_file_path, start_time_synced=start_time_synced, audio_dir=rec_dir
+            )
+        else:
+            writer = MPEG_Writer(out_file_path, start_time_synced=start_time_synced)
 
         cap.seek_to_frame(start_frame)
 
@@ -274,7 +402,7 @@ def _export_world_video(
             current_frame += 1
             yield "Exporting with pid {}".format(PID), current_frame
 
-        writer.close(timestamp_export_format="all")
+        writer.close(timestamp_export_format=timestamp_export_format)
 
         duration = time() - start_time
         effective_fps = float(current_frame) / duration
@@ -287,3 +415,69 @@ def _export_world_video(
 
     except GeneratorExit:
         logger.warning("Video export with pid {} was canceled.".format(os.getpid()))
+
+
+def _export_world_video_segment(*args, shared_memory):
+    """
+    Exports a segment of a parallel world video export, see _export_world_video().
+
+    Reports the progress through the shared memory of the task group and only
+    yields the status strings when they change.
+    """
+    start_frame, end_frame, _, segment_path = args[3:7]
+    os.makedirs(os.path.dirname(segment_path), exist_ok=True)
+    num_frames = end_frame - start_frame
+    previous_status = None
+    for status, current_frame in _export_world_video(
+        *args, with_audio=False, timestamp_export_format="npy"
+    ):
+        shared_memory.progress = current_frame / num_frames
+        if status != previous_status:
+            previous_status = status
+            yield status
+
+
+def _concatenate_world_video_segments(
+    segment_dir, segment_paths, out_file_path, start_time_synced, rec_dir, num_frames
+):
+    """
+    Concatenates the segments of a parallel world video export without re-encoding
+    them and stitches their timestamps together. The segments are removed
+    afterwards, also if the concatenation fails or is canceled.
+    """
+    import numpy as np
+
+    from av_writer import concatenate_videos, write_timestamps
+
+    try:
+        yield "Concatenating segments", num_frames
+
+        # segments without frames, e.g. at the end of the video, are not written
+        segment_paths = [path for path in segment_paths if os.path.isfile(path)]
+        if not segment_paths:
+            warn = "No frames were exported."
+            logger.warning(warn)
+            yield warn, num_frames
+            return
+
+        timestamps = np.concatenate(
+            [
+                np.load(os.path.splitext(path)[0] + "_timestamps.npy")
+                for path in segment_paths
+            ]
+        )
+        if os.path.isfile(out_file_path):
+            logger.warning("Video out file already exsists. I will overwrite!")
+            os.remove(out_file_path)
+        concatenate_videos(
+            segment_paths, out_file_path, start_time_synced, audio_dir=rec_dir
+        )
+        write_timestamps(out_file_path, timestamps, output_format="all")
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+    logger.info(
+        f"Export done: Exported {len(timestamps)} frames in {len(segment_paths)} "
+        f"segments to {out_file_path}."
+    )
+    yield "Export done.", num_frames
@@ -23,7 +23,11 @@ class FrameFetcher:
 
     def __init__(self, video_path):
         self.source = File_Source(
-            SimpleNamespace(), source_path=video_path, timing=None, fill_gaps=True
+            SimpleNamespace(),
+            source_path=video_path,
+            timing=None,
+            fill_gaps=True,
+            prefetch_decoding=True,
         )
         if not self.source.initialised:
             raise FileNotFoundError(video_path)
@@ -35,12 +39,8 @@ class FrameFetcher:
 
     def frame_for_idx(self, requested_frame_idx):
         if requested_frame_idx != self.current_frame.index:
-            if requested_frame_idx == self.source.get_frame_index() + 2:
-                # if we just need to seek by one frame,
-                # its faster to just read one and and throw it away.
-                self.source.get_frame()
-            if requested_frame_idx != self.source.get_frame_index() + 1:
-                self.source.seek_to_frame(int(requested_frame_idx))
+            # seeking is cheap, frames around the requested one are prefetched
+            self.source.seek_to_frame(int(requested_frame_idx))
 
             try:
                 self.current_frame = self.source.get_frame()
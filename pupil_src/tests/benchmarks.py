@@ -0,0 +1,253 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+
+Benchmarks for performance-critical code paths, not collected by pytest.
+
+Run from pupil_src, e.g.:
+    python -m tests.benchmarks fixations [<rec_dir>]
+"""
+import argparse
+import ast
+import importlib
+import os
+import time
+
+import numpy as np
+
+
+def bench_fixations(rec_dir=None):
+    """Compare `detect_fixations` with its original implementation
+
+    Uses synthetic 3d gaze, and the recorded gaze of `rec_dir` if given.
+    """
+    import file_methods as fm
+    from camera_models import Camera_Model
+    from fixation_detector import detect_fixations
+
+    from .test_fixation_detector import (
+        WORLD_RESOLUTION,
+        detect_fixations_reference,
+        synthetic_capture,
+        synthetic_gaze,
+    )
+
+    benchmarks = {"synthetic": synthetic_gaze(duration_s=60.0, drift=0.0002)}
+    capture = synthetic_capture(duration_s=60.0)
+    if rec_dir is not None:
+        gaze = fm.load_pldata_file(rec_dir, "gaze")
+        benchmarks["recording"] = [datum.serialized for datum in gaze.data]
+        capture.intrinsics = Camera_Model.from_file(rec_dir, "world", WORLD_RESOLUTION)
+        capture.timestamps = np.load(os.path.join(rec_dir, "world_timestamps.npy"))
+
+    for name, gaze_data in benchmarks.items():
+        for max_duration in (0.22, 1.0, 4.0):
+            args = (capture, gaze_data, np.deg2rad(1.5), 0.08, max_duration, 0.6)
+            results = {}
+            for detector in (detect_fixations, detect_fixations_reference):
+                start = time.perf_counter()
+                results[detector] = [
+                    fixation for _, fixation in detector(*args) if fixation
+                ]
+                duration = time.perf_counter() - start
+                print(
+                    f"{name} ({len(gaze_data)} samples, max. duration "
+                    f"{max_duration:.2f}s): {detector.__name__} found "
+                    f"{len(results[detector])} fixations in {duration:.2f}s"
+                )
+            assert results[detect_fixations] == results[detect_fixations_reference]
+
+
+def bench_head_pose_optimization(n_markers=30, n_frames=900):
+    """
+    Compare the incremental optimization with global refinements after every batch
+
+    Uses a synthetic marker scene and reports the runtime and the error of the
+    resulting 3d model in marker sizes.
+    """
+    from .head_pose_tracker.test_optimization_worker import (
+        model_errors,
+        run_offline_optimization,
+        synthetic_marker_scene,
+    )
+
+    scene = synthetic_marker_scene(n_markers, n_frames)
+    for name, global_refinement_interval in (("global", 1), ("incremental", 5)):
+        start = time.perf_counter()
+        results = run_offline_optimization(scene, global_refinement_interval)
+        duration = time.perf_counter() - start
+
+        model_tuple, _ = results[-1]
+        errors = list(model_errors(model_tuple, scene.markers_points_3d).values())
+        print(
+            f"{name}: {len(results)} optimizations in {duration:.2f}s, "
+            f"{len(errors)}/{n_markers} markers with mean error {np.mean(errors):.4f}"
+        )
+
+
+def bench_transport(array_size=1_000_000, num_arrays=500, buffer_size=64_000_000):
+    """Compare the throughput of background tasks with and without ring buffer"""
+    import tasklib.background
+
+    for shared_buffer_size in (None, buffer_size):
+        task = tasklib.background.create(
+            "bench",
+            _yield_arrays,
+            args=(array_size, num_arrays),
+            patches=[],
+            shared_buffer_size=shared_buffer_size,
+        )
+        num_bytes = 0
+
+        def on_yield(array):
+            nonlocal num_bytes
+            num_bytes += array.nbytes
+
+        task.add_observer("on_yield", on_yield)
+        start = time.perf_counter()
+        task.start()
+        while not task.ended:
+            task.update()
+        duration = time.perf_counter() - start
+        transport = "ring buffer" if shared_buffer_size else "pipe"
+        print(
+            f"{transport}: {num_arrays} arrays of {array_size} bytes in "
+            f"{duration:.2f}s ({num_bytes / duration / 1e6:.0f} MB/s)"
+        )
+
+
+def _yield_arrays(array_size, num_arrays):
+    array = np.arange(array_size, dtype=np.uint8)
+    for _ in range(num_arrays):
+        yield array
+
+
+def bench_task_startup(num_tasks=20, start_method=None):
+    """Compare the latency of tasks in new processes and in a warm worker pool"""
+    import multiprocessing as mp
+
+    import tasklib.background
+    from tasklib.background.pool import WorkerPool
+
+    if start_method is not None:
+        mp.set_start_method(start_method)
+    module_names = ("numpy", "cv2")
+    worker_pool = WorkerPool(num_workers=1, preload_modules=module_names, patches=[])
+    for use_pool in (False, True):
+        start = time.perf_counter()
+        for _ in range(num_tasks):
+            if use_pool:
+                task = worker_pool.create(
+                    "bench", _import_modules, args=(module_names,)
+                )
+            else:
+                task = tasklib.background.create(
+                    "bench", _import_modules, args=(module_names,), patches=[]
+                )
+            task.start()
+            while not task.ended:
+                task.update()
+        duration = time.perf_counter() - start
+        label = "worker pool" if use_pool else "new process"
+        print(f"{label}: {duration / num_tasks * 1000:.1f}ms per task")
+    worker_pool.shutdown()
+
+
+def _import_modules(module_names):
+    for module_name in module_names:
+        yield importlib.import_module(module_name).__name__
+
+
+def bench_csv_export(num_data=100_000):
+    """Compare the row-wise and the columnar pupil_positions.csv export"""
+    import csv
+    import io
+
+    import file_methods as fm
+    from raw_data_exporter import Pupil_Positions_Exporter
+
+    datum = {
+        "topic": "pupil.0.3d",
+        "circle_3d": {
+            "center": (-2.589605454357244, 5.16258305418917, 106.22798206853192),
+            "normal": (0.021375378493324514, 0.3073983655417788, -0.951340810675391),
+            "radius": 2.178582911117089,
+        },
+        "confidence": 0.9661007130628978,
+        "diameter_3d": 4.357165822234178,
+        "ellipse": {
+            "center": (80.87985171196992, 126.05637442643379),
+            "axes": (23.82040062925261, 25.43866813955349),
+            "angle": 89.7491053060753,
+        },
+        "norm_pos": (0.42124922766651, 0.3434563831956573),
+        "diameter": 25.43866813955349,
+        "sphere": {
+            "center": (-2.8461099962771383, 1.4738026676878244, 117.64407179663661),
+            "radius": 12.0,
+        },
+        "projected_sphere": {
+            "center": (81.00061948941932, 103.76713726422189),
+            "axes": (126.48321137440784, 126.48321137440784),
+            "angle": 90.0,
+        },
+        "model_confidence": 0.8313087355695914,
+        "model_id": 14,
+        "theta": 1.8832541345741016,
+        "phi": -1.5483314201277814,
+        "method": "3d c++",
+        "id": 0,
+    }
+    data = [
+        fm.Serialized_Dict(python_dict={**datum, "timestamp": 18147.38145 + idx})
+        for idx in range(num_data)
+    ]
+    world_indices = np.arange(num_data) // 4
+    exporter = Pupil_Positions_Exporter
+
+    start = time.perf_counter()
+    csvfile = io.StringIO(newline="")
+    dict_writer = csv.DictWriter(csvfile, fieldnames=exporter.csv_export_labels())
+    dict_writer.writeheader()
+    for raw_value, world_index in zip(data, world_indices):
+        dict_writer.writerow(exporter.dict_export(raw_value, world_index))
+    print(f"row-wise: {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    columns = exporter.columns_export(data, world_indices)
+    exporter.csv_write_columns(io.StringIO(newline=""), columns)
+    print(f"columnar: {time.perf_counter() - start:.2f}s")
+
+
+BENCHMARKS = {
+    "csv_export": bench_csv_export,
+    "fixations": bench_fixations,
+    "head_pose_optimization": bench_head_pose_optimization,
+    "task_startup": bench_task_startup,
+    "transport": bench_transport,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("~(*)")[-1])
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("args", nargs="*", help="passed to the benchmark")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](*map(_parse_arg, args.args))
+
+
+def _parse_arg(arg):
+    try:
+        return ast.literal_eval(arg)
+    except (ValueError, SyntaxError):
+        return arg
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import cv2
+import numpy as np
+import pytest
+
+import camera_models
+from gaze_mapping.gazer_3d.gazer_headset import (
+    Gazer3D,
+    Model3D_Binocular,
+    Model3D_Monocular,
+)
+
+
+@pytest.fixture(params=["radial", "fisheye", None])
+def intrinsics(request):
+    K = [[800.0, 0.0, 640.0], [0.0, 800.0, 360.0], [0.0, 0.0, 1.0]]
+    if request.param == "radial":
+        D = [[-0.3, 0.1, 0.001, 0.001, -0.02]]
+        return camera_models.Radial_Dist_Camera("camera", (1280, 720), K, D)
+    elif request.param == "fisheye":
+        D = [[0.05, -0.01, 0.002, -0.001]]
+        return camera_models.Fisheye_Dist_Camera("camera", (1280, 720), K, D)
+    return None
+
+
+def _eye_camera_to_world_matrix(rotation, translation):
+    matrix = np.eye(4)
+    matrix[:3, :3] = cv2.Rodrigues(np.asarray(rotation, dtype=np.float64))[0]
+    matrix[:3, 3] = translation
+    return matrix.tolist()
+
+
+def _pupil_features(rng, eye_id, num_samples):
+    normals = rng.normal([0.0, 0.0, -1.0], 0.2, (num_samples, 3))
+    normals /= np.linalg.norm(normals, axis=1)[:, np.newaxis]
+    sphere_centers = rng.normal([0.0, 0.0, 35.0], 1.0, (num_samples, 3))
+    eye_ids = np.full((num_samples, 1), eye_id)
+    return np.hstack([eye_ids, sphere_centers, normals])
+
+
+def _assert_predictions_equal(predictions, expected_predictions):
+    assert len(predictions) == len(expected_predictions)
+    for prediction, expected in zip(predictions, expected_predictions):
+        assert prediction.keys() == expected.keys()
+        for key, value in prediction.items():
+            if isinstance(value, dict):
+                assert value.keys() == expected[key].keys()
+                for eye_id in value:
+                    assert np.allclose(value[eye_id], expected[key][eye_id])
+            else:
+                assert np.allclose(value, expected[key])
+
+
+@pytest.fixture
+def binocular_model(intrinsics):
+    model = Model3D_Binocular(intrinsics=intrinsics)
+    model.set_params(
+        eye_camera_to_world_matrix0=_eye_camera_to_world_matrix(
+            [0.1, 2.9, 0.05], [30.0, 15.0, -20.0]
+        ),
+        eye_camera_to_world_matrix1=_eye_camera_to_world_matrix(
+            [-0.1, -2.9, -0.05], [-30.0, 15.0, -20.0]
+        ),
+    )
+    return model
+
+
+def test_binocular_predict_batch_matches_single_predictions(binocular_model):
+    rng = np.random.default_rng(0)
+    X = np.hstack([_pupil_features(rng, 1, 200), _pupil_features(rng, 0, 200)])
+
+    expected_predictions = [binocular_model._predict_single(x) for x in X]
+    expected_gaze_distance = binocular_model.last_gaze_distance
+    binocular_model.last_gaze_distance = 500.0
+
+    predictions = binocular_model.predict_batch(X)
+    _assert_predictions_equal(predictions, expected_predictions)
+    assert np.isclose(binocular_model.last_gaze_distance, expected_gaze_distance)
+    assert binocular_model.predict_batch(X[:0]) == []
+
+
+def test_monocular_predict_batch_matches_single_predictions(
+    intrinsics, binocular_model
+):
+    rng = np.random.default_rng(1)
+    model = Model3D_Monocular(intrinsics=intrinsics)
+    model.set_params(
+        eye_camera_to_world_matrix=_eye_camera_to_world_matrix(
+            [0.1, 2.9, 0.05], [30.0, 15.0, -20.0]
+        ),
+        gaze_distance=500,
+    )
+    X = _pupil_features(rng, 0, 200)
+    _assert_predictions_equal(
+        model.predict_batch(X), [model._predict_single(x) for x in X]
+    )
+
+    binocular_model.last_gaze_distance = 750.0
+    model.binocular_model = binocular_model
+    _assert_predictions_equal(
+        list(model.predict(X)), [model._predict_single(x) for x in X]
+    )
+
+
+def _gazer(intrinsics):
+    gazer = object.__new__(Gazer3D)
+    matrix0 = _eye_camera_to_world_matrix([0.1, 2.9, 0.05], [30.0, 15.0, -20.0])
+    matrix1 = _eye_camera_to_world_matrix([-0.1, -2.9, -0.05], [-30.0, 15.0, -20.0])
+    gazer.binocular_model = Model3D_Binocular(intrinsics=intrinsics)
+    gazer.binocular_model.set_params(
+        eye_camera_to_world_matrix0=matrix0, eye_camera_to_world_matrix1=matrix1
+    )
+    gazer.right_model = Model3D_Monocular(intrinsics=intrinsics)
+    gazer.right_model.set_params(eye_camera_to_world_matrix=matrix0, gaze_distance=500)
+    gazer.left_model = Model3D_Monocular(intrinsics=intrinsics)
+    gazer.left_model.set_params(eye_camera_to_world_matrix=matrix1, gaze_distance=500)
+    gazer.right_model.binocular_model = gazer.binocular_model
+    gazer.left_model.binocular_model = gazer.binocular_model
+    return gazer
+
+
+def test_gazer_predict_batches_match_single_predictions(intrinsics):
+    rng = np.random.default_rng(2)
+
+    def pupil(eye_id, timestamp):
+        features = _pupil_features(rng, eye_id, 1)[0]
+        return {
+            "id": eye_id,
+            "sphere": {"center": features[1:4].tolist()},
+            "circle_3d": {"normal": features[4:7].tolist()},
+            "confidence": float(rng.uniform()),
+            "timestamp": float(timestamp),
+        }
+
+    matches = []
+    # spans several prediction batches
+    for timestamp in range(2500):
+        kind = rng.choice(["binocular", "right", "left"], p=[0.6, 0.2, 0.2])
+        if kind == "binocular":
+            matches.append([pupil(0, timestamp), pupil(1, timestamp + 0.5)])
+        else:
+            matches.append([pupil(0 if kind == "right" else 1, timestamp)])
+
+    # Predict one match at a time. Monocular predictions use the gaze distance of
+    # the preceding binocular prediction, which is carried over by the model.
+    gazer = _gazer(intrinsics)
+    expected_gaze = []
+    for match in matches:
+        features = gazer._extract_pupil_features(match)
+        if len(match) == 2:
+            model, topic = gazer.binocular_model, "gaze.3d.01."
+            x = np.hstack([features[1], features[0]])
+        elif match[0]["id"] == 0:
+            model, topic = gazer.right_model, "gaze.3d.0."
+            x = features[0]
+        else:
+            model, topic = gazer.left_model, "gaze.3d.1."
+            x = features[0]
+        expected = model._predict_single(x)
+        expected.update(
+            {
+                "topic": topic,
+                "confidence": np.mean([p["confidence"] for p in match]),
+                "timestamp": np.mean([p["timestamp"] for p in match]),
+                "base_data": match,
+            }
+        )
+        expected_gaze.append(expected)
+
+    gaze = list(_gazer(intrinsics).predict(iter(matches)))
+    assert len(gaze) == len(expected_gaze)
+    for datum, expected in zip(gaze, expected_gaze):
+        assert datum.pop("topic") == expected.pop("topic")
+        assert datum.pop("base_data") is expected.pop("base_data")
+    _assert_predictions_equal(gaze, expected_gaze)
@@ -0,0 +1,78 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import numpy as np
+import pytest
+
+from gaze_mapping.matching import OfflineMatcher, RealtimeMatcher
+
+
+def _pupil_data(rng, num_samples_per_eye):
+    pupil_data = []
+    for eye_id, framerate in ((0, 200.0), (1, 120.0)):
+        timestamps = np.cumsum(rng.normal(1 / framerate, 0.1 / framerate, 2000))
+        # drop data, e.g. due to frame drops or a disconnected eye camera
+        timestamps = timestamps[rng.uniform(size=len(timestamps)) > 0.05]
+        timestamps = timestamps[(timestamps < 3) | (timestamps > 4)]
+        timestamps = timestamps[:num_samples_per_eye]
+        confidences = rng.uniform(0.3, 1.0, len(timestamps))
+        pupil_data.extend(
+            {"id": eye_id, "timestamp": ts, "confidence": conf}
+            for ts, conf in zip(timestamps.tolist(), confidences.tolist())
+        )
+    pupil_data.sort(key=lambda p: p["timestamp"])
+    return pupil_data
+
+
+@pytest.mark.parametrize("num_samples_per_eye", [0, 1, 5, 1500])
+def test_offline_matcher_equals_realtime_matcher(num_samples_per_eye):
+    rng = np.random.default_rng(num_samples_per_eye)
+    pupil_data = _pupil_data(rng, num_samples_per_eye)
+
+    realtime_matcher = RealtimeMatcher()
+    expected_matches = [
+        match
+        for datum in pupil_data
+        for match in realtime_matcher.on_pupil_datum(datum)
+    ]
+    matches = OfflineMatcher().match(pupil_data)
+
+    assert len(matches) == len(expected_matches)
+    for match, expected_match in zip(matches, expected_matches):
+        assert len(match) == len(expected_match)
+        assert all(p is expected_p for p, expected_p in zip(match, expected_match))
+
+
+def test_offline_matcher_match_indices():
+    matcher = OfflineMatcher()
+    match_indices = matcher.match_indices(
+        timestamps=[0.0, 0.001, 0.008, 0.009, 1.0, 1.001],
+        eye_ids=[0, 1, 0, 1, 0, 1],
+        confidences=[0.9, 0.9, 0.9, 0.9, 0.1, 0.9],
+    )
+    assert match_indices.tolist() == [[0, 1], [2, 1], [2, 3], [4, -1]]
+    assert matcher.match_indices([], [], []).shape == (0, 2)
+
+
+@pytest.mark.parametrize("num_warm_up", [0, 1, 700, 10000])
+def test_offline_matcher_drops_warm_up_matches(num_warm_up):
+    rng = np.random.default_rng(0)
+    pupil_data = _pupil_data(rng, 1500)
+    args = (
+        [p["timestamp"] for p in pupil_data],
+        [p["id"] for p in pupil_data],
+        [p["confidence"] for p in pupil_data],
+    )
+    matcher = OfflineMatcher()
+    all_matches = matcher.match_indices(*args).tolist()
+    warm_up_matches = matcher.match_indices(*(arg[:num_warm_up] for arg in args))
+
+    matches = matcher.match_indices(*args, num_warm_up=num_warm_up)
+    assert matches.tolist() == all_matches[len(warm_up_matches) :]
@@ -0,0 +1,151 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import copy
+import random
+from types import SimpleNamespace
+
+import numpy as np
+
+import player_methods as pm
+from camera_models import Radial_Dist_Camera
+from head_pose_tracker.function import utils
+from head_pose_tracker.worker.optimization_worker import offline_optimization
+from methods import normalize
+
+
+def synthetic_marker_scene(n_markers=30, n_frames=900, seed=0):
+    """Markers scattered on a wall, filmed by a moving camera"""
+    rng = np.random.default_rng(seed)
+    resolution = (1280, 720)
+    camera_intrinsics = Radial_Dist_Camera(
+        "synthetic",
+        resolution,
+        [[800.0, 0.0, 640.0], [0.0, 800.0, 360.0], [0.0, 0.0, 1.0]],
+        [[-0.1, 0.05, 0.0, 0.0, 0.0]],
+    )
+
+    marker_extrinsics = np.column_stack(
+        (
+            rng.normal(scale=0.2, size=(n_markers, 3)),
+            rng.uniform(-8, 8, n_markers),
+            rng.uniform(-5, 5, n_markers),
+            rng.normal(scale=0.5, size=n_markers),
+        )
+    )
+    markers_points_3d = utils.convert_markers_extrinsics_to_points_3d(marker_extrinsics)
+
+    timestamps = np.arange(n_frames) / 30.0
+    phase = np.linspace(0, 4 * np.pi, n_frames)
+    camera_extrinsics = np.column_stack(
+        (
+            0.15 * np.sin(phase),
+            0.15 * np.cos(0.7 * phase),
+            0.05 * np.sin(0.3 * phase),
+            4 * np.sin(0.5 * phase),
+            2 * np.cos(0.8 * phase),
+            np.full(n_frames, 14.0),
+        )
+    )
+
+    markers = []
+    marker_timestamps = []
+    frame_index_to_num_markers = {}
+    for frame_index, (timestamp, extrinsics) in enumerate(
+        zip(timestamps, camera_extrinsics)
+    ):
+        points_3d_cam = utils.transform_points_3d(
+            markers_points_3d, np.tile(extrinsics, (n_markers, 1))
+        )
+        verts = camera_intrinsics.projectPoints(points_3d_cam.reshape(-1, 3))
+        verts = verts.reshape(n_markers, 4, 2) + rng.normal(
+            scale=0.3, size=(n_markers, 4, 2)
+        )
+        visible = np.all((verts > 0) & (verts < resolution), axis=(1, 2))
+        for marker_id in np.flatnonzero(visible):
+            markers.append(
+                {
+                    "id": int(marker_id),
+                    "verts": verts[marker_id].tolist(),
+                    "centroid": normalize(
+                        verts[marker_id].mean(axis=0), resolution, flip_y=True
+                    ),
+                    "timestamp": float(timestamp),
+                }
+            )
+            marker_timestamps.append(float(timestamp))
+        frame_index_to_num_markers[frame_index] = int(np.count_nonzero(visible))
+
+    markers_bisector = pm.Bisector(markers, marker_timestamps)
+    return SimpleNamespace(
+        timestamps=timestamps,
+        markers_bisector=markers_bisector,
+        frame_index_to_num_markers=frame_index_to_num_markers,
+        camera_intrinsics=camera_intrinsics,
+        markers_points_3d=markers_points_3d,
+    )
+
+
+def run_offline_optimization(scene, global_refinement_interval):
+    """Returns all intermediate results of `offline_optimization` for the scene"""
+    random.seed(0)
+    return list(
+        offline_optimization(
+            scene.timestamps,
+            (0, len(scene.timestamps) - 1),
+            None,
+            True,
+            scene.markers_bisector,
+            scene.frame_index_to_num_markers,
+            copy.deepcopy(scene.camera_intrinsics),
+            SimpleNamespace(progress=0.0),
+            global_refinement_interval=global_refinement_interval,
+        )
+    )
+
+
+def model_errors(model_tuple, markers_points_3d):
+    """Mean vertex error per optimized marker, in marker sizes"""
+    origin_marker_id, _, marker_id_to_points_3d = model_tuple
+    # express the ground truth in the coordinate system of the origin marker
+    rotation, translation, _ = utils.svdt(
+        markers_points_3d[origin_marker_id],
+        utils.get_marker_points_3d_origin().astype(np.float64),
+    )
+    return {
+        marker_id: np.linalg.norm(
+            markers_points_3d[marker_id] @ rotation.T + translation - points_3d,
+            axis=1,
+        ).mean()
+        for marker_id, points_3d in marker_id_to_points_3d.items()
+    }
+
+
+def test_incremental_optimization_matches_global_optimization():
+    scene = synthetic_marker_scene(n_markers=12, n_frames=240)
+    # global_refinement_interval=1 refines all variables after every batch
+    global_results = run_offline_optimization(scene, global_refinement_interval=1)
+    incremental_results = run_offline_optimization(scene, global_refinement_interval=5)
+    assert len(incremental_results) == len(global_results)
+
+    (global_model, _), (incremental_model, _) = (
+        global_results[-1],
+        incremental_results[-1],
+    )
+    assert incremental_model[0] == global_model[0]
+    assert incremental_model[2].keys() == global_model[2].keys()
+    assert len(global_model[2]) > 1
+
+    global_errors = model_errors(global_model, scene.markers_points_3d)
+    incremental_errors = model_errors(incremental_model, scene.markers_points_3d)
+    assert max(global_errors.values()) < 0.05
+    assert max(incremental_errors.values()) < 0.05
+    for marker_id, points_3d in global_model[2].items():
+        assert np.allclose(incremental_model[2][marker_id], points_3d, atol=0.05)
@@ -0,0 +1,38 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import cv2
+import numpy as np
+
+from head_pose_tracker.function import utils
+
+
+def test_rotation_vectors_to_matrices_matches_rodrigues():
+    rng = np.random.default_rng(0)
+    rotation_vectors = rng.uniform(-np.pi, np.pi, (50, 3))
+    rotation_vectors[0] = 0
+    rotation_vectors[1] = 1e-12
+
+    matrices = utils.rotation_vectors_to_matrices(rotation_vectors)
+    for rotation_vector, matrix in zip(rotation_vectors, matrices):
+        assert np.allclose(matrix, cv2.Rodrigues(rotation_vector)[0])
+
+
+def test_convert_markers_extrinsics_to_points_3d():
+    rng = np.random.default_rng(0)
+    markers_extrinsics = np.hstack(
+        [rng.uniform(-np.pi, np.pi, (20, 3)), rng.uniform(-5, 5, (20, 3))]
+    )
+
+    points_3d = utils.convert_markers_extrinsics_to_points_3d(markers_extrinsics)
+    assert points_3d.shape == (20, 4, 3)
+    for extrinsics, points in zip(markers_extrinsics, points_3d):
+        expected = utils.convert_marker_extrinsics_to_points_3d(extrinsics)
+        assert np.allclose(points, expected, atol=1e-5)
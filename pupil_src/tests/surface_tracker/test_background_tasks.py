@@ -0,0 +1,166 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import csv
+import multiprocessing as mp
+import os
+import types
+
+import numpy as np
+import pytest
+
+import background_helper
+import player_methods as pm
+from surface_tracker import background_tasks
+
+WORLD_TIMESTAMPS = np.arange(100, dtype=float)
+GAZE_TIMESTAMPS = np.arange(0, 100, 0.5)
+EXPORT_RANGE = (10, 60)
+
+
+class FakeSurface:
+    def __init__(self, name, is_on_surf):
+        self.name = name
+        self.is_on_surf = is_on_surf
+        self.mapped_events = []
+
+    def map_section(self, section, world_timestamps, events, camera_model):
+        self.mapped_events.append(events)
+        window = (world_timestamps[section.start], world_timestamps[section.stop])
+        timestamps = np.array(
+            [event["timestamp"] for event in events.by_ts_window(window)]
+        )
+        return types.SimpleNamespace(
+            timestamp=timestamps, on_surf=self.is_on_surf(timestamps)
+        )
+
+
+class GazeCountingExporter(background_tasks.Exporter):
+    """Only exports the gaze distribution, which merges the results of all surfaces"""
+
+    def _export_surface_visibility(self):
+        pass
+
+    def _export_surface_events(self):
+        pass
+
+    def _export_surface_positions(self, surface, surface_name):
+        pass
+
+    def _export_gaze_on_surface(self, gazes_on_surface, surface, surface_name):
+        pass
+
+    def _export_fixations_on_surface(self, fixations_on_surf, surface, surface_name):
+        pass
+
+    def _export_surface_heatmap(self, surface, surface_name):
+        pass
+
+
+@pytest.fixture
+def exporter(tmp_path):
+    surfaces = [
+        FakeSurface("even", lambda ts: ts % 2 < 1),
+        FakeSurface("early", lambda ts: ts < 30),
+        FakeSurface("hidden", lambda ts: np.zeros(len(ts), dtype=bool)),
+    ]
+    gaze = [{"timestamp": ts} for ts in GAZE_TIMESTAMPS.tolist()]
+    return GazeCountingExporter(
+        str(tmp_path),
+        EXPORT_RANGE,
+        surfaces,
+        WORLD_TIMESTAMPS,
+        pm.Bisector(gaze, GAZE_TIMESTAMPS),
+        pm.Bisector(),
+        None,
+    )
+
+
+def _gaze_distribution(exporter):
+    path = os.path.join(exporter.metrics_dir, "surface_gaze_distribution.csv")
+    with open(path, encoding="utf-8", newline="") as csv_file:
+        return [row for row in csv.reader(csv_file) if row]
+
+
+def _gaze_in_section():
+    # the export window ends at the timestamp of the last frame of the range
+    start_ts, stop_ts = WORLD_TIMESTAMPS[list(EXPORT_RANGE)]
+    return GAZE_TIMESTAMPS[(GAZE_TIMESTAMPS >= start_ts) & (GAZE_TIMESTAMPS < stop_ts)]
+
+
+def _expected_gaze_distribution():
+    section_ts = _gaze_in_section()
+    even = section_ts % 2 < 1
+    early = section_ts < 30
+    return [
+        ["total_gaze_point_count", str(len(section_ts))],
+        ["surface_name", "gaze_count"],
+        ["even", str(np.count_nonzero(even))],
+        ["early", str(np.count_nonzero(early))],
+        ["hidden", "0"],
+        ["not_on_any_surface", str(np.count_nonzero(~even & ~early))],
+    ]
+
+
+def test_surface_gaze_distribution_merges_surface_timestamps(exporter):
+    assert exporter.create_metrics_dir()
+    exporter.save_surface_gaze_distribution_to_file(
+        [np.array([10.0, 10.5, 11.0]), np.array([10.5, 11.0, 11.5]), np.array([])]
+    )
+    num_gaze = len(_gaze_in_section())
+    assert _gaze_distribution(exporter) == [
+        ["total_gaze_point_count", str(num_gaze)],
+        ["surface_name", "gaze_count"],
+        ["even", "3"],
+        ["early", "3"],
+        ["hidden", "0"],
+        ["not_on_any_surface", str(num_gaze - 4)],
+    ]
+
+
+def test_serial_export_maps_each_surface_once(exporter):
+    for _ in exporter.save_surface_statisics_to_file():
+        pass
+    assert _gaze_distribution(exporter) == _expected_gaze_distribution()
+    for surface in exporter.surfaces:
+        num_gaze_mappings = sum(
+            events is exporter.gaze_positions for events in surface.mapped_events
+        )
+        assert num_gaze_mappings == 1
+
+
+def test_export_pool_merges_surface_tasks(exporter, monkeypatch):
+    # IPC logging requires a running Player
+    monkeypatch.setattr(
+        background_helper, "IPC_Logging_Task_Proxy", background_helper.Task_Proxy
+    )
+    pool = background_tasks.Background_Export_Pool(
+        exporter, mp.get_context("fork"), num_workers=2
+    )
+    assert len(pool._running) == 2
+    while not pool.completed:
+        for _ in pool.fetch():
+            pass
+    assert _gaze_distribution(exporter) == _expected_gaze_distribution()
+
+
+def test_canceled_export_pool_skips_gaze_distribution(exporter, monkeypatch):
+    monkeypatch.setattr(
+        background_helper, "IPC_Logging_Task_Proxy", background_helper.Task_Proxy
+    )
+    pool = background_tasks.Background_Export_Pool(
+        exporter, mp.get_context("fork"), num_workers=2
+    )
+    pool.cancel()
+    assert pool.canceled
+    for _ in pool.fetch():
+        pass
+    path = os.path.join(exporter.metrics_dir, "surface_gaze_distribution.csv")
+    assert not os.path.exists(path)
@@ -0,0 +1,83 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import random
+
+from surface_tracker.cache import Cache, Ranges
+from surface_tracker.marker_cache_store import Marker_Cache_Store
+
+
+def _ranges_from_list(values):
+    ranges = []
+    for idx, value in enumerate(values):
+        if not value:
+            continue
+        if ranges and ranges[-1][1] == idx - 1:
+            ranges[-1][1] = idx
+        else:
+            ranges.append([idx, idx])
+    return ranges
+
+
+def test_ranges_add_and_remove():
+    rng = random.Random(0)
+    ranges = Ranges()
+    values = [False] * 50
+    for _ in range(500):
+        idx = rng.randrange(len(values))
+        value = rng.random() < 0.7
+        values[idx] = value
+        if value:
+            ranges.add(idx)
+        else:
+            ranges.remove(idx)
+        assert ranges.as_list() == _ranges_from_list(values)
+        assert (idx in ranges) == value
+
+    assert Ranges.from_mask(values).as_list() == _ranges_from_list(values)
+
+
+def test_cache_update():
+    cache = Cache([None, [], None, ["marker"], None])
+    assert cache.visited_ranges == [[1, 1], [3, 3]]
+    assert cache.positive_ranges == [[3, 3]]
+
+    cache.update(2, ["marker"])
+    cache.update(0, [])
+    assert cache.visited_ranges == [[0, 3]]
+    assert cache.positive_ranges == [[2, 3]]
+
+    cache.update(3, [], force=True)
+    assert cache.positive_ranges == [[2, 2]]
+
+
+def test_marker_cache_store_appends(tmpdir):
+    store = Marker_Cache_Store(str(tmpdir))
+    assert store.load() is None
+
+    store.reset({"num_frames": 3})
+    store.append([(0, []), (2, [[1, 2]])])
+    store.append([(1, [[3, 4]])])
+    meta, markers_by_frame = store.load()
+    assert meta["num_frames"] == 3
+    assert markers_by_frame == {0: [], 1: [[3, 4]], 2: [[1, 2]]}
+
+    # simulate a crash while appending
+    with open(store.records_path, "ab") as fh:
+        fh.write(b"\x92\x03")
+    _, markers_by_frame = store.load()
+    assert len(markers_by_frame) == 3
+    store.append([(3, [])])
+    _, markers_by_frame = store.load()
+    assert markers_by_frame[3] == []
+
+    store.reset({"num_frames": 3})
+    _, markers_by_frame = store.load()
+    assert markers_by_frame == {}
@@ -0,0 +1,56 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import os
+
+import numpy as np
+import pytest
+
+from surface_tracker.cache import Cache
+from surface_tracker.location_cache_store import Location_Cache_Store
+from surface_tracker.surface import Surface_Location
+
+
+def _detected_location(value):
+    trans = np.full((3, 3), float(value))
+    return Surface_Location(True, trans, trans + 1, trans + 2, trans + 3, value)
+
+
+def test_location_cache_store_roundtrip(tmpdir):
+    store = Location_Cache_Store(str(tmpdir))
+    assert store.load("key", 3) is None
+
+    location_cache = Cache(
+        [_detected_location(2), Surface_Location(detected=False), _detected_location(5)]
+    )
+    assert location_cache.complete
+    store.save("key", location_cache)
+
+    loaded = store.load("key", 3)
+    assert loaded.positive_ranges == location_cache.positive_ranges
+    assert loaded.complete
+    assert not loaded[1]
+    assert loaded[2].num_detected_markers == 5
+    assert np.array_equal(loaded[2].surf_to_img_trans, np.full((3, 3), 8.0))
+    assert store.load("key", 4) is None, "Caches of other recordings must not load"
+
+
+def test_location_cache_store_partial_and_unused(tmpdir):
+    store = Location_Cache_Store(str(tmpdir))
+    partial_cache = Cache([_detected_location(1), None])
+    assert not partial_cache.complete
+    with pytest.raises(ValueError):
+        store.save("partial", partial_cache)
+    assert store.load("partial", 2) is None
+
+    store.save("old", Cache([Surface_Location(detected=False)]))
+    store.save("new", Cache([Surface_Location(detected=False)]))
+    store.remove_unused(["new"])
+    assert sorted(os.listdir(str(tmpdir))) == ["new.npz"]
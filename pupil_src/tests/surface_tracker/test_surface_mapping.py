@@ -0,0 +1,99 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import types
+
+import cv2
+import numpy as np
+import pytest
+
+import camera_models
+import file_methods as fm
+import player_methods as pm
+from surface_tracker.surface import Surface
+
+
+@pytest.fixture
+def surface():
+    surface = types.SimpleNamespace()
+    for name in (
+        "map_to_surf",
+        "_perspective_transform_points",
+        "map_gaze_and_fixation_events",
+        "map_gaze_and_fixation_events_by_frame",
+    ):
+        setattr(surface, name, types.MethodType(getattr(Surface, name), surface))
+    return surface
+
+
+@pytest.fixture
+def camera_model():
+    return camera_models.Radial_Dist_Camera(
+        "camera",
+        (1280, 720),
+        [[800.0, 0.0, 640.0], [0.0, 800.0, 360.0], [0.0, 0.0, 1.0]],
+        [[-0.3, 0.1, 0.001, 0.001, -0.02]],
+    )
+
+
+def _random_trans_matrix(rng):
+    img_corners = np.float32([[100, 100], [1100, 120], [1050, 650], [80, 600]])
+    img_corners += rng.uniform(-30, 30, (4, 2)).astype(np.float32)
+    surf_corners = np.float32([[0, 0], [1, 0], [1, 1], [0, 1]])
+    return cv2.getPerspectiveTransform(img_corners, surf_corners).astype(np.float64)
+
+
+def test_map_events_by_frame_matches_per_frame_mapping(surface, camera_model):
+    rng = np.random.default_rng(0)
+    world_ts = np.cumsum(rng.uniform(0.03, 0.04, 100))
+    gaze_ts = np.sort(rng.uniform(world_ts[0], world_ts[-1], 1000))
+    gaze = pm.Bisector(
+        [
+            fm.Serialized_Dict(
+                python_dict={
+                    "topic": "gaze.3d.01.",
+                    "norm_pos": tuple(rng.uniform(-0.1, 1.1, 2)),
+                    "confidence": float(rng.uniform()),
+                    "timestamp": float(ts),
+                }
+            )
+            for ts in gaze_ts
+        ],
+        gaze_ts,
+    )
+    frame_indices = range(len(world_ts))[10:90]
+    trans_matrices = [
+        _random_trans_matrix(rng) if rng.uniform() < 0.8 else None
+        for _ in frame_indices
+    ]
+
+    mapped = surface.map_gaze_and_fixation_events_by_frame(
+        frame_indices, trans_matrices, world_ts, gaze, camera_model
+    )
+    assert len(mapped) == len(frame_indices)
+    for frame_idx, trans_matrix, mapped_events in zip(
+        frame_indices, trans_matrices, mapped
+    ):
+        if trans_matrix is None:
+            assert mapped_events == []
+            continue
+        window = pm.enclosing_window(world_ts, frame_idx)
+        expected_events = surface.map_gaze_and_fixation_events(
+            gaze.by_ts_window(window), camera_model, trans_matrix=trans_matrix
+        )
+        assert len(mapped_events) == len(expected_events)
+        for event, expected in zip(mapped_events, expected_events):
+            assert event.keys() == expected.keys()
+            assert event["on_surf"] == expected["on_surf"]
+            assert event["base_data"] == expected["base_data"]
+            assert np.allclose(event["norm_pos"], expected["norm_pos"])
+
+    on_surf_count = sum(e["on_surf"] for events in mapped for e in events)
+    assert mapped.on_surf.sum() == on_surf_count
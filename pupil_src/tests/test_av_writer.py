@@ -0,0 +1,58 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import os
+from types import SimpleNamespace
+
+import av
+import numpy as np
+
+from av_writer import MPEG_Writer, concatenate_videos
+
+FRAME_RATE = 30.0
+START_TIME = 100.0
+
+
+def _write_segment(path, timestamps):
+    writer = MPEG_Writer(path, start_time_synced=START_TIME)
+    for idx, ts in enumerate(timestamps):
+        img = np.full((48, 64, 3), idx * 10 % 256, dtype=np.uint8)
+        frame = SimpleNamespace(
+            img=img, timestamp=ts, width=64, height=48, yuv_buffer=None, index=idx
+        )
+        writer.write_video_frame(frame)
+    writer.close(timestamp_export_format=None)
+
+
+def _video_pts(path):
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        return sorted(
+            frame.pts * stream.time_base for frame in container.decode(stream)
+        )
+
+
+def test_concatenate_videos_keeps_frames_and_timing(tmp_path):
+    timestamps = START_TIME + np.arange(90) / FRAME_RATE
+    segment_paths = [str(tmp_path / f"{idx:03d}.mp4") for idx in range(3)]
+    for path, segment_timestamps in zip(segment_paths, np.split(timestamps, 3)):
+        _write_segment(path, segment_timestamps)
+
+    out_path = str(tmp_path / "world.mp4")
+    concatenate_videos(segment_paths, out_path, START_TIME)
+
+    assert os.path.isfile(out_path)
+    pts = np.array(_video_pts(out_path), dtype=float)
+    segment_pts = [pts for path in segment_paths for pts in _video_pts(path)]
+    assert len(pts) == len(timestamps)
+    # the muxer can change the time base of the stream
+    np.testing.assert_allclose(pts, np.array(segment_pts, dtype=float), atol=1e-4)
+    # all segments use the same start time, such that pts continue each other
+    np.testing.assert_allclose(pts, timestamps - START_TIME, atol=1e-4)
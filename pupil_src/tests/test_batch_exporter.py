@@ -0,0 +1,100 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import os
+
+import pytest
+
+from batch_exporter import (
+    Batch_Export_Checkpoints,
+    Batch_Export_Job,
+    Headless_Batch_Exporter,
+    default_worker_count,
+)
+
+
+def _fake_export(
+    rec_dir,
+    user_dir,
+    min_data_confidence,
+    start_frame,
+    end_frame,
+    plugin_initializers,
+    out_file_path,
+):
+    if rec_dir.endswith("broken"):
+        raise ValueError("broken recording")
+    for frame_idx in range(end_frame):
+        yield "Exporting", frame_idx + 1
+    with open(out_file_path, "w") as fh:
+        fh.write(rec_dir)
+
+
+def _export(jobs, checkpoint_dir):
+    exporter = Headless_Batch_Exporter(
+        jobs,
+        Batch_Export_Checkpoints(checkpoint_dir),
+        user_dir=checkpoint_dir,
+        plugin_initializers=[],
+        num_workers=2,
+        export_function=_fake_export,
+    )
+    exporter.poll_interval = 0.01
+    return exporter.run()
+
+
+@pytest.fixture
+def jobs(tmpdir):
+    return [
+        Batch_Export_Job(name, str(tmpdir / f"{name}.mp4"), 10)
+        for name in ("rec_1", "rec_2", "broken", "rec_3")
+    ]
+
+
+def test_batch_export_resumes_from_checkpoints(jobs, tmpdir):
+    report = _export(jobs, str(tmpdir))
+    assert report.num_completed == 3
+    assert report.num_failed == 1
+    assert report.num_skipped == 0
+    assert report.num_frames == 30
+    assert report.recordings_per_hour > 0
+    assert all(os.path.isfile(job.out_file_path) for job in jobs if job != jobs[2])
+
+    # the failed recording is exported again, the others are skipped
+    report = _export(jobs, str(tmpdir))
+    assert (report.num_completed, report.num_failed, report.num_skipped) == (0, 1, 3)
+
+    # recordings are exported again if their settings or results changed
+    os.remove(jobs[0].out_file_path)
+    jobs[1] = jobs[1]._replace(end_frame=5)
+    report = _export(jobs, str(tmpdir))
+    assert (report.num_completed, report.num_failed, report.num_skipped) == (2, 1, 1)
+    assert report.num_frames == 15
+
+
+def test_batch_export_checkpoints_are_persistent(jobs, tmpdir):
+    checkpoints = Batch_Export_Checkpoints(str(tmpdir))
+    for job in jobs:
+        open(job.out_file_path, "w").close()
+    checkpoints.mark_completed(jobs[0], num_frames=10, duration=1.0)
+    checkpoints.mark_failed(jobs[1], ValueError("failed"))
+
+    checkpoints = Batch_Export_Checkpoints(str(tmpdir))
+    assert checkpoints.is_completed(jobs[0])
+    assert not checkpoints.is_completed(jobs[1])
+    assert not checkpoints.is_completed(jobs[2])
+
+    checkpoints.clear()
+    assert not Batch_Export_Checkpoints(str(tmpdir)).is_completed(jobs[0])
+
+
+def test_default_worker_count_is_bounded_by_memory():
+    assert default_worker_count() >= 1
+    assert default_worker_count(memory_per_worker=2 ** 60) == 1
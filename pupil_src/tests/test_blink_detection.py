@@ -0,0 +1,132 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import numpy as np
+import pytest
+
+from blink_detection import blink_ranges, classify_filter_response
+
+
+def classify_filter_response_reference(
+    filter_response, onset_confidence_threshold, offset_confidence_threshold
+):
+    """Original classification of `Offline_Blink_Detection.recalculate`"""
+    onsets = filter_response > onset_confidence_threshold
+    offsets = filter_response < -offset_confidence_threshold
+
+    response_classification = np.zeros(filter_response.shape)
+    response_classification[onsets] = 1.0
+    response_classification[offsets] = -1.0
+    return response_classification
+
+
+def blink_ranges_reference(response_classification):
+    """
+    Original state machine of `Offline_Blink_Detection.consolidate_classifications`
+
+    Returns (start, end) index pairs of the blinks.
+    """
+    ranges = []
+    start_idx = None
+    state = "no blink"  # others: 'blink started' | 'blink ending'
+
+    for idx, classification in enumerate(response_classification):
+        if state == "no blink" and classification > 0:
+            start_idx = idx
+            state = "blink started"
+        elif state == "blink started" and classification == -1:
+            state = "blink ending"
+        elif state == "blink ending" and classification >= 0:
+            ranges.append((start_idx, idx - 1))  # blink ended previously
+            if classification > 0:
+                start_idx = 0
+                state = "blink started"
+            else:
+                start_idx = None
+                state = "no blink"
+
+    if state == "blink ending":
+        # only finish blink if it was already ending
+        ranges.append((start_idx, idx))  # idx is the last possible idx
+    return ranges
+
+
+def _ranges(response_classification):
+    start_idc, end_idc = blink_ranges(response_classification)
+    return list(zip(start_idc.tolist(), end_idc.tolist()))
+
+
+def _synthetic_classification(seed, num_runs=300):
+    """Random runs of classifications, without onsets directly after offsets"""
+    rng = np.random.default_rng(seed)
+    runs = []
+    for _ in range(num_runs):
+        value = rng.choice([-1.0, 0.0, 1.0])
+        if value > 0 and runs and runs[-1][-1] < 0:
+            runs.append(np.zeros(rng.integers(1, 5)))
+        runs.append(np.full(rng.integers(1, 20), value))
+    return np.concatenate(runs)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_classify_filter_response_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    filter_response = rng.uniform(-1.5, 1.5, size=1000)
+    # responses exactly at the thresholds are neither onsets nor offsets
+    filter_response[::10] = 0.5
+    filter_response[5::10] = -0.4
+    for onset_threshold, offset_threshold in ((0.5, 0.5), (0.2, 0.4), (1.0, 0.0)):
+        assert np.array_equal(
+            classify_filter_response(
+                filter_response, onset_threshold, offset_threshold
+            ),
+            classify_filter_response_reference(
+                filter_response, onset_threshold, offset_threshold
+            ),
+        )
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_blink_ranges_match_reference(seed):
+    response_classification = _synthetic_classification(seed)
+    ranges = _ranges(response_classification)
+    assert ranges
+    assert ranges == blink_ranges_reference(response_classification)
+
+
+@pytest.mark.parametrize(
+    "response_classification, expected",
+    [
+        ([], []),
+        ([0, 0, -1, -1, 0], []),
+        ([0, 1, 1, 0, -1, -1, 0], [(1, 5)]),
+        # unfinished blinks are discarded
+        ([1, 1, 0, 0], []),
+        # blinks that end with the data are finished
+        ([0, 1, -1, -1], [(1, 3)]),
+        # further onsets do not restart a blink, the first run of offsets ends it
+        ([1, 0, 1, -1, 0, -1, 0], [(0, 3)]),
+    ],
+)
+def test_blink_ranges(response_classification, expected):
+    response_classification = np.array(response_classification, dtype=float)
+    assert _ranges(response_classification) == expected
+    assert blink_ranges_reference(response_classification) == expected
+
+
+def test_back_to_back_blinks_start_at_their_onset():
+    response_classification = np.array([0, 1, 0, -1, 1, 1, -1, -1, 1, -1], dtype=float)
+    assert _ranges(response_classification) == [(1, 3), (4, 7), (8, 9)]
+    # the original state machine started these blinks at the first sample
+    assert blink_ranges_reference(response_classification) == [
+        (1, 3),
+        (0, 7),
+        (0, 9),
+    ]
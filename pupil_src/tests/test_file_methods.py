@@ -0,0 +1,156 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import os
+
+import numpy as np
+import pytest
+
+import file_methods as fm
+
+
+@pytest.fixture
+def pldata_dir(tmpdir):
+    with fm.PLData_Writer(str(tmpdir), "gaze") as writer:
+        for idx in range(50):
+            datum = {
+                "topic": "gaze.3d.01." if idx % 2 else "gaze.2d.0.",
+                "timestamp": float(idx),
+                "confidence": idx / 50,
+                "norm_pos": (idx / 100, 1 - idx / 100),
+            }
+            writer.append(datum)
+    return str(tmpdir)
+
+
+def test_pldata_columns_build_and_reuse(pldata_dir):
+    columns = fm.load_pldata_columns(pldata_dir, "gaze")
+    assert columns is not None
+    assert np.allclose(columns.column("timestamp"), np.arange(50))
+    assert np.allclose(columns.column("confidence"), np.arange(50) / 50)
+    assert np.allclose(columns.column("norm_pos")[:, 0], np.arange(50) / 100)
+    assert np.isnan(columns.column("diameter")).all()
+    assert (columns.column("id") == -1).all()
+    assert list(columns.topics[:2]) == ["gaze.2d.0.", "gaze.3d.01."]
+
+    meta_mtime = os.stat(os.path.join(pldata_dir, "gaze_columns", "meta")).st_mtime
+    columns = fm.load_pldata_columns(pldata_dir, "gaze")
+    reloaded_mtime = os.stat(os.path.join(pldata_dir, "gaze_columns", "meta")).st_mtime
+    assert meta_mtime == reloaded_mtime, "Valid sidecar must not be rebuilt"
+
+
+def test_pldata_columns_outdated(pldata_dir):
+    fm.load_pldata_columns(pldata_dir, "gaze")
+    with fm.PLData_Writer(pldata_dir, "gaze") as writer:
+        writer.append({"topic": "gaze", "timestamp": 0.0, "confidence": 1.0})
+
+    assert fm.load_pldata_columns(pldata_dir, "gaze", build=False) is None
+    columns = fm.load_pldata_columns(pldata_dir, "gaze")
+    assert len(columns.column("confidence")) == 1
+
+
+def test_lazy_pldata_matches_eager(pldata_dir):
+    eager = fm.load_pldata_file(pldata_dir, "gaze")
+    lazy = fm.load_pldata_file(pldata_dir, "gaze", lazy=True)
+    assert isinstance(lazy.data, fm.Lazy_Serialized_Dict_Sequence)
+    assert len(lazy.data) == len(eager.data)
+    assert list(lazy.topics) == list(eager.topics)
+    for lazy_datum, eager_datum in zip(lazy.data, eager.data):
+        assert lazy_datum.serialized == eager_datum.serialized
+
+    window = lazy.data[10:20][::-1]
+    assert [d["timestamp"] for d in window] == list(range(19, 9, -1))
+    assert np.allclose(window.column("timestamp"), np.arange(19, 9, -1))
+
+
+def test_load_pldata_file_missing(tmpdir):
+    assert fm.load_pldata_columns(str(tmpdir), "gaze") is None
+    pldata = fm.load_pldata_file(str(tmpdir), "gaze", lazy=True)
+    assert len(pldata.data) == 0
+
+
+def test_pldata_writer_offsets(pldata_dir):
+    offsets = np.load(os.path.join(pldata_dir, "gaze_offsets.npy"))
+    columns = fm.PLData_Columns.build(pldata_dir, "gaze")
+    assert np.array_equal(offsets, columns.offsets)
+
+
+@pytest.mark.parametrize("remove_offsets", [False, True])
+def test_load_pldata_window(pldata_dir, remove_offsets):
+    if remove_offsets:
+        os.remove(os.path.join(pldata_dir, "gaze_offsets.npy"))
+
+    window = fm.load_pldata_window(pldata_dir, "gaze", (10, 20))
+    assert list(window.timestamps) == list(range(10, 20))
+    assert [d["timestamp"] for d in window.data] == list(range(10, 20))
+    assert window.topics[0] == "gaze.2d.0."
+
+    assert len(fm.load_pldata_window(pldata_dir, "gaze", (100, 200)).data) == 0
+    assert len(fm.load_pldata_window(pldata_dir, "gaze", (-1, 100)).data) == 50
+
+
+def test_extract_fields():
+    data = [
+        fm.Serialized_Dict(
+            python_dict={"confidence": 0.5, "circle_3d": {"normal": (0, 0, 1)}}
+        ),
+        {"confidence": 1.0},
+    ]
+    fields = fm.extract_fields(data, ("confidence", "circle_3d.normal"))
+    assert fields["confidence"].tolist() == [0.5, 1.0]
+    assert fields["circle_3d.normal"][0].tolist() == [0, 0, 1]
+    assert np.isnan(fields["circle_3d.normal"][1]).all()
+
+    ids = fm.extract_field(data, "id", dtype=np.int64, default=-1)
+    assert ids.dtype == np.int64 and ids.tolist() == [-1, -1]
+
+
+def test_extract_fields_from_columns(pldata_dir):
+    lazy = fm.load_pldata_file(pldata_dir, "gaze", lazy=True)
+    eager = fm.load_pldata_file(pldata_dir, "gaze")
+    for field in ("confidence", "norm_pos"):
+        assert np.allclose(
+            fm.extract_field(lazy.data[::-1], field),
+            fm.extract_field(list(eager.data)[::-1], field),
+        )
+
+
+def test_serialized_dict_lru_cache():
+    cache = fm.Serialized_Dict_Cache(max_bytes=0)
+    original_cache = fm.Serialized_Dict._cache
+    fm.Serialized_Dict._cache = cache
+    try:
+        data = [fm.Serialized_Dict(python_dict={"id": idx}) for idx in range(4)]
+        cache.resize(sum(len(d.serialized) for d in data[:3]))
+
+        for datum in data[:3]:
+            datum["id"]
+        assert cache.stats["misses"] == 3 and cache.stats["evictions"] == 0
+
+        data[0]["id"]  # mark as most recently used
+        data[3]["id"]  # evicts data[1]
+        assert cache.stats["hits"] == 1 and cache.stats["evictions"] == 1
+        assert data[1]._data is None
+        assert data[0]._data is not None
+
+        cache.resize(0)
+        assert len(cache) == 1, "Most recent entry must be kept"
+        assert data[3]["id"] == 3
+        assert cache.stats["hits"] == 2
+
+        # only accesses to entries of the cache count as hits
+        fm.Serialized_Dict._cache = original_cache
+        untracked = fm.Serialized_Dict(python_dict={"id": 4})
+        untracked["id"]
+        fm.Serialized_Dict._cache = cache
+        assert untracked["id"] == 4
+        assert cache.stats["hits"] == 2 and cache.stats["misses"] == 4
+    finally:
+        fm.Serialized_Dict._cache = original_cache
@@ -0,0 +1,371 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+from collections import deque
+from types import SimpleNamespace
+
+import msgpack
+import numpy as np
+import pytest
+
+import file_methods as fm
+from camera_models import Camera_Model
+from fixation_detector import (
+    FixationDetectionMethod,
+    Fixation_Result_Factory,
+    Incremental_Dispersion,
+    Offline_Fixation_Detector,
+    can_use_3d_gaze_mapping,
+    detect_fixations,
+    detect_fixations_in_chunk,
+    fixation_chunks,
+    gaze_dispersion,
+    merge_fixation_chunks,
+    vector_dispersion,
+)
+
+WORLD_RESOLUTION = (1280, 720)
+
+
+def synthetic_gaze(
+    duration_s=20.0, sampling_rate=240.0, seed=0, drift=0.0, use_3d=True
+):
+    """Serialized gaze alternating between fixations and saccades
+
+    Fixations drift by `drift` radians per sample. Confidence is random, such that
+    some samples are discarded by the detection.
+    """
+    rng = np.random.default_rng(seed)
+    timestamps = np.arange(0.0, duration_s, 1.0 / sampling_rate)
+    angles = np.empty((len(timestamps), 2))
+    idx = 0
+    target = np.zeros(2)
+    while idx < len(timestamps):
+        length = min(int(rng.uniform(0.1, 2.0) * sampling_rate), len(angles) - idx)
+        noise = rng.normal(scale=0.002, size=(length, 2))
+        drifts = np.cumsum(rng.normal(scale=drift, size=(length, 2)), axis=0)
+        angles[idx : idx + length] = target + drifts + noise
+        idx += length
+        target = rng.uniform(-0.4, 0.4, size=2)
+    gaze_points = np.column_stack(
+        (np.tan(angles[:, 0]), np.tan(angles[:, 1]), np.ones(len(angles)))
+    )
+    norm_pos = 0.5 + gaze_points[:, :2] / 2.0
+    gaze_points *= 500.0
+    confidences = rng.uniform(0.5, 1.0, size=len(timestamps))
+
+    gaze_data = []
+    for ts, point, pos, confidence in zip(
+        timestamps, gaze_points, norm_pos, confidences
+    ):
+        datum = {
+            "topic": "gaze.3d.01." if use_3d else "gaze.2d.0.",
+            "timestamp": float(ts),
+            "confidence": float(confidence),
+            "norm_pos": pos.tolist(),
+        }
+        if use_3d:
+            datum["gaze_point_3d"] = point.tolist()
+        gaze_data.append(msgpack.packb(datum, use_bin_type=True))
+    return gaze_data
+
+
+def synthetic_capture(duration_s=20.0):
+    return SimpleNamespace(
+        frame_size=WORLD_RESOLUTION,
+        intrinsics=Camera_Model.from_default("Pupil Cam1 ID2", WORLD_RESOLUTION),
+        timestamps=np.arange(0.0, duration_s, 1.0 / 30.0),
+    )
+
+
+def detect_fixations_reference(
+    capture, gaze_data, max_dispersion, min_duration, max_duration, min_data_confidence
+):
+    """Original implementation of `detect_fixations`
+
+    Recalculates the dispersion of the whole working queue for every step.
+    """
+    yield "Detecting fixations...", ()
+    gaze_data = (
+        fm.Serialized_Dict(msgpack_bytes=serialized) for serialized in gaze_data
+    )
+    gaze_data = [
+        datum for datum in gaze_data if datum["confidence"] > min_data_confidence
+    ]
+    if not gaze_data:
+        return "Fixation detection failed", ()
+
+    method = (
+        FixationDetectionMethod.GAZE_3D
+        if can_use_3d_gaze_mapping(gaze_data)
+        else FixationDetectionMethod.GAZE_2D
+    )
+    fixation_result = Fixation_Result_Factory()
+
+    working_queue = deque()
+    remaining_gaze = deque(gaze_data)
+
+    while remaining_gaze:
+        # check if working_queue contains enough data
+        if (
+            len(working_queue) < 2
+            or (working_queue[-1]["timestamp"] - working_queue[0]["timestamp"])
+            < min_duration
+        ):
+            datum = remaining_gaze.popleft()
+            working_queue.append(datum)
+            continue
+
+        # min duration reached, check for fixation
+        dispersion = gaze_dispersion(capture, working_queue, method)
+        if dispersion > max_dispersion:
+            # not a fixation, move forward
+            working_queue.popleft()
+            continue
+
+        left_idx = len(working_queue)
+
+        # minimal fixation found. collect maximal data
+        # to perform binary search for fixation end
+        while remaining_gaze:
+            datum = remaining_gaze[0]
+            if datum["timestamp"] > working_queue[0]["timestamp"] + max_duration:
+                break  # maximum data found
+            working_queue.append(remaining_gaze.popleft())
+
+        # check for fixation with maximum duration
+        dispersion = gaze_dispersion(capture, working_queue, method)
+        if dispersion <= max_dispersion:
+            fixation = fixation_result.from_data(
+                dispersion, method, working_queue, capture.timestamps
+            )
+            yield "Detecting fixations...", fixation
+            working_queue.clear()  # discard old Q
+            continue
+
+        slicable = list(working_queue)  # deque does not support slicing
+        right_idx = len(working_queue)
+
+        # binary search
+        while left_idx < right_idx - 1:
+            middle_idx = (left_idx + right_idx) // 2
+            dispersion = gaze_dispersion(
+                capture,
+                slicable[: middle_idx + 1],
+                method,
+            )
+            if dispersion <= max_dispersion:
+                left_idx = middle_idx
+            else:
+                right_idx = middle_idx
+
+        # left_idx-1 is last valid base datum
+        final_base_data = slicable[:left_idx]
+        to_be_placed_back = slicable[left_idx:]
+        dispersion_result = gaze_dispersion(capture, final_base_data, method)
+
+        fixation = fixation_result.from_data(
+            dispersion_result, method, final_base_data, capture.timestamps
+        )
+        yield "Detecting fixations...", fixation
+        working_queue.clear()  # clear queue
+        remaining_gaze.extendleft(reversed(to_be_placed_back))
+
+    yield "Fixation detection complete", ()
+
+
+def _fixations(detector, gaze_data, max_duration, min_data_confidence=0.6):
+    args = (np.deg2rad(1.5), 0.08, max_duration, min_data_confidence)
+    return [
+        fixation
+        for _, fixation in detector(synthetic_capture(), gaze_data, *args)
+        if fixation
+    ]
+
+
+@pytest.mark.parametrize(
+    "seed, drift, max_duration, use_3d",
+    [
+        (0, 0.0, 1.0, True),
+        (1, 0.0002, 4.0, True),
+        (2, 0.0005, 2.0, True),
+        (3, 0.0002, 1.0, False),
+    ],
+)
+def test_detect_fixations_matches_reference(seed, drift, max_duration, use_3d):
+    gaze_data = synthetic_gaze(seed=seed, drift=drift, use_3d=use_3d)
+    fixations = _fixations(detect_fixations, gaze_data, max_duration)
+    assert fixations
+    assert fixations == _fixations(detect_fixations_reference, gaze_data, max_duration)
+
+
+def test_incremental_dispersion_matches_exact_dispersion():
+    rng = np.random.default_rng(0)
+    vectors = np.column_stack(
+        (rng.normal(scale=0.02, size=(300, 2)).cumsum(axis=0), np.ones(300))
+    )
+    window = Incremental_Dispersion(vectors)
+    for start in range(0, 250, 10):
+        for stop in range(start + 2, 300, 7):
+            exact = vector_dispersion(vectors[start:stop])
+            assert window.dispersion(start, stop) == exact
+            for max_dispersion in (exact, exact * 0.99, exact * 1.01, exact * 3):
+                is_within = window.is_within(start, stop, max_dispersion)
+                assert is_within == (exact <= max_dispersion)
+
+
+def _merged_fixations(gaze_data, num_chunks, max_duration, min_data_confidence=0.6):
+    """Detects fixations in chunks, as `Offline_Fixation_Detector` does in parallel"""
+    capture = synthetic_capture(duration_s=60.0)
+    timestamps = np.array(
+        [fm.Serialized_Dict(msgpack_bytes=datum)["timestamp"] for datum in gaze_data]
+    )
+    lookahead = max(10 * max_duration, 2.0)
+    chunks = fixation_chunks(timestamps, num_chunks, lookahead)
+    args = (np.deg2rad(1.5), 0.08, max_duration, min_data_confidence)
+    chunk_results = []
+    for start, stop in chunks:
+        chunk_data = gaze_data[start:stop]
+        *_, (_, result) = detect_fixations_in_chunk(capture, chunk_data, start, *args)
+        chunk_results.append(result)
+    chunk_starts = [start for start, _ in chunks]
+    merged = merge_fixation_chunks(
+        timestamps, chunk_starts, chunk_results, max_duration
+    )
+    assert merged is not None
+    fixation_result = Fixation_Result_Factory()
+    return [fixation_result.from_fixation(fixation) for fixation in merged]
+
+
+@pytest.mark.parametrize(
+    "seed, num_chunks, max_duration, use_3d",
+    [
+        (0, 4, 0.22, True),
+        (1, 3, 1.0, True),
+        (2, 6, 0.5, True),
+        (3, 4, 0.22, False),
+    ],
+)
+def test_merged_fixation_chunks_match_sequential_detection(
+    seed, num_chunks, max_duration, use_3d
+):
+    gaze_data = synthetic_gaze(duration_s=60.0, seed=seed, use_3d=use_3d)
+    sequential = [
+        fixation
+        for _, fixation in detect_fixations(
+            synthetic_capture(duration_s=60.0),
+            gaze_data,
+            np.deg2rad(1.5),
+            0.08,
+            max_duration,
+            0.6,
+        )
+        if fixation
+    ]
+    assert sequential
+    assert _merged_fixations(gaze_data, num_chunks, max_duration) == sequential
+
+
+def test_detection_chunk_yields_while_detecting(monkeypatch):
+    gaze_data = synthetic_gaze(duration_s=20.0, seed=0, use_3d=True)
+    capture = synthetic_capture(duration_s=20.0)
+    args = (capture, gaze_data, 0, np.deg2rad(1.5), 0.08, 0.22, 0.6)
+    *_, (_, expected) = detect_fixations_in_chunk(*args)
+    # yield after every fixation, such that the pool can stop the task in between
+    monkeypatch.setattr("fixation_detector.CHUNK_YIELD_INTERVAL", 0.0)
+    *intermediate, (_, result) = detect_fixations_in_chunk(*args)
+    assert len(intermediate) > len(expected["fixations"])
+    assert not any(datum for _, datum in intermediate)
+    assert result.keys() == expected.keys()
+    assert [fixation[:2] for fixation in result["fixations"]] == [
+        fixation[:2] for fixation in expected["fixations"]
+    ]
+    assert np.array_equal(result["valid_idc"], expected["valid_idc"])
+
+
+def _offline_detector(rec_dir, gaze_token="gaze", max_dispersion=1.5):
+    """Offline_Fixation_Detector without user interface and gaze listener"""
+    capture = synthetic_capture()
+    detector = Offline_Fixation_Detector.__new__(Offline_Fixation_Detector)
+    detector.g_pool = SimpleNamespace(
+        app="exporter",
+        rec_dir=rec_dir,
+        capture=capture,
+        timestamps=capture.timestamps,
+        min_data_confidence=0.6,
+        notifications=[],
+        delayed_notifications={},
+    )
+    detector._gaze_changed_listener = SimpleNamespace(current_token=gaze_token)
+    detector.max_dispersion = max_dispersion
+    detector.min_duration = 80
+    detector.max_duration = 220
+    detector.bg_task = None
+    detector.chunk_tasks = []
+    detector.chunk_results = []
+    detector.fixation_data = deque()
+    detector.fixation_start_ts = deque()
+    detector.fixation_stop_ts = deque()
+    detector._detection_key = None
+    return detector
+
+
+def _detect_and_save(detector, seed=0):
+    detector._detection_key = detector._offline_data_key()
+    args = (np.deg2rad(detector.max_dispersion), 0.08, 0.22, 0.6)
+    for _, result in detect_fixations(
+        detector.g_pool.capture, synthetic_gaze(seed=seed), *args
+    ):
+        if result:
+            serialized, start_ts, stop_ts = result
+            detector.fixation_data.append(fm.Serialized_Dict(msgpack_bytes=serialized))
+            detector.fixation_start_ts.append(start_ts)
+            detector.fixation_stop_ts.append(stop_ts)
+    detector._save_offline_data()
+
+
+def test_offline_data_round_trip(tmp_path):
+    saved = _offline_detector(str(tmp_path))
+    _detect_and_save(saved)
+    assert saved.fixation_data
+
+    loaded = _offline_detector(str(tmp_path))
+    assert loaded._load_offline_data()
+    assert [f.serialized for f in loaded.fixation_data] == [
+        f.serialized for f in saved.fixation_data
+    ]
+    assert list(loaded.fixation_start_ts) == list(saved.fixation_start_ts)
+    assert list(loaded.fixation_stop_ts) == list(saved.fixation_stop_ts)
+    assert len(loaded.g_pool.fixations) == len(saved.fixation_data)
+
+
+def test_offline_data_is_invalidated_by_other_key(tmp_path):
+    _detect_and_save(_offline_detector(str(tmp_path)))
+    assert not _offline_detector(str(tmp_path), gaze_token="other")._load_offline_data()
+    assert not _offline_detector(str(tmp_path), max_dispersion=2.0)._load_offline_data()
+    assert _offline_detector(str(tmp_path))._load_offline_data()
+
+
+def test_interrupted_save_invalidates_offline_data(tmp_path, monkeypatch, caplog):
+    _detect_and_save(_offline_detector(str(tmp_path)))
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+
+    # the data of the new detection is written, but not its stop timestamps
+    monkeypatch.setattr(np, "save", crash)
+    detector = _offline_detector(str(tmp_path), max_dispersion=2.0)
+    _detect_and_save(detector, seed=1)
+    monkeypatch.undo()
+
+    assert "Could not save detected fixations: disk full" in caplog.text
+    assert detector.fixation_data
+    assert not _offline_detector(str(tmp_path))._load_offline_data()
+    assert not _offline_detector(str(tmp_path), max_dispersion=2.0)._load_offline_data()
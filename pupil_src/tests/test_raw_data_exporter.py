@@ -8,8 +8,13 @@ Lesser General Public License (LGPL v3.0).
 See COPYING and COPYING.LESSER for license details.
 ---------------------------------------------------------------------------~(*)
 """
+import csv
+import io
+
+import numpy as np
 import pytest
 
+import file_methods as fm
 from raw_data_exporter import Pupil_Positions_Exporter
 from raw_data_exporter import Gaze_Positions_Exporter
 
@@ -52,6 +57,74 @@ def test_gaze_positions_exporter_pi():
     )
 
 
+def _test_columnar_exporter(exporter, positions):
+    data = [fm.Serialized_Dict(python_dict=datum) for datum in positions]
+    world_indices = np.arange(len(data)) + 100
+
+    expected_csv = io.StringIO(newline="")
+    dict_writer = csv.DictWriter(expected_csv, fieldnames=exporter.csv_export_labels())
+    dict_writer.writeheader()
+    for datum, world_index in zip(data, world_indices):
+        dict_writer.writerow(exporter.dict_export(datum, world_index))
+
+    columns = exporter.columns_export(data, world_indices)
+    assert tuple(columns.keys()) == exporter.csv_export_labels()
+    assert all(len(column) == len(data) for column in columns.values())
+
+    actual_csv = io.StringIO(newline="")
+    exporter.csv_block_size = 2
+    exporter.csv_write_columns(actual_csv, columns)
+    assert actual_csv.getvalue() == expected_csv.getvalue()
+    return columns
+
+
+def test_pupil_positions_columnar_export():
+    pupil_2d = {
+        key: PUPIL_CAPTURE_PUPIL_POSITION_0[key]
+        for key in ("topic", "confidence", "timestamp", "norm_pos", "diameter", "id")
+    }
+    pupil_2d.update(method="2d c++", ellipse=PUPIL_CAPTURE_PUPIL_POSITION_0["ellipse"])
+    positions = [PUPIL_CAPTURE_PUPIL_POSITION_0, pupil_2d, pupil_2d]
+    _test_columnar_exporter(Pupil_Positions_Exporter(), positions)
+    # data without any 3d fields
+    _test_columnar_exporter(Pupil_Positions_Exporter(), positions[1:])
+
+
+def test_gaze_positions_columnar_export():
+    pupil_1 = PUPIL_CAPTURE_GAZE_POSITION_0["base_data"][1]
+    gaze_monocular = {
+        "topic": "gaze.3d.1.",
+        "eye_center_3d": (-41.02, 10.60, -34.50),
+        "gaze_normal_3d": (0.0082, 0.0179, 0.9998),
+        "gaze_point_3d": (-26.67, 87.20, 2124.33),
+        "confidence": pupil_1["confidence"],
+        "timestamp": pupil_1["timestamp"],
+        "base_data": [pupil_1],
+        "norm_pos": (0.5077714574008085, 0.39313176450355647),
+    }
+    positions = [
+        PUPIL_CAPTURE_GAZE_POSITION_0,
+        gaze_monocular,
+        PUPIL_INVISIBLE_GAZE_POSITION_0,
+        PUPIL_CAPTURE_GAZE_POSITION_0,
+    ]
+    columns = _test_columnar_exporter(Gaze_Positions_Exporter(), positions)
+    assert np.isnan(columns["eye_center0_3d_x"][1])
+    assert columns["eye_center1_3d_x"][1] == -41.02
+
+
+def test_columnar_export_npz(tmpdir):
+    exporter = Pupil_Positions_Exporter()
+    data = [fm.Serialized_Dict(python_dict=PUPIL_CAPTURE_PUPIL_POSITION_0)] * 3
+    columns = exporter.columns_export(data, np.arange(3))
+    exporter.columnar_export_write(columns, str(tmpdir), "npz")
+
+    with np.load(str(tmpdir / "pupil_positions.npz")) as arrays:
+        assert tuple(arrays.keys()) == exporter.csv_export_labels()
+        assert arrays["method"].tolist() == ["3d c++"] * 3
+        assert np.array_equal(arrays["model_id"], [14, 14, 14])
+
+
 PUPIL_CAPTURE_PUPIL_TIMESTAMP_0 = 18147.38145
 PUPIL_CAPTURE_PUPIL_POSITION_0 = {
     'topic': 'pupil.0',
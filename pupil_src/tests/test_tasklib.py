@@ -0,0 +1,216 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+import tasklib.background
+from tasklib.background.pool import WorkerPool
+from tasklib.background.ring_buffer import SharedRingBuffer
+
+
+def _count(start, stop, delay, shared_memory):
+    for value in range(start, stop):
+        time.sleep(delay)
+        shared_memory.progress = (value - start + 1) / (stop - start)
+        yield value
+
+
+def _arrays(sizes):
+    for size in sizes:
+        array = np.arange(size, dtype=np.float64)
+        yield {"label": size, "arrays": (array, array[::2].reshape(-1, 1))}
+
+
+def _pid(num_results, delay=0.0):
+    for _ in range(num_results):
+        time.sleep(delay)
+        yield os.getpid()
+
+
+def _fail():
+    raise RuntimeError("failure in background")
+    yield
+
+
+def _run(task, timeout=10):
+    if not task.started:
+        task.start()
+    deadline = time.monotonic() + timeout
+    while not task.ended:
+        assert time.monotonic() < deadline, "Task did not end in time"
+        task.update()
+        time.sleep(0.01)
+
+
+def test_group_yields_in_subtask_order():
+    # the first subtask is the slowest, such that later results need to be buffered
+    task = tasklib.background.create_group(
+        "count",
+        _count,
+        [(0, 5, 0.05), (5, 10, 0.0), (10, 12, 0.0)],
+        pass_shared_memory=True,
+        patches=[],
+        weights=[5, 5, 2],
+    )
+    results = []
+    task.add_observer("on_yield", results.append)
+    _run(task)
+    assert task.completed
+    assert results == list(range(12))
+    assert task.progress == pytest.approx(1.0)
+
+
+def test_group_exception_ends_group():
+    task = tasklib.background.create_group("fail", _fail, [(), ()], patches=[])
+    exceptions = []
+    task.add_observer("on_exception", exceptions.append)
+    _run(task)
+    assert not task.completed and task.canceled_or_killed
+    assert isinstance(exceptions[0], RuntimeError)
+
+
+def test_ring_buffer_pack_and_unpack():
+    ring_buffer = SharedRingBuffer(capacity=64 * 1024)
+    for size in (10, 1000, 5000, 3000, 8000, 6000):
+        array = np.random.default_rng(size).normal(size=size)
+        datum = ("label", {"array": array}, [array])
+        packed = ring_buffer.pack(datum)
+        # the list and the small array are pickled as usual
+        assert packed[2][0] is array
+        assert (packed[1]["array"] is array) == (array.nbytes < 4096)
+        unpacked = ring_buffer.unpack(packed)
+        assert unpacked[0] == "label"
+        assert np.array_equal(unpacked[1]["array"], array)
+
+
+def test_task_yields_arrays_through_ring_buffer():
+    # the buffer is smaller than all data, such that it is reused several times
+    sizes = [10, 1000, 4000, 20000, 3000, 100, 5000] * 3
+    task = tasklib.background.create(
+        "arrays", _arrays, args=(sizes,), patches=[], shared_buffer_size=128 * 1024
+    )
+    results = []
+    task.add_observer("on_yield", results.append)
+    _run(task)
+    assert task.completed
+    assert [result["label"] for result in results] == sizes
+    for size, result in zip(sizes, results):
+        array, strided = result["arrays"]
+        assert np.array_equal(array, np.arange(size))
+        assert np.array_equal(strided, np.arange(size)[::2].reshape(-1, 1))
+
+
+@pytest.fixture
+def worker_pool():
+    worker_pool = WorkerPool(num_workers=2, patches=[])
+    yield worker_pool
+    worker_pool.shutdown()
+
+
+def test_worker_pool_reuses_workers(worker_pool):
+    tasks = [worker_pool.create("pid", _pid, args=(3, 0.01)) for _ in range(5)]
+    results = [[] for _ in tasks]
+    for task, task_results in zip(tasks, results):
+        task.add_observer("on_yield", task_results.append)
+        task.start()
+    # only two tasks can run at once, the others wait for a free worker
+    assert sum(task.is_queued for task in tasks) == 3
+    for task in tasks:
+        _run(task)
+        assert task.completed
+
+    pids = {pid for task_results in results for pid in task_results}
+    assert all(len(task_results) == 3 for task_results in results)
+    assert len(pids) == 2 and os.getpid() not in pids
+
+
+def test_worker_pool_cancels_and_replaces_workers(worker_pool):
+    canceled = worker_pool.create("pid", _pid, args=(1000, 0.01))
+    # does not react to cancel requests within the grace period
+    killed = worker_pool.create("pid", _pid, args=(1, 5.0))
+    failed = worker_pool.create("fail", _fail)
+    for task in (canceled, killed):
+        task.start()
+    time.sleep(0.1)
+    canceled.cancel_gracefully()
+    killed.kill(grace_period=0.1)
+    _run(failed)
+    while not canceled.ended:
+        canceled.update()
+    assert canceled.canceled_or_killed and killed.canceled_or_killed
+    assert failed.canceled_or_killed
+
+    task = worker_pool.create("pid", _pid, args=(2,))
+    results = []
+    task.add_observer("on_yield", results.append)
+    _run(task)
+    assert task.completed and len(results) == 2
+
+
+@pytest.mark.parametrize("grace_period", [1.0, None])
+def test_worker_pool_kills_without_blocking_and_keeps_workers(
+    worker_pool, grace_period
+):
+    first_results = []
+    # tasks only notice the kill request when they yield
+    running = [worker_pool.create("pid", _pid, args=(1000, 0.5)) for _ in range(2)]
+    for task in running:
+        task.add_observer("on_yield", first_results.append)
+        _start_and_wait_for_results(task, first_results)
+    queued = [worker_pool.create("pid", _pid, args=(1000, 0.01)) for _ in range(2)]
+    for task in queued:
+        task.add_observer("on_yield", pytest.fail)
+        task.start()
+    assert all(task.is_queued for task in queued)
+
+    start_time = time.perf_counter()
+    for task in running + queued:
+        task.kill(grace_period=grace_period)
+    assert time.perf_counter() - start_time < 0.2
+    assert all(task.canceled_or_killed for task in running + queued)
+
+    # the workers stop the killed tasks and run the next ones without restarting
+    results = []
+    tasks = [worker_pool.create("pid", _pid, args=(1,)) for _ in range(2)]
+    for task in tasks:
+        task.add_observer("on_yield", results.append)
+        _run(task)
+        assert task.completed
+    assert set(results) <= set(first_results)
+
+
+def _start_and_wait_for_results(task, results, timeout=10):
+    num_results = len(results)
+    task.start()
+    deadline = time.monotonic() + timeout
+    while len(results) == num_results:
+        assert time.monotonic() < deadline, "Task did not yield in time"
+        task.update()
+        time.sleep(0.01)
+
+
+def test_group_runs_in_worker_pool(worker_pool):
+    task = tasklib.background.create_group(
+        "count",
+        _count,
+        [(0, 5, 0.01), (5, 10, 0.0), (10, 12, 0.0)],
+        pass_shared_memory=True,
+        worker_pool=worker_pool,
+    )
+    results = []
+    task.add_observer("on_yield", results.append)
+    _run(task)
+    assert task.completed
+    assert results == list(range(12))
+    assert task.progress == pytest.approx(1.0)
@@ -10,14 +10,17 @@ See COPYING and COPYING.LESSER for license details.
 """
 
 import logging
+import os
+import shutil
 from multiprocessing import cpu_count
 from types import SimpleNamespace
 
+import numpy as np
 import pytest
 
 import av
 from ..common import broken_data, multiple_data, single_data
-from video_capture.base_backend import NoMoreVideoError
+from video_capture.base_backend import EndofVideoError, NoMoreVideoError
 from video_capture.file_backend import Decoder, File_Source, OnDemandDecoder
 
 
@@ -63,3 +66,106 @@ def test_get_rec_set_name(single_fill_gaps):
     assert ("/foo", "eye0_timestamp") == single_fill_gaps.get_rec_set_name(
         "/foo/eye0_timestamp.npy"
     )
+
+
+GOP_SIZE = 10
+GAP_AFTER_FRAME = 15
+
+
+def _write_recording(rec_dir, num_frames=30):
+    """
+    Writes a video with a keyframe every GOP_SIZE frames. Its timestamps have a gap
+    after GAP_AFTER_FRAME frames, which is filled with virtual frames.
+    """
+    shutil.copy(os.path.join(os.path.dirname(single_data), "info.player.json"), rec_dir)
+    container = av.open(os.path.join(rec_dir, "eye0.mp4"), "w")
+    options = {"g": str(GOP_SIZE), "keyint_min": str(GOP_SIZE), "bf": "0"}
+    options["sc_threshold"] = "0"  # no keyframes on scene changes
+    stream = container.add_stream("libx264", rate=30, options=options)
+    stream.width, stream.height, stream.pix_fmt = 64, 48, "yuv420p"
+    for idx in range(num_frames):
+        img = np.full((48, 64, 3), idx * 8, dtype=np.uint8)
+        frame = av.VideoFrame.from_ndarray(img, format="bgr24")
+        frame.pts = idx
+        container.mux(stream.encode(frame))
+    container.mux(stream.encode())
+    container.close()
+
+    timestamps = 123456.7 + np.arange(num_frames) / 30
+    timestamps[GAP_AFTER_FRAME:] += 1.0
+    np.save(os.path.join(rec_dir, "eye0_timestamps.npy"), timestamps)
+    return os.path.join(rec_dir, "eye0.mp4")
+
+
+@pytest.fixture
+def seekable_source(tmp_path):
+    source_path = _write_recording(str(tmp_path))
+    file_source = File_Source(
+        SimpleNamespace(), source_path=source_path, fill_gaps=True
+    )
+    seeks = []
+    seek = file_source.video_stream.seek
+
+    def recording_seek(pts_position):
+        seeks.append(pts_position)
+        seek(pts_position)
+
+    file_source.video_stream.seek = recording_seek
+    file_source.seeks = seeks
+    return file_source
+
+
+def _lookup_index(file_source, container_frame_idx):
+    lookup = file_source.videoset.lookup
+    is_real = lookup.container_idx > -1
+    return int(
+        np.flatnonzero(is_real & (lookup.container_frame_idx == container_frame_idx))[0]
+    )
+
+
+def _assert_frame(frame, file_source, container_frame_idx):
+    assert frame.index == _lookup_index(file_source, container_frame_idx)
+    assert abs(frame.img.mean() - container_frame_idx * 8) < 4
+
+
+def test_seek_skips_container_seek_within_keyframe_interval(seekable_source):
+    seekable_source.seek_to_frame(_lookup_index(seekable_source, 11))
+    _assert_frame(seekable_source.get_frame(), seekable_source, 11)
+    seekable_source.seeks.clear()
+
+    seekable_source.seek_to_frame(_lookup_index(seekable_source, 14))
+    assert seekable_source.seeks == []
+    _assert_frame(seekable_source.get_frame(), seekable_source, 14)
+
+
+def test_seek_after_virtual_frame_seeks_container(seekable_source):
+    lookup = seekable_source.videoset.lookup
+    _assert_frame(seekable_source.get_frame(), seekable_source, 0)
+    virtual_idx = _lookup_index(seekable_source, GAP_AFTER_FRAME - 1) + 1
+    assert lookup[virtual_idx].container_idx == -1
+    seekable_source.seek_to_frame(virtual_idx)
+    seekable_source.seeks.clear()
+
+    # the keyframe of the target frame precedes the virtual frame, but the frame
+    # iterator was reset to the start of the container
+    target_idx = _lookup_index(seekable_source, GAP_AFTER_FRAME + 2)
+    assert lookup[target_idx].keyframe_idx < virtual_idx < target_idx
+    seekable_source.seek_to_frame(target_idx)
+    assert seekable_source.seeks == [int(lookup[target_idx].pts)]
+    _assert_frame(seekable_source.get_frame(), seekable_source, GAP_AFTER_FRAME + 2)
+
+
+def test_seek_after_exhausted_frame_iterator_seeks_container(seekable_source):
+    lookup = seekable_source.videoset.lookup
+    # a frame that is listed in the lookup table, but never decoded
+    missing_idx = _lookup_index(seekable_source, 22)
+    lookup.pts[missing_idx] = np.iinfo(lookup.pts.dtype).max
+    seekable_source.seek_to_frame(missing_idx - 1)
+    _assert_frame(seekable_source.get_frame(), seekable_source, 21)
+    with pytest.raises(EndofVideoError):
+        seekable_source.get_frame()
+    seekable_source.seeks.clear()
+
+    seekable_source.seek_to_frame(missing_idx + 1)
+    assert seekable_source.seeks == [int(lookup[missing_idx + 1].pts)]
+    _assert_frame(seekable_source.get_frame(), seekable_source, 23)
@@ -0,0 +1,129 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from video_capture.prefetching_decoder import FrameBuffer, PrefetchingDecoder
+
+FRAME_SIZE = 100
+GOP_SIZE = 10
+
+
+class FakeDecoder:
+    """Decodes frames with pts 0, 10, 20, ... and a keyframe every GOP_SIZE frames"""
+
+    def __init__(self, num_frames):
+        self.num_frames = num_frames
+        self.num_seeks = 0
+        self.num_decoded = 0
+        self._position = 0
+
+    def seek(self, pts_position):
+        self.num_seeks += 1
+        frame_idx = pts_position // 10
+        self._position = frame_idx - frame_idx % GOP_SIZE
+
+    def get_frame_iterator(self):
+        while self._position < self.num_frames:
+            frame_idx = self._position
+            self._position += 1
+            self.num_decoded += 1
+            yield SimpleNamespace(
+                pts=frame_idx * 10, planes=[SimpleNamespace(buffer_size=FRAME_SIZE)]
+            )
+
+    def cleanup(self):
+        pass
+
+
+def _lookup(num_frames, num_fake_frames=0):
+    lookup = np.recarray(
+        num_frames + num_fake_frames,
+        dtype=[("container_idx", "<i8"), ("pts", "<i8"), ("keyframe_idx", "<i8")],
+    )
+    frame_indices = np.arange(num_frames)
+    lookup.container_idx[:num_frames] = 0
+    lookup.container_idx[num_frames:] = -1
+    lookup.pts[:num_frames] = frame_indices * 10
+    lookup.keyframe_idx[:num_frames] = frame_indices - frame_indices % GOP_SIZE
+    lookup.keyframe_idx[num_frames:] = -1
+    return lookup
+
+
+@pytest.fixture
+def decoder():
+    return FakeDecoder(num_frames=100)
+
+
+@pytest.fixture
+def prefetcher(decoder):
+    prefetcher = PrefetchingDecoder(
+        _lookup(decoder.num_frames, num_fake_frames=5),
+        lambda container_idx: decoder,
+        buffer_size=40 * FRAME_SIZE,
+    )
+    prefetcher.prefetch_frames = 20
+    yield prefetcher
+    prefetcher.cleanup()
+
+
+def test_frame_buffer_drops_frames_farthest_from_playhead():
+    buffer = FrameBuffer(max_bytes=3 * FRAME_SIZE)
+    for frame_idx in range(3):
+        assert buffer.put(frame_idx, frame_idx, FRAME_SIZE, playhead=1, direction=1)
+    assert buffer.put(3, 3, FRAME_SIZE, playhead=1, direction=1)
+    # frames behind the playhead are dropped first
+    assert 0 not in buffer
+    assert len(buffer) == 3
+    assert buffer.num_bytes == 3 * FRAME_SIZE
+    # frames farther ahead than all others are not stored
+    assert not buffer.put(9, 9, FRAME_SIZE, playhead=1, direction=1)
+    assert 9 not in buffer
+    # the frame at the playhead is kept even if it is too large
+    assert buffer.put(7, 7, 10 * FRAME_SIZE, playhead=7, direction=-1)
+    assert buffer.get(7) == 7 and len(buffer) == 1
+
+
+def test_prefetching_decoder_decodes_requested_frames(prefetcher, decoder):
+    for frame_idx in range(decoder.num_frames):
+        assert prefetcher.get_frame(frame_idx).pts == frame_idx * 10
+    assert decoder.num_seeks == 1
+    assert decoder.num_decoded == decoder.num_frames
+    assert prefetcher.get_frame(decoder.num_frames) is None
+
+
+def test_prefetching_decoder_reuses_buffered_frames(prefetcher, decoder):
+    # only decode requested frames, such that the number of seeks is deterministic
+    prefetcher.prefetch_frames = 1
+    prefetcher.get_frame(35)
+    assert decoder.num_seeks == 1
+
+    # seeking forward within the same group of pictures does not seek the container
+    prefetcher.get_frame(38)
+    # scrubbing back serves the frames that were decoded since the keyframe
+    for frame_idx in reversed(range(30, 38)):
+        assert prefetcher.get_frame(frame_idx).pts == frame_idx * 10
+    assert decoder.num_seeks == 1
+
+    # stepping back across the keyframe decodes the preceding group of pictures
+    assert prefetcher.get_frame(29).pts == 290
+    assert prefetcher.get_frame(20).pts == 200
+    assert decoder.num_seeks == 2
+
+
+def test_prefetching_decoder_seeks_to_frames_after_keyframes(prefetcher, decoder):
+    prefetcher.get_frame(0)
+    prefetcher.get_frame(70)
+    assert decoder.num_seeks == 2
+    assert decoder.num_decoded <= 20 + prefetcher.prefetch_frames + GOP_SIZE
@@ -0,0 +1,47 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+
+import numpy as np
+
+from video_capture.utils import VideoSet, _preceding_keyframe_indices
+
+
+def test_lookup_keyframe_indices_of_filtered_lookup(tmpdir):
+    video_set = VideoSet(str(tmpdir), "world", fill_gaps=False)
+    lookup = video_set._setup_lookup(np.arange(8.0))
+    lookup.container_idx = [-1, 0, 0, 0, -1, 0, 0, -1]
+    is_real_frame = lookup.container_idx > -1
+    keyframes = np.array([False, True, False, False, True])
+    lookup.keyframe[is_real_frame] = keyframes
+    lookup.keyframe_idx[is_real_frame] = _preceding_keyframe_indices(
+        np.flatnonzero(is_real_frame), keyframes
+    )
+    assert lookup.keyframe_idx.tolist() == [-1, -1, 2, 2, -1, 2, 6, -1]
+
+    video_set.lookup = lookup
+    video_set._remove_filled_gaps()
+    assert video_set.lookup.keyframe_idx.tolist() == [-1, 1, 1, 1, 4]
+    assert video_set.lookup.keyframe.tolist() == keyframes.tolist()
+
+
+def test_outdated_lookup_is_rebuilt(tmpdir):
+    outdated_entry = [
+        ("container_idx", "<i8"),
+        ("container_frame_idx", "<i8"),
+        ("timestamp", "<f8"),
+        ("pts", "<i8"),
+    ]
+    np.save(str(tmpdir / "world_lookup.npy"), np.zeros(3, dtype=outdated_entry))
+
+    video_set = VideoSet(str(tmpdir), "world", fill_gaps=True)
+    video_set.load_or_build_lookup()
+    assert "keyframe_idx" in video_set.lookup.dtype.names
+    assert "keyframe_idx" in np.load(video_set.lookup_loc).dtype.names
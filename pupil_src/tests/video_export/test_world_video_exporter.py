@@ -0,0 +1,39 @@
+"""
+(*)~---------------------------------------------------------------------------
+Pupil - eye tracking platform
+Copyright (C) 2012-2020 Pupil Labs
+
+Distributed under the terms of the GNU
+Lesser General Public License (LGPL v3.0).
+See COPYING and COPYING.LESSER for license details.
+---------------------------------------------------------------------------~(*)
+"""
+import pytest
+
+from video_export.plugins.world_video_exporter import (
+    MIN_FRAMES_PER_SEGMENT,
+    SEGMENT_FRAME_ALIGNMENT,
+    segment_frame_ranges,
+)
+
+
+@pytest.mark.parametrize(
+    "start_frame, end_frame, max_segments",
+    [(0, 100_000, 7), (123, 54_321, 3), (50, 50 + 3 * MIN_FRAMES_PER_SEGMENT, 8)],
+)
+def test_segment_frame_ranges(start_frame, end_frame, max_segments):
+    segments = segment_frame_ranges(start_frame, end_frame, max_segments)
+    assert 1 < len(segments) <= max_segments
+    assert segments[0][0] == start_frame
+    assert segments[-1][1] == end_frame
+    for (_, stop), (next_start, _) in zip(segments[:-1], segments[1:]):
+        assert stop == next_start
+        assert (stop - start_frame) % SEGMENT_FRAME_ALIGNMENT == 0
+    assert all(stop - start >= MIN_FRAMES_PER_SEGMENT for start, stop in segments)
+
+
+def test_short_ranges_are_not_split():
+    assert segment_frame_ranges(10, 10 + MIN_FRAMES_PER_SEGMENT, 8) == [
+        (10, 10 + MIN_FRAMES_PER_SEGMENT)
+    ]
+    assert segment_frame_ranges(0, 100_000, 1) == [(0, 100_000)]